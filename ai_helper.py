@@ -1,141 +1,824 @@
 import re
-import duckdb
-import pandas as pd
+import catalog
+import metrics
+import nl2sql
+import pages
+import statements
+from answer_cache import AnswerCache, cache_key
+from db import get_pool
+from intent_classifier import keyword_classifier, parse_recent_buckets, parse_year_range
+from resolver import get_resolver
 
-# Connect to the DuckDB database
-con = duckdb.connect("samarth_data.duckdb")
+# Shared read-only DuckDB handle; each thread gets its own cursor
+DB_FILE = "samarth_data.duckdb"
+pool = get_pool(DB_FILE)
+answer_cache = AnswerCache(DB_FILE)
+sql_cache = AnswerCache(f"{DB_FILE}:sql", ttl=nl2sql.SQL_CACHE_TTL)
+metrics.start_exporter()
 
 # ---------------------- INTENT DETECTION ----------------------
 
 
+# One pass of the compiled keyword automaton (intent_classifier.py); the
+# precedence of the intents lives in intent_classifier.RULES["ai_helper"].
 def detect_intent(question: str):
-    q = question.lower()
-    if "rainfall" in q and ("average" in q or "mean" in q):
-        return "average_rainfall"
-    elif "compare" in q and "rainfall" in q:
-        return "compare_rainfall"
-    elif "highest" in q and "production" in q:
-        return "highest_production"
-    elif "top" in q and "crop" in q:
-        return "top_crops"
-    elif "price" in q and ("average" in q or "modal" in q):
-        return "average_price"
-    else:
-        return "unknown"
+    with metrics.stage("intent"):
+        return keyword_classifier.intent(question, "ai_helper")
 
 
-# ---------------------- ANSWER GENERATION ----------------------
-def answer_query(intent: str, question: str):
+# ---------------------- ENTITY EXTRACTION ----------------------
+# Pulls the intent's parameters out of the question and resolves them to
+# canonical keys, so differently-worded questions map to the same entities.
+def extract_entities(con, intent: str, question: str, resolver=None):
     q = question.lower()
+    resolver = resolver or get_resolver(con)
 
-    # 1️⃣ Average Rainfall
     if intent == "average_rainfall":
         match = re.search(r"rainfall in ([a-z\s&]+)\s+(\d{4})", q)
         if match:
             state, year = match.groups()
-            df = con.execute(f"""
-                SELECT ANNUAL FROM rainfall_data
-                WHERE LOWER(SUBDIVISION) LIKE '%{state.strip()}%'
-                AND YEAR = {year}
-            """).fetchdf()
-
-            if not df.empty:
-                avg = df["ANNUAL"].mean()
-                return f"🌧️ Average annual rainfall in {state.title()} ({year}) was **{avg:.2f} mm**."
-            return "❌ No data found for the given state and year."
-        return "⚠️ Please mention both the state and the year (e.g., 'Average rainfall in Kerala 2020')."
-
-    # 2️⃣ Compare Rainfall
+            return {"state": resolver.canonical(state), "year": int(year)}
+
     elif intent == "compare_rainfall":
-        match = re.search(
-            r"compare rainfall in ([a-z\s&]+) and ([a-z\s&]+)\s+(\d{4})", q)
-        if match:
-            state1, state2, year = match.groups()
-            data = []
-            for s in [state1, state2]:
-                df = con.execute(f"""
-                    SELECT ANNUAL FROM rainfall_data
-                    WHERE LOWER(SUBDIVISION) LIKE '%{s.strip()}%'
-                    AND YEAR = {year}
-                """).fetchdf()
-                if not df.empty:
-                    avg = df["ANNUAL"].mean()
-                    data.append((s.title(), avg))
-            if len(data) == 2:
-                s1, r1 = data[0]
-                s2, r2 = data[1]
-                higher = s1 if r1 > r2 else s2
-                return f"💧 In {year}, {higher} received more rainfall.\n→ {s1}: {r1:.2f} mm\n→ {s2}: {r2:.2f} mm"
-            return "❌ Couldn’t find rainfall data for one or both states."
-        return "⚠️ Please specify two states and a year (e.g., 'Compare rainfall in Kerala and Gujarat 2020')."
+        year_from, year_to, last = parse_year_range(q)
+        if year_from is None and year_to is None and last is None:
+            match = re.search(
+                r"compare rainfall in ([a-z\s&]+) and ([a-z\s&]+)\s+(\d{4})", q)
+            if match:
+                state1, state2, year = match.groups()
+                return {"states": [resolver.canonical(state1), resolver.canonical(state2)],
+                        "year": int(year)}
+        else:
+            # any number of states over a range of years (see is_window)
+            match = COMPARE_PLACES.search(q)
+            if match:
+                states = list(dict.fromkeys(
+                    resolver.canonical(place) for place in PLACE_SEPARATORS.split(match.group(1))
+                    if place.strip()))
+                return {"states": states, "year_from": year_from, "year_to": year_to,
+                        "last": last}
 
-    # 3️⃣ Top Crops
     elif intent == "top_crops":
         match = re.search(r"top\s*(\d+)?\s*crops in ([a-z\s&]+)", q)
         if match:
             n = int(match.group(1)) if match.group(1) else 3
-            state = match.group(2).strip()
-            df = con.execute(f"""
-                SELECT state, district, market, commodity AS crop,
-                       AVG(modal_price) AS avg_price
-                FROM crop_production
-                WHERE LOWER(state) LIKE '%{state}%'
-                GROUP BY state, district, market, commodity
-                ORDER BY avg_price DESC
-                LIMIT {n}
-            """).fetchdf()
-
-            if not df.empty:
-                return df.to_markdown(index=False)
-            return "❌ No crop data found for the specified state."
-        return "⚠️ Please specify the state (e.g., 'Top 5 crops in Andhra Pradesh')."
+            return {"state": resolver.canonical(match.group(2), ["state"]), "n": n}
 
-    # 4️⃣ Highest Production (Proxy by Price)
     elif intent == "highest_production":
         match = re.search(r"highest .* in ([a-z\s&]+)\s*(\d{4})?", q)
         if match:
-            state = match.group(1).strip()
-            df = con.execute(f"""
-                SELECT district, commodity AS crop, AVG(modal_price) AS avg_price
-                FROM crop_production
-                WHERE LOWER(state) LIKE '%{state}%'
-                GROUP BY district, commodity
-                ORDER BY avg_price DESC
-                LIMIT 1
-            """).fetchdf()
-
-            if not df.empty:
-                row = df.iloc[0]
-                return f"🌾 In {state.title()}, {row['district']} district had the highest value crop: **{row['crop']}** (Avg Price ₹{row['avg_price']:.0f})."
-            return "❌ No data found for that state."
-        return "⚠️ Please specify the state (e.g., 'Which district in Tamil Nadu had highest production in 2020')."
+            return {"state": resolver.canonical(match.group(1), ["state"])}
 
-    # 5️⃣ Average Price
     elif intent == "average_price":
         match = re.search(r"average price of ([a-z\s&]+) in ([a-z\s&]+)", q)
         if match:
             crop, state = match.groups()
-            df = con.execute(f"""
-                SELECT AVG(modal_price) AS avg_price
-                FROM crop_production
-                WHERE LOWER(state) LIKE '%{state.strip()}%'
-                AND LOWER(commodity) LIKE '%{crop.strip()}%'
-            """).fetchdf()
-
-            if not df.empty and not pd.isna(df["avg_price"][0]):
-                return f"💰 Average price of {crop.title()} in {state.title()} was ₹{df['avg_price'][0]:.0f}."
-            return "❌ No price data found for that crop and state."
-        return "⚠️ Please specify both crop and state (e.g., 'Average price of tomato in Maharashtra')."
+            return {"crop": resolver.canonical(crop, ["commodity"]),
+                    "state": resolver.canonical(state, ["state"])}
+
+    elif intent == "rainfall_price":
+        from rainfall_climate import season_of
+
+        match = CROP_PRICES.search(q)
+        if not match:
+            return None
+        named, before, place = match.groups()
+        crop = resolver.canonical(named, ["commodity"]) if named else crop_before(resolver, before)
+        return {"crop": crop, "state": resolver.canonical(place, ["state"]),
+                "season": season_of(q)}
+
+    elif intent == "price_trend":
+        match = CROP_PRICES.search(q)
+        if not match:
+            return None
+        named, before, place = match.groups()
+        crop = resolver.canonical(named, ["commodity"]) if named else crop_before(resolver, before)
+        count, unit = parse_recent_buckets(q)
+        return {"crop": crop, "state": resolver.canonical(place, ["state"]),
+                "count": count, "unit": unit}
+
+    elif intent in CLIMATE_INTENTS:
+        from rainfall_climate import season_of
+
+        place = PLACE.search(q)
+        if not place:
+            return None
+        entities = {"state": resolver.canonical(place.group(1)), "season": season_of(q)}
+        if intent == "rainfall_trend":
+            since = re.search(r"\b(?:since|from|after)\s+(\d{4})", q)
+            entities["since"] = int(since.group(1)) if since else None
+        elif intent == "driest_years":
+            count = re.search(r"\b(\d{1,2})\s+(?:driest|wettest)|(?:driest|wettest)\s+(\d{1,2})\b", q)
+            entities["n"] = int(count.group(1) or count.group(2)) if count else 5
+            entities["wettest"] = "wettest" in q
+        else:
+            year = re.search(r"\b(\d{4})\b", q)
+            if not year:
+                return None
+            entities["year"] = int(year.group(1))
+            if entities["season"] == "annual_filled":
+                entities["season"] = "jjas"
+        return entities
+
+    return None
+
+
+# "... in <place>" up to "since/in/from ...", a year or the end of the question
+PLACE = re.compile(
+    r"\b(?:in|for|over) ([a-z][a-z\s&]*?)"
+    r"(?=\s+(?:since|from|after|in|during|between)\b|\s*\d|\s*[?.!]*$)")
+
+
+# "compare rainfall in kerala, goa and karnataka" up to the year range
+COMPARE_PLACES = re.compile(
+    r"compare rainfall (?:in|of|for|across|between) ([a-z][a-z\s,&]*?)"
+    r"(?=\s*,?\s*(?:\b(?:between|from|since|after|before|until|till|through|up to|over"
+    r"|during|in|for|the|last|past|previous|recent)\b|\d)|\s*[?.!]*$)")
+PLACE_SEPARATORS = re.compile(r"\s*,\s*(?:and\s+)?|\s+(?:and|vs\.?|versus)\s+")
+
+# "price (trend) of <crop> in <state>" or "... <crop> price(s) (trend) in
+# <state>", up to the verb tying it to rainfall, the time span or the end
+CROP_PRICES = re.compile(
+    r"(?:\bprices?(?:\s+trends?)?\s+of\s+([a-z][a-z\s]*?)|([a-z][a-z\s]*?)\s+prices?(?:\s+trends?)?)"
+    r"\s+(?:in|across|for)\s+([a-z][a-z\s&]*?)"
+    r"(?=\s+(?:track|follow|move|respond|react|relate|compare|correlate|depend|vs|versus"
+    r"|against|with|and|over|since|during|in|for|the|last|past|from)(?:s|d|ed|ing)?\b|\s*\d|\s*[,?.!]*$)")
+
+
+def crop_before(resolver, text: str):
+    # The longest tail of `text` (up to three words) naming a commodity,
+    # else its last word: "how did tomato" -> "tomato"
+    words = text.split()
+    for start in range(max(0, len(words) - 3), len(words)):
+        crop = resolver.resolve(" ".join(words[start:]), ["commodity"])
+        if crop:
+            return crop
+    return resolver.canonical(words[-1], ["commodity"])
+
+
+# Shown when the intent is clear but its entities could not be extracted
+HINTS = {
+    "average_rainfall": "⚠️ Please mention both the state and the year (e.g., 'Average rainfall in Kerala 2020').",
+    "compare_rainfall": "⚠️ Please specify the states and a year or range (e.g., 'Compare rainfall in Kerala and Gujarat 2020' or 'Compare rainfall in Kerala, Goa and Konkan since 2000').",
+    "top_crops": "⚠️ Please specify the state (e.g., 'Top 5 crops in Andhra Pradesh').",
+    "highest_production": "⚠️ Please specify the state (e.g., 'Which district in Tamil Nadu had highest production in 2020').",
+    "average_price": "⚠️ Please specify both crop and state (e.g., 'Average price of tomato in Maharashtra').",
+    "rainfall_trend": "⚠️ Please mention the state (e.g., 'Rainfall trend in Kerala since 1950').",
+    "driest_years": "⚠️ Please mention the state (e.g., 'Driest years in Vidarbha').",
+    "monsoon_status": "⚠️ Please mention the state and the year (e.g., 'Was the 2002 monsoon below normal in Punjab').",
+    "rainfall_price": "⚠️ Please mention the crop and the state (e.g., 'How did tomato prices in Karnataka track monsoon rainfall').",
+    "price_trend": "⚠️ Please mention the crop and the state (e.g., 'Price trend of onion in Maharashtra over the last 6 months').",
+}
+
+UNKNOWN = "🤔 Sorry, I didn't understand that. Try asking about rainfall, crops, or prices."
+NO_CROPS = "❌ No crop data found for the specified state."
+
+
+# ---------------------- ANSWER GENERATION ----------------------
+# Each intent's answer is formatted from the frame(s) its query returned, so
+# the one-question path (answer_entities) and the batch path (get_answers)
+# share the wording exactly.
+def format_answer(intent: str, entities: dict, frames):
+
+    # 1️⃣ Average Rainfall / 2️⃣ Compare Rainfall
+    if is_window(intent, entities):
+        return format_window(entities, list(frames[0].itertuples(index=False, name=None)))
+    elif intent in RAINFALL_INTENTS:
+        return format_rainfall(intent, entities, [frame_mean(df) for df in frames])
+
+    # 3️⃣ Top Crops
+    elif intent == "top_crops":
+        df = frames[0]
+
+        if not df.empty:
+            return pages.markdown_table(df)
+        return NO_CROPS
+
+    # 4️⃣ Highest Production (Proxy by Price)
+    elif intent == "highest_production":
+        state = entities["state"]
+        df = frames[0]
+
+        if not df.empty:
+            row = df.iloc[0]
+            return f"🌾 In {state.title()}, {row['district']} district had the highest value crop: **{row['crop']}** (Avg Price ₹{row['avg_price']:.0f})."
+        return "❌ No data found for that state."
+
+    # 5️⃣ Average Price
+    elif intent == "average_price":
+        crop, state = entities["crop"], entities["state"]
+        df = frames[0]
+
+        if not df.empty and not isnan(df["avg_price"][0]):
+            return f"💰 Average price of {crop.title()} in {state.title()} was ₹{df['avg_price'][0]:.0f}."
+        return "❌ No price data found for that crop and state."
+
+    # 7️⃣ Trend / driest years / monsoon status
+    elif intent in CLIMATE_INTENTS:
+        rows = list(frames[0].itertuples(index=False, name=None))
+        return format_climate(intent, entities, rows)
+
+    # 8️⃣ Prices against rainfall
+    elif intent == "rainfall_price":
+        return format_rainfall_price(entities, frames[0])
+
+    # 9️⃣ Weekly / monthly price trend
+    elif intent == "price_trend":
+        return format_price_trend(entities, frames[0])
 
     # 6️⃣ Unknown
-    else:
-        return "🤔 Sorry, I didn't understand that. Try asking about rainfall, crops, or prices."
+    return UNKNOWN
+
+
+def format_rainfall(intent: str, entities: dict, means):
+    # means: the mean ANNUAL per asked-about state, None where it had no rows
+    if intent == "average_rainfall":
+        state, year = entities["state"], entities["year"]
+        avg = means[0]
+
+        if avg is not None:
+            return f"🌧️ Average annual rainfall in {state.title()} ({year}) was **{avg:.2f} mm**."
+        return "❌ No data found for the given state and year."
+
+    year = entities["year"]
+    data = []
+    for s, avg in zip(entities["states"], means):
+        if avg is not None:
+            data.append((s.title(), avg))
+    if len(data) == 2:
+        s1, r1 = data[0]
+        s2, r2 = data[1]
+        if round(r1, 2) == round(r2, 2):
+            verdict = f"{s1} and {s2} received the same rainfall"
+        else:
+            verdict = f"{s1 if r1 > r2 else s2} received more rainfall"
+        return f"💧 In {year}, {verdict}.\n→ {s1}: {r1:.2f} mm\n→ {s2}: {r2:.2f} mm"
+    return "❌ Couldn’t find rainfall data for one or both states."
+
+
+def is_window(intent: str, entities: dict):
+    # compare_rainfall over a range of years rather than one year
+    return intent == "compare_rainfall" and "year" not in entities
+
+
+def format_window(entities: dict, rows):
+    # rows: (state, year, rainfall, rolling mean, period mean), as
+    # statements.rainfall_window returns them
+    if not rows:
+        return "❌ Couldn’t find rainfall data for those states and years."
+    first, last = min(r[1] for r in rows), max(r[1] for r in rows)
+    period = f"{first}–{last}" if first != last else str(first)
+    latest = {}
+    for state, year, _, rolling, average in rows:
+        latest[state] = (year, rolling, average)
+    lines = [f"💧 Average annual rainfall, {period}:"]
+    for state, (year, rolling, average) in latest.items():
+        lines.append(f"→ {state.title()}: **{average:.2f} mm** "
+                     f"({statements.ROLLING_YEARS}-year mean to {year}: {rolling:.2f} mm)")
+    missing = [s.title() for s in entities["states"] if s not in latest]
+    if missing:
+        lines.append(f"→ No data for {', '.join(missing)}.")
+    ranked = [(average, state) for state, (_, _, average) in latest.items() if not isnan(average)]
+    if len(ranked) > 1:
+        # equal as shown (two decimals): states sharing every subdivision tie
+        top = round(max(ranked)[0], 2)
+        leaders = [state.title() for average, state in ranked if round(average, 2) == top]
+        if len(leaders) == len(ranked):
+            lines.append("🤝 They received the same rainfall.")
+        elif len(leaders) > 1:
+            lines.append(f"🏆 {' and '.join(leaders)} received the most rainfall (equal).")
+        else:
+            lines.append(f"🏆 {leaders[0]} received the most rainfall.")
+    return "\n".join(lines)
+
+
+MIN_PAIRED_YEARS = 3  # fewer paired years than this give no correlation
+
+
+def strength(r):
+    return "strong" if abs(r) >= 0.7 else "moderate" if abs(r) >= 0.4 else "weak"
+
+
+def format_rainfall_price(entities: dict, df):
+    # df: statements.rainfall_vs_price's per-year rows, statistics repeated
+    from rainfall_climate import SEASON_NAMES
+
+    crop, state = entities["crop"].title(), entities["state"].title()
+    season = SEASON_NAMES[entities["season"]]
+    if df.empty:
+        return f"❌ No price data found for {crop} in {state}."
+    first, last = int(df["year"].min()), int(df["year"].max())
+    period = f"{first}–{last}" if first != last else str(first)
+    row = df.iloc[0]
+    if row["n_years"] < MIN_PAIRED_YEARS or isnan(row["corr_same_year"]):
+        return (f"❌ Not enough years with both {crop} prices and {season} rainfall in {state} "
+                f"to compare (prices cover {period}).")
+    lines = [f"🌧️ {crop} prices in {state} against {season} rainfall, {period}:",
+             f"→ Same year: r = **{row['corr_same_year']:+.2f}** ({strength(row['corr_same_year'])}, "
+             f"{int(row['n_years'])} years; ₹{row['price_per_mm']:+.1f} per mm)"]
+    if row["n_lagged"] >= MIN_PAIRED_YEARS and not isnan(row["corr_prev_year"]):
+        lines.append(f"→ Previous year's rainfall: r = **{row['corr_prev_year']:+.2f}** "
+                     f"({strength(row['corr_prev_year'])}, {int(row['n_lagged'])} years)")
+    return "\n".join(lines)
+
+
+PRICE_TREND_LINES = 12  # buckets listed; longer trends show the latest ones
+
+
+def format_price_trend(entities: dict, df):
+    # df: statements.price_trend's buckets, oldest first
+    crop, state, unit = entities["crop"].title(), entities["state"].title(), entities["unit"]
+    df = df.dropna(subset=["modal_avg"])
+    if df.empty:
+        return f"❌ No price data found for {crop} in {state}."
+    label = "%d %b %Y" if unit == "week" else "%b %Y"
+    cadence = "weekly" if unit == "week" else "monthly"
+    lines = [f"📈 {crop} prices in {state}, last {entities['count']} {unit}s ({cadence} modal average):"]
+    for row in df.tail(PRICE_TREND_LINES).itertuples(index=False):
+        lines.append(f"→ {row.bucket:{label}}: ₹{row.modal_avg:.0f} "
+                     f"(₹{row.modal_min:.0f}–₹{row.modal_max:.0f})")
+    if len(df) > 1:
+        first, last = df.iloc[0], df.iloc[-1]
+        change = 100 * (last["modal_avg"] - first["modal_avg"]) / first["modal_avg"]
+        arrow = "⬆️" if change > 0 else "⬇️" if change < 0 else "➡️"
+        lines.append(f"{arrow} {change:+.1f}% from {first['bucket']:{label}} to {last['bucket']:{label}}.")
+    return "\n".join(lines)
+
+
+def frame_mean(df):
+    return None if df.empty else df["ANNUAL"].mean()
+
+
+def isnan(value):
+    # pandas stays unimported until DuckDB hands back the first DataFrame
+    import pandas as pd
+    return pd.isna(value)
+
+
+def fetch(con, name: str, *values):
+    df = statements.run(con, name, *values)
+    with metrics.stage("fetchdf"):
+        df = df.fetchdf()
+    metrics.add_rows("fetchdf", len(df))
+    return df
+
+
+def fetch_window(con, entities: dict):
+    # every state, every year of the range: one scan
+    return fetch(con, "compare_rainfall_window", entities["states"], [],
+                 entities["year_from"], entities["year_to"], entities["last"])
+
+
+# ---------------------- RAINFALL CUBE ----------------------
+# Average/compare rainfall are answered from the NumPy cube (rainfall_cube.py)
+# when there is one; SQL (rainfall_by_state_year / batch_rainfall) is the
+# fallback and gives the same numbers.
+RAINFALL_INTENTS = {"average_rainfall", "compare_rainfall"}
+WINDOW_COLUMNS = ["state", "year", "rainfall", "rolling_avg", "avg_annual_rainfall"]
+
+
+def cube_for(con):
+    # numpy loads with the first rainfall question, not at import
+    from rainfall_cube import get_cube
+    return get_cube(con)
+
+
+def rainfall_states(intent: str, entities: dict):
+    return [entities["state"]] if intent == "average_rainfall" else entities["states"]
+
+
+def cube_means(con, intent: str, entities: dict):
+    # Mean annual rainfall per asked-about state, or None without a cube
+    if intent not in RAINFALL_INTENTS or is_window(intent, entities):
+        return None
+    cube = cube_for(con)
+    if cube is None:
+        return None
+    with metrics.stage("cube"):
+        return [cube.mean(s, entities["year"]) for s in rainfall_states(intent, entities)]
+
+
+def cube_window(con, entities: dict):
+    # compare_rainfall_window's rows off the cube, or None without one
+    cube = cube_for(con)
+    if cube is None:
+        return None
+    with metrics.stage("cube"):
+        rows = cube.window(entities["states"], (), entities["year_from"], entities["year_to"],
+                           entities["last"], statements.ROLLING_YEARS)
+    metrics.add_rows("cube", len(rows))
+    return rows
+
+
+def cube_frames(con, intent: str, entities: dict):
+    # The rows behind a cube answer, shaped like rainfall_by_state_year's
+    # (or compare_rainfall_window's)
+    if is_window(intent, entities):
+        import pandas as pd
+
+        rows = cube_window(con, entities)
+        return None if rows is None else [pd.DataFrame(rows, columns=WINDOW_COLUMNS)]
+    cube = cube_for(con) if intent in RAINFALL_INTENTS else None
+    if cube is None:
+        return None
+    import pandas as pd
+
+    with metrics.stage("cube"):
+        frames = [pd.DataFrame({"ANNUAL": cube.cells(s, entities["year"])})
+                  for s in rainfall_states(intent, entities)]
+    metrics.add_rows("cube", sum(len(df) for df in frames))
+    return frames
+
+
+# ---------------------- RAINFALL CLIMATOLOGY ----------------------
+# Trend / driest-year / monsoon-status questions are lookups into the
+# normals, anomalies and Sen's slopes rainfall_climate.py precomputes per
+# ingest; they have no SQL path.
+CLIMATE_INTENTS = {"rainfall_trend", "driest_years", "monsoon_status"}
+
+# intent -> columns of the rows climate_rows() returns
+CLIMATE_COLUMNS = {
+    "rainfall_trend": ["subdivision", "slope_mm_per_year", "normal_mm", "from_year", "to_year"],
+    "driest_years": ["year", "rainfall_mm", "departure_pct", "z_score"],
+    "monsoon_status": ["rainfall_mm", "normal_mm", "departure_pct", "z_score", "category"],
+}
+
+
+def climate_rows(con, intent: str, entities: dict):
+    from rainfall_climate import get_climate
+
+    climate = get_climate(con)
+    if climate is None:
+        return []
+    state, season = entities["state"], entities["season"]
+    with metrics.stage("climate"):
+        if intent == "rainfall_trend":
+            return climate.trend(state, entities["since"], season)
+        if intent == "driest_years":
+            return climate.extremes(state, entities["n"], season, entities["wettest"])
+        found = climate.status(state, entities["year"], season)
+        return [tuple(found[c] for c in ["rainfall", "normal", "departure", "z", "category"])] \
+            if found else []
+
+
+def format_climate(intent: str, entities: dict, rows):
+    from rainfall_climate import SEASON_NAMES
+
+    state, season = entities["state"].title(), SEASON_NAMES[entities["season"]]
+    if intent == "rainfall_trend":
+        if not rows:
+            return "❌ Not enough rainfall history to estimate that trend."
+        since = f" since {entities['since']}" if entities["since"] else ""
+        lines = [f"📈 Trend in {season} rainfall in {state}{since} (Sen's slope):"]
+        for name, slope, normal, first, last in rows[:10]:
+            direction = "rising" if slope > 0 else "falling" if slope < 0 else "flat"
+            share = f", {100 * slope / normal:+.2f}% of normal per year" if normal else ""
+            lines.append(f"→ {name.title()}: **{slope:+.2f} mm/year** ({direction}{share}; {first}–{last})")
+        return "\n".join(lines)
+
+    if intent == "driest_years":
+        if not rows:
+            return "❌ No rainfall data found for that state."
+        label = "🌊 Wettest" if entities["wettest"] else "🏜️ Driest"
+        lines = [f"{label} years in {state} ({season} rainfall):"]
+        for year, rainfall, departure, z in rows:
+            lines.append(f"→ {year}: {rainfall:.1f} mm ({departure:+.0f}% of normal, z {z:+.2f})")
+        return "\n".join(lines)
+
+    if not rows:
+        return "❌ No rainfall data found for the given state and year."
+    rainfall, normal, departure, _, grade = rows[0]
+    verdict = ("below normal" if grade in ("deficient", "large deficient", "no rain")
+               else "above normal" if grade == "excess" else "within the normal range")
+    return (f"🌦️ The {entities['year']} {season} rainfall in {state} was **{grade}**: "
+            f"{rainfall:.1f} mm against a normal of {normal:.1f} mm ({departure:+.1f}%), "
+            f"i.e. {verdict}.")
+
+
+def direct_answer(con, intent: str, entities: dict):
+    # Answers that need no SQL (cube / climatology), or None
+    if intent in CLIMATE_INTENTS:
+        rows = climate_rows(con, intent, entities)
+        with metrics.stage("format"):
+            return format_climate(intent, entities, rows)
+    if is_window(intent, entities):
+        rows = cube_window(con, entities)
+        if rows is None:
+            return None
+        with metrics.stage("format"):
+            return format_window(entities, rows)
+    means = cube_means(con, intent, entities)
+    if means is not None:
+        with metrics.stage("format"):
+            return format_rainfall(intent, entities, means)
+    return None
+
+
+def fetch_frames(con, intent: str, entities: dict):
+    if intent in CLIMATE_INTENTS:
+        import pandas as pd
+
+        return [pd.DataFrame(climate_rows(con, intent, entities),
+                             columns=CLIMATE_COLUMNS[intent])]
+    frames = cube_frames(con, intent, entities)
+    if frames is not None:
+        return frames
+    if is_window(intent, entities):
+        return [fetch_window(con, entities)]
+    if intent == "average_rainfall":
+        return [fetch(con, "rainfall_by_state_year",
+                      entities["state"], entities["year"])]
+    if intent == "compare_rainfall":
+        return [fetch(con, "rainfall_by_state_year", s, entities["year"])
+                for s in entities["states"]]
+    if intent == "top_crops":
+        return [fetch(con, "top_crops", entities["state"], entities["n"])]
+    if intent == "highest_production":
+        return [fetch(con, "highest_production", entities["state"])]
+    if intent == "average_price":
+        return [fetch(con, "average_price", entities["state"], entities["crop"])]
+    if intent == "rainfall_price":
+        return [fetch(con, "rainfall_vs_price", entities["state"], entities["crop"],
+                      entities["season"])]
+    if intent == "price_trend":
+        return [fetch(con, f"price_trend_{entities['unit']}", entities["state"],
+                      entities["crop"], entities["count"])]
+    return []
+
+
+def answer_entities(con, intent: str, entities: dict):
+    answer = direct_answer(con, intent, entities)
+    if answer is not None:
+        return answer
+    frames = fetch_frames(con, intent, entities)
+    with metrics.stage("format"):
+        return format_answer(intent, entities, frames)
+
+
+def answer_query(intent: str, question: str):
+    if intent not in HINTS:
+        return UNKNOWN
+    with metrics.question("ai_helper", question), pool.cursor() as con:
+        with metrics.stage("entities"):
+            entities = extract_entities(con, intent, question)
+        if entities is None:
+            return HINTS[intent]
+        return answer_entities(con, intent, entities)
 
 
 # ---------------------- HELPER FUNCTION ----------------------
+# Answers are cached on (intent, resolved entities) rather than the raw
+# text, and dropped whenever an ingest bumps the data generation.
 def get_answer(user_query: str):
+    with metrics.question("ai_helper", user_query):
+        return _get_answer(user_query)
+
+
+def _get_answer(user_query: str):
     intent = detect_intent(user_query)
-    return answer_query(intent, user_query)
+    if intent not in HINTS:
+        return UNKNOWN
+    with pool.cursor() as con:
+        with metrics.stage("entities"):
+            entities = extract_entities(con, intent, user_query)
+        if entities is None:
+            return HINTS[intent]
+        return answer_cache.get_or_compute(
+            (intent, entities), catalog.cached_generation(con),
+            lambda: answer_entities(con, intent, entities))
+
+
+# ---------------------- PAGED ANSWERS ----------------------
+# answer_pages() yields an answer as pages.Page objects for front ends that
+# render as rows arrive (app_local.py, the CLI). Intents whose answer is a
+# list of rows stream their statement's record batches a page at a time;
+# each page but the last carries a token, and answer_pages(question, token)
+# resumes the same statement at that row. Everything else (and any cached
+# answer) is one page.
+
+# intent -> (statement whose rows are the answer, {entity field: type})
+PAGED_STATEMENTS = {
+    "top_crops": ("top_crops", {"state": str, "n": int}),
+}
+
+INVALID_PAGE = "⚠️ That page is no longer available. Please ask the question again."
+
+
+def read_page_token(token: str):
+    # (intent, entities, offset) from a page's token; ValueError unless it
+    # names a paged intent with every entity its statement takes
+    try:
+        (intent, entities), offset = pages.read_token(token)
+        _, fields = PAGED_STATEMENTS[intent]
+        if not all(type(entities[field]) is kind for field, kind in fields.items()):
+            raise ValueError
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("invalid page token")
+    return intent, entities, offset
+
+
+def answer_pages(user_query: str, token: str = None, rows: int = pages.PAGE_ROWS):
+    with metrics.question("ai_helper", user_query):
+        if token:
+            try:
+                intent, entities, offset = read_page_token(token)
+            except ValueError:
+                yield pages.Page(INVALID_PAGE)
+                return
+        else:
+            intent, offset = detect_intent(user_query), 0
+            if intent not in PAGED_STATEMENTS:
+                yield pages.Page(_get_answer(user_query))
+                return
+        # a cursor of its own: the result is read between yields, while the
+        # caller may run other questions on this thread's pooled cursor
+        with pool.own_cursor() as con:
+            if not token:
+                with metrics.stage("entities"):
+                    entities = extract_entities(con, intent, user_query)
+                if entities is None:
+                    yield pages.Page(HINTS[intent])
+                    return
+                found, answer = answer_cache.get(
+                    (intent, entities), catalog.cached_generation(con))
+                if found:
+                    yield pages.Page(answer, table=answer != NO_CROPS)
+                    return
+            name, fields = PAGED_STATEMENTS[intent]
+            values = [entities[field] for field in fields]
+            result = statements.run_from(con, name, offset, *values) if offset \
+                else statements.run(con, name, *values)
+            streamed = pages.paginate(pages.record_batches(result, rows), pages.markdown_table,
+                                      [intent, entities], offset, table=True)
+            page = None
+            for page in streamed:
+                yield page
+            if page is None and not offset:
+                yield pages.Page(NO_CROPS)
+
+
+# ---------------------- STRUCTURED ANSWERS ----------------------
+# Same pipeline as get_answer, but also returns the rows behind the answer
+# for callers that want data rather than markdown (service.py).
+def get_answer_data(user_query: str):
+    result = {"question": user_query, "intent": detect_intent(user_query),
+              "entities": None, "frames": [], "answer": None}
+    intent = result["intent"]
+    if intent not in HINTS:
+        result["answer"] = UNKNOWN
+        return result
+    with metrics.question("ai_helper", user_query), pool.cursor() as con:
+        with metrics.stage("entities"):
+            entities = extract_entities(con, intent, user_query)
+        if entities is None:
+            result["answer"] = HINTS[intent]
+            return result
+        result["entities"] = entities
+        result["frames"] = fetch_frames(con, intent, entities)
+        with metrics.stage("format"):
+            result["answer"] = format_answer(intent, entities, result["frames"])
+        answer_cache.put((intent, entities), catalog.cached_generation(con), result["answer"])
+    return result
+
+
+# ---------------------- BATCH ANSWERS ----------------------
+# get_answers() classifies every question up front, then answers each intent
+# group with one set-based statement (statements.py, batch_*) joined against
+# the requested parameters, instead of one scan per question. Average and
+# compare rainfall share a single (state, year) lookup; comparisons over a
+# range of years run compare_rainfall_window once each. Rows come back tagged
+# with a request id and are scattered back to the questions in input order.
+# With a rainfall cube, rainfall questions skip SQL altogether.
+
+# intent -> (batch statement, entity fields passed as lists)
+BATCH_STATEMENTS = {
+    "top_crops": ("batch_top_crops", ["state", "n"]),
+    "highest_production": ("batch_highest_production", ["state"]),
+    "average_price": ("batch_average_price", ["state", "crop"]),
+}
+
+
+def split_frame(df, count: int):
+    # One frame per request id 0..count-1, keeping the statement's columns
+    positions = df.groupby("req_id", sort=False).indices if not df.empty else {}
+    body = df.drop(columns="req_id")
+    empty = body.iloc[0:0]
+    return [body.iloc[positions[i]].reset_index(drop=True) if i in positions else empty
+            for i in range(count)]
+
+
+def fetch_batch(con, pending: dict):
+    # pending: cache key -> (intent, entities); returns cache key -> frames
+    frames = {}
+
+    pairs = {}  # (state, year) -> request id
+    for key, (intent, entities) in pending.items():
+        if is_window(intent, entities):
+            frames[key] = [fetch_window(con, entities)]
+        elif intent == "average_rainfall":
+            pairs.setdefault((entities["state"], entities["year"]), len(pairs))
+        elif intent == "compare_rainfall":
+            for s in entities["states"]:
+                pairs.setdefault((s, entities["year"]), len(pairs))
+    if pairs:
+        df = fetch(con, "batch_rainfall", list(pairs.values()),
+                   [s for s, _ in pairs], [y for _, y in pairs])
+        by_pair = dict(zip(pairs, split_frame(df, len(pairs))))
+        for key, (intent, entities) in pending.items():
+            if intent == "average_rainfall":
+                frames[key] = [by_pair[(entities["state"], entities["year"])]]
+            elif intent == "compare_rainfall" and not is_window(intent, entities):
+                frames[key] = [by_pair[(s, entities["year"])] for s in entities["states"]]
+
+    for intent, (name, fields) in BATCH_STATEMENTS.items():
+        keys = [key for key, (i, _) in pending.items() if i == intent]
+        if not keys:
+            continue
+        columns = [[pending[key][1][field] for key in keys] for field in fields]
+        df = fetch(con, name, list(range(len(keys))), *columns)
+        for key, part in zip(keys, split_frame(df, len(keys))):
+            frames[key] = [part]
+
+    # anything without a batch statement (rainfall vs price, price trends)
+    # runs on its own
+    for key, (intent, entities) in pending.items():
+        if key not in frames:
+            frames[key] = fetch_frames(con, intent, entities)
+    return frames
+
+
+def get_answers(questions):
+    answers = [None] * len(questions)
+    pending = {}  # cache key -> (intent, entities)
+    waiting = {}  # cache key -> indexes of the questions asking it
+    with metrics.question("ai_helper_batch", f"{len(questions)} questions"), \
+            pool.cursor() as con:
+        generation = catalog.cached_generation(con)
+        resolver = get_resolver(con)
+        for index, question in enumerate(questions):
+            intent = detect_intent(question)
+            if intent not in HINTS:
+                answers[index] = UNKNOWN
+                continue
+            with metrics.stage("entities"):
+                entities = extract_entities(con, intent, question, resolver)
+            if entities is None:
+                answers[index] = HINTS[intent]
+                continue
+            key = (intent, entities)
+            k = cache_key(answer_cache.namespace, key)
+            if k not in waiting:
+                found, value = answer_cache.get(key, generation)
+                if found:
+                    answers[index] = value
+                    continue
+                pending[k] = key
+            waiting.setdefault(k, []).append(index)
+
+        # rainfall is read off the cube; only what is left goes to SQL
+        computed = {}
+        for k, (intent, entities) in pending.items():
+            answer = direct_answer(con, intent, entities)
+            if answer is not None:
+                computed[k] = answer
+        rest = {k: key for k, key in pending.items() if k not in computed}
+        if rest:
+            frames = fetch_batch(con, rest)
+            for k, (intent, entities) in rest.items():
+                with metrics.stage("format"):
+                    computed[k] = format_answer(intent, entities, frames[k])
+        for k, (intent, entities) in pending.items():
+            answer_cache.put((intent, entities), generation, computed[k])
+            for index in waiting[k]:
+                answers[index] = computed[k]
+    return answers
+
+
+# ---------------------- MODEL-WRITTEN SQL ----------------------
+# Free-form questions the rule-based intents don't cover (app.py,
+# chat_app.py): a model writes SQL for the question's template, which is
+# validated and cached per template (nl2sql.py). Returns explanation,
+# sql_query, result (rows as tuples), summary, gemini_reasoning and
+# result_preview, or "error".
+def query_with_reasoning(user_question: str, model=None):
+    with metrics.question("nl2sql", user_question), pool.cursor() as con:
+        return nl2sql.answer(con, user_question, sql_cache, model)
+
+
+# ---------------------- WARMUP ----------------------
+# Importing this module only builds the keyword automaton; pandas, duckdb,
+# the database handle, the entity resolver and the rainfall cube load on the
+# first question.
+# Servers that would rather pay that before taking traffic call warmup().
+def warmup():
+    import pandas  # noqa: F401  (DuckDB's fetchdf needs it)
+
+    if not pool.warmup():
+        return False
+    with pool.cursor() as con:
+        get_resolver(con)
+        cube_for(con)
+    return True
 
 
 # ---------------------- CLI MODE ----------------------
@@ -150,8 +833,13 @@ def run_cli():
             break
         intent = detect_intent(question)
         print(f"\n🧠 Intent detected: {intent}\n")
-        answer = answer_query(intent, question)
-        print(f"\n📝 Answer:\n{answer}\n")
+        print("\n📝 Answer:")
+        # long answers arrive a page at a time; each waits for Enter
+        for page in answer_pages(question):
+            print(page.text)
+            if page.more and input("\n-- more rows: Enter, or q to stop -- ").strip().lower() == "q":
+                break
+        print()
         print("Built with ❤️ for Project Samarth | Runs fully offline using DuckDB 🦆\n")
 
 
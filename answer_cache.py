@@ -0,0 +1,164 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# ---------------------- ANSWER CACHE ----------------------
+# Two-tier cache in front of answer generation, keyed on the normalised
+# (intent, resolved entities) pair rather than the question text:
+#
+#   memory  per-process LRU, bounded by SAMARTH_CACHE_SIZE entries and
+#           SAMARTH_CACHE_TTL seconds
+#   disk    optional SQLite file under SAMARTH_CACHE_DIR shared by every
+#           worker process on the box, pruned of expired and older-
+#           generation rows and capped at SAMARTH_CACHE_DISK_SIZE rows
+#
+# Every entry remembers the data generation (catalog.py) it was computed at;
+# once an ingest bumps the generation, older entries are treated as misses.
+
+CACHE_SIZE = int(os.getenv("SAMARTH_CACHE_SIZE", "1024"))
+CACHE_TTL = float(os.getenv("SAMARTH_CACHE_TTL", "600"))
+CACHE_DIR = os.getenv("SAMARTH_CACHE_DIR")
+DISK_SIZE = int(os.getenv("SAMARTH_CACHE_DISK_SIZE", "50000"))
+PRUNE_EVERY = 100  # disk puts between prunes (and at every new generation)
+
+
+def cache_key(namespace: str, key):
+    return json.dumps([namespace, key], sort_keys=True, default=str)
+
+
+class AnswerCache:
+    def __init__(self, namespace: str, size: int = CACHE_SIZE, ttl: float = CACHE_TTL,
+                 disk_dir=CACHE_DIR, disk_size: int = DISK_SIZE):
+        self.namespace = namespace
+        self.size = size
+        self.ttl = ttl
+        self.disk_path = os.path.join(
+            disk_dir, "answers.sqlite") if disk_dir else None
+        self._entries = OrderedDict()  # key -> (expires_at, generation, value)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._generation = None
+        self.disk_size = disk_size
+        self._disk_puts = 0
+        self._disk_generation = None  # generation the disk tier was last pruned at
+        self.stats = {"hits": 0, "disk_hits": 0,
+                      "misses": 0, "evictions": 0, "invalidations": 0}
+        if self.disk_path:
+            os.makedirs(disk_dir, exist_ok=True)
+            with self._disk() as db:
+                db.execute("""
+                    CREATE TABLE IF NOT EXISTS answers (
+                        key TEXT PRIMARY KEY,
+                        generation INTEGER,
+                        expires_at REAL,
+                        value TEXT
+                    )
+                """)
+                db.execute("CREATE INDEX IF NOT EXISTS answers_expires ON answers (expires_at)")
+
+    # ---------- disk tier ----------
+    def _disk(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.disk_path, timeout=5)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def _disk_get(self, key: str, generation: int):
+        row = self._disk().execute(
+            "SELECT generation, expires_at, value FROM answers WHERE key = ?", [key]).fetchone()
+        if row and row[0] == generation and row[1] > time.time():
+            return json.loads(row[2]), row[1]
+        return None
+
+    def _disk_put(self, key: str, generation: int, expires_at: float, value):
+        with self._disk() as db:
+            db.execute("INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?)",
+                       [key, generation, expires_at, json.dumps(value)])
+            self._disk_puts += 1
+            if generation != self._disk_generation or self._disk_puts % PRUNE_EVERY == 0:
+                self._disk_generation = generation
+                self._disk_prune(db, generation)
+
+    def _disk_prune(self, db, generation: int):
+        # Rows no reader can hit any more, then all but the newest disk_size
+        db.execute("DELETE FROM answers WHERE generation < ? OR expires_at < ?",
+                   [generation, time.time()])
+        db.execute("""
+            DELETE FROM answers WHERE key IN (
+                SELECT key FROM answers ORDER BY expires_at DESC LIMIT -1 OFFSET ?)
+        """, [self.disk_size])
+
+    # ---------- memory tier ----------
+    def _check_generation(self, generation: int):
+        if generation != self._generation:
+            if self._generation is not None:
+                self.stats["invalidations"] += 1
+            self._entries.clear()
+            self._generation = generation
+
+    def get(self, key, generation: int):
+        k = cache_key(self.namespace, key)
+        now = time.time()
+        with self._lock:
+            self._check_generation(generation)
+            entry = self._entries.get(k)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(k)
+                self.stats["hits"] += 1
+                return True, entry[2]
+            if entry:
+                del self._entries[k]
+        if self.disk_path:
+            found = self._disk_get(k, generation)
+            if found:
+                value, expires_at = found
+                with self._lock:
+                    self._store(k, expires_at, generation, value)
+                    self.stats["disk_hits"] += 1
+                return True, value
+        with self._lock:
+            self.stats["misses"] += 1
+        return False, None
+
+    def _store(self, k: str, expires_at: float, generation: int, value):
+        self._entries[k] = (expires_at, generation, value)
+        self._entries.move_to_end(k)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def put(self, key, generation: int, value):
+        k = cache_key(self.namespace, key)
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._check_generation(generation)
+            self._store(k, expires_at, generation, value)
+        if self.disk_path:
+            self._disk_put(k, generation, expires_at, value)
+
+    def get_or_compute(self, key, generation: int, compute):
+        found, value = self.get(key, generation)
+        if found:
+            return value
+        value = compute()
+        self.put(key, generation, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.disk_path:
+            with self._disk() as db:
+                db.execute("DELETE FROM answers")
+
+    def counters(self):
+        with self._lock:
+            stats = dict(self.stats, entries=len(self._entries))
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
@@ -1,11 +1,12 @@
-from streamlit_lottie import st_lottie
 import streamlit as st
-import duckdb
-import pandas as pd
 import json
-import requests
-import plotly.express as px
-from ai_helper import get_answer
+import os
+import threading
+import catalog
+import charts
+import metrics
+from ai_helper import DB_FILE, answer_pages
+from db import get_pool
 
 # ---------- PAGE CONFIG ----------
 st.set_page_config(
@@ -15,24 +16,79 @@ st.set_page_config(
 )
 
 # ---------- LOTTIE HELPER ----------
+# Animations are read from assets/lottie/<name>.json when bundled there.
+# Missing ones are fetched once per process on a background thread with a
+# short timeout (and saved to assets/lottie for the next start), so a rerun
+# never blocks on lottie.host; until they arrive the app renders without them.
+LOTTIE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "lottie")
+LOTTIE_TIMEOUT = float(os.getenv("SAMARTH_LOTTIE_TIMEOUT", "2"))
+LOTTIE_URLS = {
+    "farmer": "https://lottie.host/5bb4f8c7-0b2f-4584-b98b-farmer.json",
+    "rain": "https://lottie.host/86f61ee5-83d0-44a4-89de-rain.json",
+    "crop": "https://lottie.host/1ab3b9b5-2db5-4020-a2ef-crop.json",
+}
 
 
-def load_lottieurl(url: str):
+def load_lottieurl(url: str, timeout: float = LOTTIE_TIMEOUT):
+    import requests
+
     try:
-        r = requests.get(url)
+        r = requests.get(url, timeout=timeout)
         if r.status_code == 200:
             return r.json()
     except Exception:
         return None
 
 
+def load_lottiefile(name: str):
+    try:
+        with open(os.path.join(LOTTIE_DIR, f"{name}.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def fetch_missing(animations: dict):
+    for name, url in LOTTIE_URLS.items():
+        if name in animations:
+            continue
+        anim = load_lottieurl(url)
+        if anim is None:
+            continue
+        animations[name] = anim
+        try:
+            os.makedirs(LOTTIE_DIR, exist_ok=True)
+            with open(os.path.join(LOTTIE_DIR, f"{name}.json"), "w", encoding="utf-8") as f:
+                json.dump(anim, f)
+        except OSError:
+            pass
+
+
+@st.cache_resource
+def lottie_animations():
+    animations = {}
+    for name in LOTTIE_URLS:
+        anim = load_lottiefile(name)
+        if anim is not None:
+            animations[name] = anim
+    if len(animations) < len(LOTTIE_URLS):
+        threading.Thread(target=fetch_missing, args=(animations,), daemon=True).start()
+    return animations
+
+
+# Plotly, requests and streamlit_lottie are imported where first used, so
+# the page paints before they load.
+def show_lottie(anim, **kwargs):
+    if anim:
+        from streamlit_lottie import st_lottie
+        st_lottie(anim, **kwargs)
+
+
 # ---------- LOAD ANIMATIONS ----------
-farmer_anim = load_lottieurl(
-    "https://lottie.host/5bb4f8c7-0b2f-4584-b98b-farmer.json")
-rain_anim = load_lottieurl(
-    "https://lottie.host/86f61ee5-83d0-44a4-89de-rain.json")
-crop_anim = load_lottieurl(
-    "https://lottie.host/1ab3b9b5-2db5-4020-a2ef-crop.json")
+animations = lottie_animations()
+farmer_anim = animations.get("farmer")
+rain_anim = animations.get("rain")
+crop_anim = animations.get("crop")
 
 # ---------- STYLING ----------
 st.markdown(
@@ -62,7 +118,79 @@ st.sidebar.info(
     "🧠 Runs 100% offline \n💧 Works with local crop & rainfall data")
 
 # ---------- DATABASE ----------
-con = duckdb.connect("samarth_data.duckdb")
+# Shares ai_helper's pooled read-only handle; this session's thread gets its own cursor
+@st.cache_resource
+def db_pool():
+    return get_pool(DB_FILE)
+
+
+pool = db_pool()
+
+
+# Chart frames are built in DuckDB from the entities the question resolved
+# to (charts.py) and cached per entity set and data generation, so
+# differently-worded questions about the same states share one entry.
+@st.cache_data(ttl=600)
+def rainfall_chart_data(states, year_from, year_to, last, generation: int):
+    with pool.cursor() as con:
+        return charts.rainfall_frame(con, states, year_from, year_to, last)
+
+
+@st.cache_data(ttl=600)
+def crop_chart_data(states, crop, generation: int):
+    with pool.cursor() as con:
+        return charts.price_frame(con, states, crop)
+
+
+@st.cache_data(ttl=600)
+def rainfall_price_chart_data(state, crop, season, generation: int):
+    with pool.cursor() as con:
+        return charts.rainfall_price_frame(con, state, crop, season)
+
+
+@st.cache_data(ttl=600)
+def price_trend_chart_data(state, crop, count, unit, generation: int):
+    with pool.cursor() as con:
+        return charts.price_trend_frame(con, state, crop, count, unit)
+
+
+def question_entities(question: str):
+    with pool.cursor() as con:
+        return charts.chart_entities(con, question)
+
+
+def data_generation():
+    with pool.cursor() as con:
+        return catalog.cached_generation(con)
+
+
+# ---------- ANSWER PAGES ----------
+# Answers arrive a page of rows at a time (ai_helper.answer_pages) and each
+# page is drawn as soon as it is fetched. Past SHOWN_PAGES the rest waits
+# behind a button that resumes from the last page's token.
+SHOWN_PAGES = int(os.getenv("SAMARTH_SHOWN_PAGES", "4"))
+
+
+def show_answer(page):
+    if page.table:
+        st.markdown(page.text)
+    else:
+        st.markdown(
+            f"<div style='padding:15px; background-color:#f1f8e9; border-radius:10px; line-height:1.6;'>{page.text}</div>",
+            unsafe_allow_html=True,
+        )
+
+
+def show_pages(question: str, token: str = None):
+    stream = answer_pages(question, token)
+    for shown, page in enumerate(stream, 1):
+        with metrics.stage("render"):
+            show_answer(page)
+        if page.more and shown == SHOWN_PAGES:
+            stream.close()
+            st.button("⬇️ Show more rows", key=f"more-{page.offset}",
+                      on_click=st.session_state.update, args=({"page_token": page.token},))
+            break
 
 # ---------- ASK AI ----------
 if menu == "Ask AI":
@@ -78,8 +206,7 @@ if menu == "Ask AI":
             unsafe_allow_html=True,
         )
     with col2:
-        if farmer_anim:
-            st_lottie(farmer_anim, height=150, key="farmer")
+        show_lottie(farmer_anim, height=150, key="farmer")
 
     st.markdown("---")
 
@@ -89,6 +216,8 @@ if menu == "Ask AI":
         - Compare **rainfall in Kerala and Gujarat 2010**.
         - Show **top 5 crops in Andhra Pradesh**.
         - What’s the **average price of rice in Andhra Pradesh**?
+        - How did **tomato prices in Karnataka track monsoon rainfall**?
+        - Show the **price trend of onion in Maharashtra over the last 6 months**.
         """)
 
     user_query = st.text_input("💬 Type your question below:")
@@ -96,73 +225,131 @@ if menu == "Ask AI":
     with colB:
         ask = st.button("🔍 Ask AI")
 
-    if ask and user_query.strip():
-        with st.spinner("🤖 Thinking..."):
+    # set by "Show more rows" for the rerun it triggers
+    page_token = st.session_state.pop("page_token", None)
+
+    if page_token and user_query.strip() and not ask:
+        with metrics.question("app_local", user_query):
+            try:
+                show_pages(user_query, page_token)
+            except Exception as e:
+                st.error(f"⚠️ Error: {e}")
+
+    elif ask and user_query.strip():
+        # One metrics trace per question: answer, chart query and rendering
+        with st.spinner("🤖 Thinking..."), metrics.question("app_local", user_query):
             try:
-                response = get_answer(user_query)
                 st.success("✅ Answer:")
-                st.markdown(
-                    f"<div style='padding:15px; background-color:#f1f8e9; border-radius:10px; line-height:1.6;'>{response}</div>",
-                    unsafe_allow_html=True,
-                )
+                show_pages(user_query)
 
                 q = user_query.lower()
+                states, year_from, year_to, last, crop = question_entities(user_query)
+
+                # ---------- PRICE VS RAINFALL VISUAL ----------
+                if "price" in q and ("rainfall" in q or "monsoon" in q):
+                    if states and crop:
+                        from rainfall_climate import season_of
+
+                        st.markdown("### 🌧️ Price vs Rainfall")
+                        with metrics.stage("chart_sql"):
+                            df = rainfall_price_chart_data(
+                                states[0], crop, season_of(q), data_generation())
+
+                        with metrics.stage("render"):
+                            import plotly.express as px
+                            fig = px.scatter(
+                                df.dropna(subset=["rainfall"]),
+                                x="rainfall",
+                                y="modal_price",
+                                text="year",
+                                title=charts.rainfall_price_title(states[0], crop),
+                            )
+                            fig.update_layout(
+                                xaxis_title="Rainfall (mm)",
+                                yaxis_title="Modal Price (₹)",
+                                plot_bgcolor="#f9fff6",
+                                paper_bgcolor="#ffffff",
+                            )
+                            st.plotly_chart(fig, use_container_width=True)
 
                 # ---------- RAINFALL VISUAL ----------
-                if "rainfall" in q:
-                    st.markdown("### 📈 Rainfall Trend (Sample Data)")
-                    df = con.execute("""
-                        SELECT subdivision, year, annual
-                        FROM rainfall_data
-                        WHERE year BETWEEN 2000 AND 2020
-                        LIMIT 300
-                    """).fetchdf()
-
-                    fig = px.line(
-                        df,
-                        x="year",
-                        y="annual",
-                        color="subdivision",
-                        title="Rainfall Trends Across Regions",
-                        markers=True,
-                    )
-                    fig.update_layout(
-                        title_font_color="#2e7d32",
-                        plot_bgcolor="#f9fff6",
-                        paper_bgcolor="#ffffff",
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
-                    if rain_anim:
-                        st_lottie(rain_anim, height=150, key="rain")
+                elif "rainfall" in q:
+                    st.markdown("### 📈 Rainfall Trend")
+                    with metrics.stage("chart_sql"):
+                        df = rainfall_chart_data(
+                            states, year_from, year_to, last, data_generation())
+
+                    with metrics.stage("render"):
+                        import plotly.express as px
+                        fig = px.line(
+                            df,
+                            x="year",
+                            y="annual",
+                            color="subdivision",
+                            title=charts.rainfall_title(states, year_from, year_to, last),
+                            markers=True,
+                        )
+                        fig.update_layout(
+                            title_font_color="#2e7d32",
+                            plot_bgcolor="#f9fff6",
+                            paper_bgcolor="#ffffff",
+                        )
+                        st.plotly_chart(fig, use_container_width=True)
+                    show_lottie(rain_anim, height=150, key="rain")
+
+                # ---------- PRICE TREND VISUAL ----------
+                elif "trend" in q and "price" in q:
+                    if states and crop:
+                        from intent_classifier import parse_recent_buckets
+
+                        count, unit = parse_recent_buckets(q)
+                        st.markdown("### 📈 Price Trend")
+                        with metrics.stage("chart_sql"):
+                            df = price_trend_chart_data(
+                                states[0], crop, count, unit, data_generation())
+
+                        with metrics.stage("render"):
+                            import plotly.express as px
+                            fig = px.line(
+                                df,
+                                x="bucket",
+                                y=["modal_avg", "modal_min", "modal_max"],
+                                title=charts.price_trend_title(states[0], crop, unit),
+                                markers=True,
+                            )
+                            fig.update_layout(
+                                xaxis_title="Week" if unit == "week" else "Month",
+                                yaxis_title="Modal Price (₹)",
+                                plot_bgcolor="#f9fff6",
+                                paper_bgcolor="#ffffff",
+                            )
+                            st.plotly_chart(fig, use_container_width=True)
+                    show_lottie(crop_anim, height=150, key="crop")
 
                 # ---------- CROP PRICE VISUAL ----------
                 elif "crop" in q or "price" in q:
                     st.markdown("### 🌾 Crop Price Comparison")
-                    df = con.execute("""
-                        SELECT commodity AS crop, AVG(modal_price) AS avg_price
-                        FROM crop_production
-                        GROUP BY commodity
-                        ORDER BY avg_price DESC
-                        LIMIT 10
-                    """).fetchdf()
-
-                    fig = px.bar(
-                        df,
-                        x="crop",
-                        y="avg_price",
-                        color="avg_price",
-                        color_continuous_scale="Greens",
-                        title="Top 10 Crops by Average Price",
-                    )
-                    fig.update_layout(
-                        xaxis_title="Crop",
-                        yaxis_title="Avg Price (₹)",
-                        plot_bgcolor="#f9fff6",
-                        paper_bgcolor="#ffffff",
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
-                    if crop_anim:
-                        st_lottie(crop_anim, height=150, key="crop")
+                    with metrics.stage("chart_sql"):
+                        df = crop_chart_data(states, crop, data_generation())
+
+                    with metrics.stage("render"):
+                        import plotly.express as px
+                        fig = px.bar(
+                            df,
+                            x="label",
+                            y="avg_price",
+                            color="avg_price",
+                            color_continuous_scale="Greens",
+                            title=charts.price_title(states, crop),
+                        )
+                        fig.update_layout(
+                            xaxis_title="District" if crop else "Crop",
+                            yaxis_title="Avg Price (₹)",
+                            plot_bgcolor="#f9fff6",
+                            paper_bgcolor="#ffffff",
+                        )
+                        st.plotly_chart(fig, use_container_width=True)
+                    show_lottie(crop_anim, height=150, key="crop")
 
             except Exception as e:
                 st.error(f"⚠️ Error: {e}")
@@ -187,8 +374,7 @@ elif menu == "About":
         """,
         unsafe_allow_html=True,
     )
-    if rain_anim:
-        st_lottie(rain_anim, height=180, key="rain_info")
+    show_lottie(rain_anim, height=180, key="rain_info")
 
 # ---------- FOOTER ----------
 st.markdown(
@@ -1,128 +1,87 @@
-import duckdb
-import re
 import json
+import pages
+import statements
+from db import get_pool
+from intent_classifier import get_classifier, keyword_classifier
+from resolver import get_resolver
 
-# Connect to database
-con = duckdb.connect("samarth.db")
+# Shared read-only DuckDB handle; one cursor per thread
+DB_FILE = "samarth.db"
+pool = get_pool(DB_FILE)
 
 # Helper: Find all matching subdivisions for a state
 
 
 def get_matching_subdivisions(state):
-    subs = con.execute(
-        "SELECT DISTINCT lower(subdivision) FROM rainfall").fetchall()
-    state = state.lower().strip()
-    matches = [s[0] for s in subs if state in s[0]]  # partial match
-    return matches if matches else [state]
+    # Resolved against an in-memory index built once per data generation
+    # instead of scanning DISTINCT subdivisions on every question.
+    with pool.cursor() as con:
+        return get_resolver(con).subdivisions_for(state)
 
 # Helper: Intent detection
 
 
 def detect_intent(question):
-    q = question.lower()
-
-    if "rainfall" in q and "compare" in q:
-        return "compare_rainfall"
-    if "rainfall" in q:
-        return "rainfall_info"
-    if "top" in q and "crop" in q:
-        return "top_crops"
-    if "highest" in q and "production" in q:
-        return "highest_production"
-    return "unknown"
+    return keyword_classifier.intent(question, "nlp_engine")
 
 # Main function
 
 
 def answer_question(question):
-    intent = detect_intent(question)
+    return "\n\n".join(page.text for page in answer_pages(question))
+
+
+def answer_pages(question):
+    # The answer a page of rows at a time (pages.py), fetched as it is read
+    with pool.cursor() as con:
+        parsed = get_classifier(con).classify(question, "nlp_engine")
+    intent = parsed.intent
     print(f"\nIntent detected: {intent}")
 
     # Extract states, years, etc.
-    states = re.findall(r'\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\b', question)
-    year_match = re.search(r'\b(20\d{2})\b', question)
-    year = int(year_match.group(1)) if year_match else None
-    N_match = re.search(r'top\s*(\d+)', question.lower())
-    N = int(N_match.group(1)) if N_match else 3
-    crop_match = re.search(
-        r'\b(rice|wheat|maize|sugarcane|cotton|millet|paddy)\b', question.lower())
-    crop = crop_match.group(1) if crop_match else None
-
-    sql = None
+    states = list(dict.fromkeys(
+        e.value.title() for e in parsed.of_kind("state", "subdivision")))
+    year = parsed.first("year")
+    N = parsed.first("top_n") or 3
+    crop = parsed.first("commodity")
+
+    statement = None
     result = None
 
     # ---------------- Rainfall Comparison ----------------
+    # Each state's average over the last N years with rows, every
+    # subdivision covering it counted (statements.rainfall_window)
     if intent == "compare_rainfall":
         all_matches = []
         for st in states:
             all_matches.extend(get_matching_subdivisions(st))
-
-        placeholders = ", ".join([f"'{m}'" for m in all_matches])
-        sql = f"""
-            WITH selected_years AS (
-                SELECT year
-                FROM rainfall
-                WHERE lower(subdivision) IN ({placeholders})
-                GROUP BY year
-                ORDER BY year DESC
-                LIMIT {N}
-            ),
-            state_agg AS (
-                SELECT
-                    CASE
-                        {" ".join([f"WHEN lower(subdivision) LIKE '%{st.lower()}%' THEN '{st}'" for st in states])}
-                        ELSE lower(subdivision)
-                    END AS state,
-                    year,
-                    AVG(COALESCE(annual, jan+feb+mar+apr+may+jun+jul+aug+sep+oct+nov+dec)) AS rainfall
-                FROM rainfall
-                WHERE lower(subdivision) IN ({placeholders})
-                GROUP BY 1,2
-            )
-            SELECT state, AVG(rainfall) AS avg_annual_rainfall
-            FROM state_agg
-            WHERE year IN (SELECT year FROM selected_years)
-            GROUP BY state;
-        """
+        statement = ("compare_rainfall_average", states, all_matches, None, None, N)
 
     # ---------------- Top Crops ----------------
     elif intent == "top_crops":
         state = states[0] if states else "Karnataka"
-        year_filter = f"AND year = {year}" if year else ""
-        sql = f"""
-            SELECT crop, SUM(production_tonnes) AS total_production
-            FROM crop_prod
-            WHERE lower(state_name) = '{state.lower()}' {year_filter}
-            GROUP BY crop
-            ORDER BY total_production DESC
-            LIMIT {N};
-        """
+        statement = ("crop_production_top", state.lower(), year, N)
 
     # ---------------- Highest Production District ----------------
     elif intent == "highest_production":
         state = states[0] if states else "Karnataka"
-        year_filter = f"AND year = {year}" if year else ""
-        crop_filter = f"AND lower(crop) = '{crop}'" if crop else ""
-        sql = f"""
-            SELECT district_name, SUM(production_tonnes) AS total_production
-            FROM crop_prod
-            WHERE lower(state_name) = '{state.lower()}' {year_filter} {crop_filter}
-            GROUP BY district_name
-            ORDER BY total_production DESC
-            LIMIT 5;
-        """
+        statement = ("district_production_top", state.lower(), year,
+                     crop.lower() if crop else None)
 
     # ---------------- Execute SQL ----------------
-    if sql:
+    if statement:
         try:
-            result = con.execute(sql).df()
+            # a cursor of its own: the result is read between yields
+            with pool.own_cursor() as con:
+                for result in pages.paginate(pages.record_batches(statements.run(con, *statement)),
+                                             pages.markdown_table, table=True):
+                    yield result
         except Exception as e:
-            return f"SQL execution failed: {e}\n\n{sql}"
-
-    if result is None or result.empty:
-        return "No data found for the given query."
+            yield pages.Page(f"SQL execution failed: {e}\n\n{statement[0]}")
+            return
 
-    return result.to_string(index=False)
+    if result is None:
+        yield pages.Page("No data found for the given query.")
 
 
 # ---------------- CLI Interface ----------------
@@ -135,4 +94,7 @@ if __name__ == "__main__":
         if q.lower() in ["exit", "quit"]:
             break
         print("\nAnswer:")
-        print(answer_question(q))
+        for page in answer_pages(q):
+            print(page.text)
+            if page.more and input("\n-- more rows: Enter, or q to stop -- ").strip().lower() == "q":
+                break
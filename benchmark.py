@@ -0,0 +1,515 @@
+import argparse
+import json
+import math
+import os
+import platform
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import duckdb
+
+import statements
+
+DB_FILE = "samarth_data.duckdb"
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+QUESTIONS = [
+    ("rainfall_by_state_year", ("kerala", 2010)),
+    ("rainfall_by_state_year", ("gujarat", 1990)),
+    ("top_crops", ("andhra pradesh", 5)),
+    ("highest_production", ("andhra pradesh",)),
+    ("average_price", ("andhra pradesh", "tomato")),
+]
+
+
+# ---------------------- HELPERS ----------------------
+def timed(fn, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return {
+        "mean_us": statistics.mean(samples),
+        "p50_us": statistics.median(samples),
+        "p95_us": sorted(samples)[math.ceil(0.95 * len(samples)) - 1],
+    }
+
+
+def report(title: str, rows):
+    print(f"\n📏 {title}")
+    for name, stats in rows:
+        print(f"  {name:<40} mean {stats['mean_us']:>9.1f} µs   "
+              f"p50 {stats['p50_us']:>9.1f} µs   p95 {stats['p95_us']:>9.1f} µs")
+
+
+# ---------------------- QUERY LATENCY ----------------------
+# The "before" side rebuilds the f-string SQL the intents used to send, so
+# DuckDB parses and plans a fresh statement on every question.
+def inline_sql(name: str, values):
+    if name == "rainfall_by_state_year":
+        state, year = values
+        return f"""
+            SELECT ANNUAL FROM rainfall_data
+            WHERE LOWER(SUBDIVISION) LIKE '%{state}%'
+            AND YEAR = {year}
+        """
+    if name == "top_crops":
+        state, n = values
+        return f"""
+            SELECT state, district, market, commodity AS crop,
+                   AVG(modal_price) AS avg_price
+            FROM crop_production
+            WHERE LOWER(state) LIKE '%{state}%'
+            GROUP BY state, district, market, commodity
+            ORDER BY avg_price DESC
+            LIMIT {n}
+        """
+    if name == "highest_production":
+        (state,) = values
+        return f"""
+            SELECT district, commodity AS crop, AVG(modal_price) AS avg_price
+            FROM crop_production
+            WHERE LOWER(state) LIKE '%{state}%'
+            GROUP BY district, commodity
+            ORDER BY avg_price DESC
+            LIMIT 1
+        """
+    state, crop = values
+    return f"""
+        SELECT AVG(modal_price) AS avg_price
+        FROM crop_production
+        WHERE LOWER(state) LIKE '%{state}%'
+        AND LOWER(commodity) LIKE '%{crop}%'
+    """
+
+
+def bench_queries(args):
+    repeat = args.repeat
+    con = duckdb.connect(args.db, read_only=True)
+    statements.resolve_all(con)
+    rows = []
+    for name, values in QUESTIONS:
+        label = f"{name}{values}"
+        rows.append((f"inline  {label}", timed(
+            lambda: con.execute(inline_sql(name, values)).fetchdf(), repeat)))
+        rows.append((f"bound   {label}", timed(
+            lambda: statements.run(con, name, *values).fetchdf(), repeat)))
+    con.close()
+    report("Per-question latency: inline SQL vs registry", rows)
+    return rows
+
+
+# ---------------------- DOWNLOADER THROUGHPUT ----------------------
+# A local stand-in for the data.gov.in resource API: serves `total` synthetic
+# mandi price records by offset/limit, with optional per-request latency.
+class StubResourceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so session reuse is measurable
+    total = 20000
+    latency = 0.01
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        offset = int(query.get("offset", ["0"])[0])
+        limit = int(query.get("limit", ["10"])[0])
+        records = [
+            {"state": f"state {i % 30}", "district": f"district {i % 400}",
+             "market": f"market {i % 2000}", "commodity": f"crop {i % 150}",
+             "variety": "other", "grade": "faq", "arrival_date": "29/10/2025",
+             "min_price": 1000 + i % 500, "max_price": 2000 + i % 700,
+             "modal_price": 1500 + i % 600}
+            for i in range(offset, min(offset + limit, self.total))
+        ]
+        body = json.dumps({"total": self.total, "offset": offset,
+                           "limit": limit, "records": records}).encode()
+        time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubResourceHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/resource"
+
+
+def bench_download(args):
+    from downloader import download
+
+    server, url = start_stub_server()
+    out_dir = tempfile.mkdtemp(prefix="samarth_download_")
+    results = {}
+    try:
+        for concurrency in (1, 4, 16):
+            shutil.rmtree(out_dir, ignore_errors=True)
+            print(f"\n🔁 concurrency={concurrency}")
+            results[concurrency] = download(
+                url, out_dir, page_size=500, concurrency=concurrency)
+    finally:
+        server.shutdown()
+        shutil.rmtree(out_dir, ignore_errors=True)
+    return results
+
+
+# ---------------------- CLASSIFIER THROUGHPUT ----------------------
+# The keyword chains and regexes detect_intent / plan_query used before the
+# compiled classifier, kept here as the baseline.
+def legacy_classify(question: str):
+    q = question.lower()
+    if "rainfall" in q and ("average" in q or "mean" in q):
+        intent = "average_rainfall"
+    elif "compare" in q and "rainfall" in q:
+        intent = "compare_rainfall"
+    elif "highest" in q and "production" in q:
+        intent = "highest_production"
+    elif "top" in q and "crop" in q:
+        intent = "top_crops"
+    elif "price" in q and ("average" in q or "modal" in q):
+        intent = "average_price"
+    else:
+        intent = "unknown"
+    states = re.findall(r"\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\b", question)
+    year_match = re.search(r"\b(20\d{2})\b", question)
+    n_match = re.search(r"top\s*(\d+)", q)
+    crop_match = re.search(
+        r"\b(rice|wheat|maize|sugarcane|cotton|millet|paddy)\b", q)
+    return intent, states, year_match, n_match, crop_match
+
+
+CLASSIFIER_QUESTIONS = [
+    "Average rainfall in Kerala 2010",
+    "Compare rainfall in Kerala and Gujarat over the last 5 years",
+    "Show top 5 crops in Andhra Pradesh in 2020",
+    "Which district in Tamil Nadu had the highest production of rice in 2019",
+    "What is the average price of tomato in Maharashtra",
+    "Tell me something about the weather",
+]
+
+
+def bench_classifier(args):
+    from intent_classifier import get_classifier
+
+    con = duckdb.connect(args.db, read_only=True)
+    classifier = get_classifier(con)
+    con.close()
+    batch = CLASSIFIER_QUESTIONS * 500
+    rows = []
+    for label, fn in [("legacy keyword chain + regexes", legacy_classify),
+                      ("compiled automaton (intent only)", classifier.intent),
+                      ("compiled automaton (intent + entities)", classifier.classify)]:
+        start = time.perf_counter()
+        for question in batch:
+            fn(question)
+        elapsed = time.perf_counter() - start
+        per_question = elapsed / len(batch) * 1e6
+        rows.append((label, {"mean_us": per_question, "p50_us": per_question,
+                             "p95_us": per_question}))
+        print(f"  {label:<40} {len(batch) / elapsed:>10,.0f} questions/sec")
+    report("Classifier cost per question (batch of 3000)", rows)
+    return rows
+
+
+# ---------------------- BATCH ANSWERS ----------------------
+# A bulletin-sized set of questions answered one get_answer() at a time vs a
+# single get_answers() call. The answer cache is cleared before every run so
+# both sides hit the database.
+BATCH_QUESTIONS = [
+    "Average rainfall in {state} {year}",
+    "Compare rainfall in {state} and Gujarat {year}",
+    "Top 5 crops in {state}",
+    "Which district in {state} had highest production",
+    "Average price of tomato in {state}",
+]
+BATCH_STATES = ["Kerala", "Andhra Pradesh", "Tamil Nadu", "Bihar", "Punjab"]
+
+
+def bench_batch(args):
+    import ai_helper
+    from db import get_pool
+
+    ai_helper.pool = get_pool(args.db)
+    questions = [template.format(state=state, year=year)
+                 for year in range(1951, 2011)
+                 for state in BATCH_STATES
+                 for template in BATCH_QUESTIONS][:500]
+    repeat = max(1, args.repeat // 100)
+
+    def one_at_a_time():
+        ai_helper.answer_cache.clear()
+        for question in questions:
+            ai_helper.get_answer(question)
+
+    def batched():
+        ai_helper.answer_cache.clear()
+        ai_helper.get_answers(questions)
+
+    rows = [(f"get_answer x {len(questions)}", timed(one_at_a_time, repeat)),
+            (f"get_answers([{len(questions)}])", timed(batched, repeat))]
+    report(f"{len(questions)} questions: per-question vs batched", rows)
+    return rows
+
+
+# ---------------------- ENGINES AT SCALE ----------------------
+# Runs the Q&A engines against synthetic data (synth_data.py) at each
+# --scales factor: intent detection, every ai_helper intent, and the
+# nlp_engine planner + fetch. Scaled data is generated into --data-dir once
+# and reused by later runs.
+ENGINE_QUESTIONS = {
+    "average_rainfall": "Average rainfall in Kerala 2010",
+    "compare_rainfall": "Compare rainfall in Kerala and Gujarat 2005",
+    "top_crops": "Top 5 crops in Andhra Pradesh",
+    "highest_production": "highest production in Andhra Pradesh",
+    "average_price": "Average price of tomato in Andhra Pradesh",
+}
+NLP_QUESTIONS = {
+    "compare_rainfall": "Compare rainfall in Kerala and Karnataka over the last 5 years",
+    "top_crops": "Show top 3 crops in Karnataka in 2021",
+    "highest_production": "Which district in Tamil Nadu had the highest production of rice in 2021",
+}
+LOADERS = ["load_available_data.py", "ingest.py", "load_crop_data.py"]
+
+
+def scaled_data(args, scale: int):
+    import synth_data
+
+    path = os.path.join(args.data_dir, f"x{scale}")
+    if not os.path.exists(os.path.join(path, "samarth_data.duckdb")):
+        print(f"🧪 Generating x{scale} synthetic data in {path}/ ...")
+        synth_data.generate(scale, path, REPO_DIR)
+    return path
+
+
+def check_questions(ai_helper, nlp_engine):
+    # A question that misses its intent or entities would time the hint
+    # message instead of the query it is named after
+    with ai_helper.pool.cursor() as con:
+        for intent, question in ENGINE_QUESTIONS.items():
+            if ai_helper.detect_intent(question) != intent or \
+                    ai_helper.extract_entities(con, intent, question) is None:
+                raise ValueError(f"ENGINE_QUESTIONS[{intent!r}] is not answered as {intent}")
+    for intent, question in NLP_QUESTIONS.items():
+        if nlp_engine.plan_query(question)["intent"] != intent:
+            raise ValueError(f"NLP_QUESTIONS[{intent!r}] is not planned as {intent}")
+
+
+def repeats_for(args, scale: int):
+    return max(3, args.repeat // scale)
+
+
+def bench_engines(args):
+    import ai_helper
+    import nlp_engine
+    from db import get_pool
+
+    check_questions(ai_helper, nlp_engine)  # on the shipped data
+    rows = []
+    for scale in args.scales:
+        data = scaled_data(args, scale)
+        ai_helper.pool = get_pool(os.path.join(data, "samarth_data.duckdb"))
+        nlp_engine.pool = get_pool(os.path.join(data, "samarth.db"))
+        repeat = repeats_for(args, scale)
+        questions = list(ENGINE_QUESTIONS.values()) + list(NLP_QUESTIONS.values())
+
+        rows.append((f"x{scale} detect_intent", timed(
+            lambda: [ai_helper.detect_intent(q) for q in questions], repeat)))
+        # the first question also builds the resolver / classifier
+        rows.append((f"x{scale} cold answer_query", timed(
+            lambda: ai_helper.answer_query("average_rainfall", ENGINE_QUESTIONS["average_rainfall"]), 1)))
+        for intent, question in ENGINE_QUESTIONS.items():
+            rows.append((f"x{scale} answer_query {intent}", timed(
+                lambda: ai_helper.answer_query(intent, question), repeat)))
+        rows.append((f"x{scale} cold nlp_engine", timed(
+            lambda: nlp_engine.plan_query(NLP_QUESTIONS["top_crops"]), 1)))
+        for intent, question in NLP_QUESTIONS.items():
+            rows.append((f"x{scale} nlp_engine {intent}", timed(
+                lambda: nlp_engine.run_plan_and_fetch(nlp_engine.plan_query(question)), repeat)))
+    report("Q&A engines on synthetic data", rows)
+    return rows
+
+
+# ---------------------- LOADERS AT SCALE ----------------------
+# Runs each loader script end to end (fresh interpreter, as it is run in
+# production) in a scratch copy of the scaled CSVs.
+def bench_loaders(args):
+    rows = []
+    for scale in args.scales:
+        data = scaled_data(args, scale)
+        work = tempfile.mkdtemp(prefix=f"samarth_load_x{scale}_")
+        env = dict(os.environ, PYTHONPATH=REPO_DIR)
+        try:
+            shutil.copytree(data, work, dirs_exist_ok=True,
+                            ignore=shutil.ignore_patterns("*.duckdb", "*.db"))
+            for script in LOADERS:
+                def run():
+                    subprocess.run([sys.executable, os.path.join(REPO_DIR, script)],
+                                   cwd=work, env=env, check=True,
+                                   stdout=subprocess.DEVNULL)
+                rows.append((f"x{scale} {script}", timed(run, max(1, 3 // scale))))
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+    report("Loader scripts on synthetic CSVs (incl. interpreter start-up)", rows)
+    return rows
+
+
+def to_json(suite: str, args, results):
+    if isinstance(results, list):
+        results = {name: stats for name, stats in results}
+    return {
+        "suite": suite,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "duckdb": duckdb.__version__,
+        "machine": platform.machine(),
+        "options": {k: v for k, v in vars(args).items() if k != "json"},
+        "results": results,
+    }
+
+
+# ---------------------- STREAMLIT APP ----------------------
+# Drives app_local.py headlessly with Streamlit's AppTest: the first script
+# run approximates time-to-first-paint, later runs the per-interaction
+# latency of a rerun and of asking a question. Run from the repo directory
+# (the app opens its database by relative path).
+APP_QUESTIONS = {
+    "rainfall": "Compare rainfall in Kerala and Gujarat 2010",
+    "price": "Average price of tomato in Andhra Pradesh",
+}
+
+
+def bench_app(args):
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        print("⚠️ streamlit is not installed; skipping the app suite.")
+        return []
+
+    app = AppTest.from_file(os.path.join(REPO_DIR, "app_local.py"), default_timeout=120)
+    repeat = max(3, args.repeat // 20)
+    rows = [("first paint (cold script run)", timed(app.run, 1)),
+            ("rerun without interaction", timed(app.run, repeat))]
+    for label, question in APP_QUESTIONS.items():
+        def ask():
+            app.text_input[0].input(question)
+            app.button[0].click()
+            app.run()
+        rows.append((f"ask {label} question", timed(ask, repeat)))
+    report("app_local.py script runs (AppTest)", rows)
+    return rows
+
+
+# ---------------------- STARTUP ----------------------
+# Fresh interpreters, as a CLI invocation or test script would start: bare
+# imports, and import plus the first answer. Runs next to --db, so the
+# engines find their database files there.
+STARTUP_CASES = {
+    "python -c pass (baseline)": "pass",
+    "import ai_helper": "import ai_helper",
+    "import nlp_engine": "import nlp_engine",
+    "ai_helper first answer": (
+        "import ai_helper; ai_helper.get_answer('Average rainfall in Kerala 2010')"),
+    "nlp_engine first answer": (
+        "import nlp_engine as n; "
+        "n.format_answer(n.run_plan_and_fetch(n.plan_query('Top 3 crops in Karnataka 2021')))"),
+}
+
+
+def bench_startup(args):
+    cwd = os.path.dirname(os.path.abspath(args.db))
+    env = dict(os.environ, PYTHONPATH=REPO_DIR)
+    rows = []
+    for label, code in STARTUP_CASES.items():
+        def run():
+            subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env,
+                           check=True, stdout=subprocess.DEVNULL)
+        rows.append((label, timed(run, max(3, args.repeat // 20))))
+    report("Start-up: import and time to first answer", rows)
+    return rows
+
+
+# ---------------------- RAINFALL CUBE ----------------------
+# Rainfall answers off the NumPy cube (rainfall_cube.py) against the SQL
+# fallback, same questions, same connection, plus the climatology lookups
+# (rainfall_climate.py) that have no SQL counterpart.
+CLIMATE_QUESTIONS = {
+    "rainfall_trend": "Rainfall trend in Kerala since 1957",
+    "driest_years": "Driest years in Vidarbha",
+    "monsoon_status": "Was the 2002 monsoon below normal in Punjab",
+}
+
+def bench_cube(args):
+    import ai_helper
+    import nlp_engine
+    import rainfall_cube
+    from db import get_pool
+
+    rows = []
+    for scale in args.scales:
+        data = scaled_data(args, scale)
+        ai_helper.pool = get_pool(os.path.join(data, "samarth_data.duckdb"))
+        nlp_engine.pool = get_pool(os.path.join(data, "samarth.db"))
+        repeat = repeats_for(args, scale)
+        rows.append((f"x{scale} cold cube load", timed(
+            lambda: ai_helper.answer_query("average_rainfall", ENGINE_QUESTIONS["average_rainfall"]), 1)))
+        plan = nlp_engine.plan_query(NLP_QUESTIONS["compare_rainfall"])
+        for enabled, label in [(False, "sql "), (True, "cube")]:
+            rainfall_cube.ENABLED = enabled
+            for intent in ["average_rainfall", "compare_rainfall"]:
+                question = ENGINE_QUESTIONS[intent]
+                rows.append((f"x{scale} {label} answer_query {intent}", timed(
+                    lambda: ai_helper.answer_query(intent, question), repeat)))
+            rows.append((f"x{scale} {label} nlp_engine compare_rainfall", timed(
+                lambda: nlp_engine.run_plan_and_fetch(plan), repeat)))
+        rainfall_cube.ENABLED = True
+        for intent, question in CLIMATE_QUESTIONS.items():
+            rows.append((f"x{scale} climate answer_query {intent}", timed(
+                lambda: ai_helper.answer_query(intent, question), repeat)))
+    rainfall_cube.ENABLED = True
+    report("Rainfall answers: cube vs SQL", rows)
+    return rows
+
+
+BENCHMARKS = {
+    "queries": bench_queries,
+    "download": bench_download,
+    "classifier": bench_classifier,
+    "batch": bench_batch,
+    "engines": bench_engines,
+    "loaders": bench_loaders,
+    "app": bench_app,
+    "startup": bench_startup,
+    "cube": bench_cube,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Project Samarth micro-benchmarks")
+    parser.add_argument("suite", nargs="?", default="queries",
+                        choices=sorted(BENCHMARKS))
+    parser.add_argument("--db", default=DB_FILE)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--scales", default="1,100",
+                        type=lambda s: [int(x) for x in s.split(",")],
+                        help="synthetic data scale factors, e.g. 1,100,10000")
+    parser.add_argument("--data-dir", default="bench_data")
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    args = parser.parse_args()
+    results = BENCHMARKS[args.suite](args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(to_json(args.suite, args, results), f, indent=2, default=str)
+        print(f"\n💾 Results written to {args.json}")
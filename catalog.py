@@ -0,0 +1,104 @@
+import time
+import weakref
+
+# ---------------------- DATA GENERATION ----------------------
+# Loaders bump a per-database generation counter whenever they rewrite
+# tables. Anything built from table contents (entity resolver, caches)
+# remembers the generation it was built at and rebuilds when it moves.
+
+META_TABLE = "samarth_meta"
+RECHECK_SECONDS = 5.0
+
+_last_seen = {}  # database path -> (checked_at, generation)
+
+
+def has_table(con, name: str):
+    return con.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE lower(table_name) = lower(?)",
+        [name],
+    ).fetchone()[0] > 0
+
+
+def first_table(con, *names):
+    for name in names:
+        if has_table(con, name):
+            return name
+    return None
+
+
+def table_columns(con, name: str):
+    return [r[0].lower() for r in con.execute(
+        "SELECT column_name FROM information_schema.columns WHERE lower(table_name) = lower(?)",
+        [name],
+    ).fetchall()]
+
+
+def column_types(con, name: str):
+    return {r[0].lower(): r[1] for r in con.execute(f"DESCRIBE {name}").fetchall()}
+
+
+STORE_VIEW = "samarth_store"
+
+
+_paths = weakref.WeakKeyDictionary()  # connection/cursor -> database path
+
+
+def database_path(con):
+    # A handle never changes database, so the lookup is done once per
+    # connection; hot paths (cached_generation, get_resolver, get_cube)
+    # call this on every question
+    try:
+        return _paths[con]
+    except (KeyError, TypeError):
+        pass
+    path = _database_path(con)
+    try:
+        _paths[con] = path
+    except TypeError:
+        pass
+    return path
+
+
+def _database_path(con):
+    row = con.execute(
+        "SELECT path FROM duckdb_databases() WHERE database_name = current_database()"
+    ).fetchone()
+    if row and row[0]:
+        return row[0]
+    # In-memory handles over a Parquet store (parquet_store.py) name the
+    # store they serve through a one-row view
+    if has_table(con, STORE_VIEW):
+        return con.execute(f"SELECT path FROM {STORE_VIEW}").fetchone()[0]
+    return ":memory:"
+
+
+def current_generation(con):
+    if not has_table(con, META_TABLE):
+        return 0
+    row = con.execute(
+        f"SELECT value FROM {META_TABLE} WHERE key = 'generation'").fetchone()
+    return row[0] if row else 0
+
+
+def cached_generation(con):
+    # Cheap variant for hot paths: re-reads the counter at most every
+    # RECHECK_SECONDS per database.
+    path = database_path(con)
+    checked_at, generation = _last_seen.get(path, (0.0, None))
+    now = time.monotonic()
+    if generation is None or now - checked_at > RECHECK_SECONDS:
+        generation = current_generation(con)
+        _last_seen[path] = (now, generation)
+    return generation
+
+
+def bump_generation(con):
+    con.execute(
+        f"CREATE TABLE IF NOT EXISTS {META_TABLE} (key VARCHAR PRIMARY KEY, value BIGINT)")
+    con.execute(f"""
+        INSERT INTO {META_TABLE} VALUES ('generation', 1)
+        ON CONFLICT (key) DO UPDATE SET value = value + 1
+    """)
+    generation = current_generation(con)
+    _last_seen.pop(database_path(con), None)
+    return generation
@@ -0,0 +1,82 @@
+import os
+
+import statements
+from intent_classifier import get_classifier, parse_year_range
+
+# ---------------------- QUESTION-AWARE CHARTS ----------------------
+# The visuals in app_local.py follow what the question resolved to instead
+# of a fixed sample: the asked-about states, the year range the answer uses
+# (parse_year_range: "since 2000", "last 5 years", ...) or else a window
+# around the asked-about years, and the crop when there is one. Aggregation and downsampling run in
+# DuckDB (statements.py: chart_rainfall / chart_prices), so Plotly only ever
+# receives at most SAMARTH_CHART_POINTS points per subdivision, however long
+# the history grows. The frames depend only on chart_entities(), which is
+# what app_local caches them on.
+
+CHART_POINTS = int(os.getenv("SAMARTH_CHART_POINTS", "60"))
+YEAR_WINDOW = 10  # years either side of a single asked-about year
+PRICE_BARS = 10
+
+
+def chart_entities(con, question: str):
+    # Hashable summary of what a chart needs: (states, from, to, last, crop)
+    parsed = get_classifier(con).classify(question, "ai_helper")
+    states = tuple(sorted(dict.fromkeys(
+        e.value for e in parsed.of_kind("state", "subdivision"))))
+    year_from, year_to, last = parse_year_range(question)
+    if year_from is None and year_to is None and last is None:
+        years = [e.value for e in parsed.of_kind("year")]
+        year_from = min(years) - YEAR_WINDOW if years else None
+        year_to = max(years) + YEAR_WINDOW if years else None
+    return states, year_from, year_to, last, parsed.first("commodity")
+
+
+def rainfall_frame(con, states, year_from=None, year_to=None, last=None,
+                   points: int = CHART_POINTS):
+    # subdivision, year, annual
+    return statements.run(con, "chart_rainfall", list(states),
+                          year_from, year_to, last, points).fetchdf()
+
+
+def price_frame(con, states, crop=None, limit: int = PRICE_BARS):
+    # label (commodity, or district when a crop is given), avg_price
+    return statements.run(con, "chart_prices", list(states), crop, limit).fetchdf()
+
+
+def rainfall_price_frame(con, state, crop, season="jjas"):
+    # year, modal_price, rainfall, ... (statements.rainfall_vs_price)
+    return statements.run(con, "rainfall_vs_price", state, crop, season).fetchdf()
+
+
+def price_trend_frame(con, state, crop, count, unit):
+    # bucket, n, modal_avg, modal_min, modal_max, ... (statements.price_trend)
+    return statements.run(con, f"price_trend_{unit}", state, crop, count).fetchdf()
+
+
+def rainfall_title(states, year_from, year_to, last=None):
+    where = ", ".join(s.title() for s in states) if states else "All Subdivisions"
+    if year_from is not None and year_to is not None:
+        return f"Annual Rainfall — {where} ({year_from}–{year_to})"
+    if year_from is not None:
+        return f"Annual Rainfall — {where} (since {year_from})"
+    if year_to is not None:
+        return f"Annual Rainfall — {where} (until {year_to})"
+    if last is not None:
+        return f"Annual Rainfall — {where} (last {last} years)"
+    return f"Annual Rainfall — {where}"
+
+
+def price_title(states, crop):
+    where = ", ".join(s.title() for s in states) if states else "All States"
+    if crop:
+        return f"Average {crop.title()} Price by District — {where}"
+    return f"Top {PRICE_BARS} Crops by Average Price — {where}"
+
+
+def rainfall_price_title(state, crop):
+    return f"{crop.title()} Price vs Rainfall — {state.title()}"
+
+
+def price_trend_title(state, crop, unit):
+    cadence = "Weekly" if unit == "week" else "Monthly"
+    return f"{cadence} {crop.title()} Prices — {state.title()}"
@@ -0,0 +1,127 @@
+import glob
+import os
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# ---------------------- STREAMING CSV LOADER ----------------------
+# Loads CSVs with DuckDB's native reader instead of pandas. The scan is
+# streamed straight into the target table, text normalisation runs as SQL
+# expressions during the load, and peak memory is capped by DuckDB's
+# memory_limit (spilling to temp_directory beyond it). Globs are loaded one
+# file per batch so progress is reported as it goes.
+#
+#   SAMARTH_MEMORY_LIMIT   DuckDB memory cap while loading (default 1GB)
+#   SAMARTH_TEMP_DIR       spill directory (default .duckdb_tmp)
+
+MEMORY_LIMIT = os.getenv("SAMARTH_MEMORY_LIMIT", "1GB")
+TEMP_DIR = os.getenv("SAMARTH_TEMP_DIR", ".duckdb_tmp")
+
+
+def configure(con, memory_limit: str = MEMORY_LIMIT, temp_dir: str = TEMP_DIR):
+    con.execute(f"SET memory_limit = '{memory_limit}'")
+    con.execute(f"SET temp_directory = '{temp_dir}'")
+    # Lets the scan -> insert pipeline run without buffering to keep row order
+    con.execute("SET preserve_insertion_order = false")
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def clean_name(name: str):
+    return name.strip().lower().replace(" ", "_")
+
+
+def quote(name: str):
+    return '"' + name.replace('"', '""') + '"'
+
+
+# Same missing-value markers pandas.read_csv treats as NaN
+NULL_STRINGS = ["", "NA", "N/A", "NaN", "nan", "NULL", "null", "None", "#N/A"]
+
+
+def read_csv(path: str, types=None):
+    # (table function SQL, parameters) for a streaming scan of one file
+    options = "header = true, nullstr = ?"
+    params = [path, NULL_STRINGS]
+    if types:
+        options += ", types = ?"
+        params.append(types)
+    return f"read_csv(?, {options})", params
+
+
+def describe_csv(con, path: str, types=None):
+    scan, params = read_csv(path, types)
+    return con.execute(f"DESCRIBE SELECT * FROM {scan}", params).fetchall()
+
+
+def types_for(con, path: str, types=None):
+    # read_csv rejects type overrides for columns a file doesn't have
+    if not types:
+        return {}
+    present = {row[0] for row in describe_csv(con, path)}
+    return {name: dtype for name, dtype in types.items() if name in present}
+
+
+def select_list(con, path: str, columns=None, normalize_names=False,
+                normalize_text=True, types=None):
+    exprs = []
+    for row in describe_csv(con, path, types):
+        name, dtype = row[0], row[1]
+        target = clean_name(name) if normalize_names else name
+        if columns is not None and target not in columns:
+            continue
+        expr = quote(name)
+        if normalize_text and dtype == "VARCHAR":
+            expr = f"lower(trim({expr}))"
+        exprs.append(f"{expr} AS {quote(target)}")
+    return ",\n            ".join(exprs)
+
+
+def csv_source(con, path: str, columns=None, normalize_names=False,
+               normalize_text=True, types=None):
+    # (SELECT sql, parameters) streaming one file with normalisation applied
+    file_types = types_for(con, path, types)
+    select = select_list(con, path, columns, normalize_names,
+                         normalize_text, file_types)
+    scan, params = read_csv(path, file_types)
+    return f"SELECT\n            {select}\n        FROM {scan}", params
+
+
+def csv_paths(pattern: str):
+    return sorted(glob.glob(pattern)) or [pattern]
+
+
+def load_csv(con, table: str, pattern: str, columns=None, normalize_names=False,
+             normalize_text=True, types=None, replace=True):
+    paths = csv_paths(pattern)
+    start = time.perf_counter()
+    total = 0
+    for i, path in enumerate(paths):
+        source, params = csv_source(con, path, columns, normalize_names,
+                                    normalize_text, types)
+        if i == 0 and replace:
+            con.execute(f"CREATE OR REPLACE TABLE {table} AS {source}", params)
+            rows = con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        else:
+            rows = con.execute(
+                f"INSERT INTO {table} BY NAME {source}", params).fetchone()[0]
+        total += rows
+        if len(paths) > 1:
+            print(f"   • batch {i + 1}/{len(paths)}: {rows} rows from {path}")
+    elapsed = time.perf_counter() - start
+    report(table, total, elapsed)
+    return total, elapsed
+
+
+def report(table: str, rows: int, elapsed: float):
+    rate = rows / elapsed if elapsed > 0 else float("inf")
+    rss = peak_rss_mb()
+    rss_text = f", peak RSS {rss:.0f} MB" if rss is not None else ""
+    print(f"⏱️ '{table}': {rows} rows in {elapsed:.2f}s ({rate:,.0f} rows/sec{rss_text})")
@@ -0,0 +1,152 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+# ---------------------- CONNECTION POOL ----------------------
+# One read-only DuckDB handle per database file per process, with a cursor
+# per thread on top of it. Streamlit sessions, CLI loops and the HTTP
+# service all go through get_pool(path).cursor() instead of sharing one
+# module-level connection (and its result set) between threads.
+#
+#   SAMARTH_POOL_SIZE        max cursors executing at once (default 8)
+#   SAMARTH_DUCKDB_THREADS   DuckDB worker threads per handle (default: DuckDB's)
+#   SAMARTH_HEALTH_SECONDS   how often a cursor is re-validated (default 30)
+#   SAMARTH_STORAGE=parquet  serve from the Parquet store instead (parquet_store.py)
+#
+# Nothing is imported or opened until the first cursor() (or warmup()), so
+# importing an engine stays cheap; duckdb itself is imported on first use.
+
+POOL_SIZE = int(os.getenv("SAMARTH_POOL_SIZE", "8"))
+DUCKDB_THREADS = int(os.getenv("SAMARTH_DUCKDB_THREADS", "0"))
+HEALTH_SECONDS = float(os.getenv("SAMARTH_HEALTH_SECONDS", "30"))
+
+
+class ConnectionPool:
+    def __init__(self, path: str, size: int = POOL_SIZE, threads: int = DUCKDB_THREADS,
+                 read_only: bool = True):
+        self.path = path
+        self.size = size
+        self.threads = threads
+        self.read_only = read_only
+        self._db = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._local = threading.local()
+        self._generation = 0  # bumped on reconnect so stale cursors are dropped
+
+    def _database(self):
+        import duckdb
+        from parquet_store import STORAGE, open_store
+
+        with self._lock:
+            if self._db is None:
+                config = {"threads": self.threads} if self.threads else {}
+                if STORAGE == "parquet":
+                    self._db = open_store(self.path, config)
+                else:
+                    self._db = duckdb.connect(
+                        self.path, read_only=self.read_only, config=config)
+            return self._db
+
+    def _reconnect(self):
+        import duckdb
+
+        with self._lock:
+            if self._db is not None:
+                try:
+                    self._db.close()
+                except duckdb.Error:
+                    pass
+            self._db = None
+            self._generation += 1
+
+    def _new_cursor(self):
+        # registered so a slow question can be profiled on a fresh cursor
+        # of the same handle once this one is gone (metrics.py)
+        database = self._database()
+        cur = database.cursor()
+        metrics.register_cursor(cur, database)
+        return cur
+
+    def _thread_cursor(self):
+        import duckdb
+
+        local = self._local
+        cur = getattr(local, "cursor", None)
+        if cur is not None and local.generation != self._generation:
+            cur = None
+        if cur is None:
+            cur = self._new_cursor()
+            local.cursor = cur
+            local.generation = self._generation
+            local.checked_at = time.monotonic()
+        elif time.monotonic() - local.checked_at > HEALTH_SECONDS:
+            try:
+                cur.execute("SELECT 1").fetchall()
+            except duckdb.Error:
+                self._reconnect()
+                cur = self._new_cursor()
+                local.cursor = cur
+                local.generation = self._generation
+            local.checked_at = time.monotonic()
+        return cur
+
+    @contextmanager
+    def cursor(self):
+        # Re-entrant per thread: nested uses share the thread's cursor and
+        # only the outermost one holds a pool slot.
+        depth = getattr(self._local, "depth", 0)
+        if depth == 0:
+            self._slots.acquire()
+        self._local.depth = depth + 1
+        try:
+            yield self._thread_cursor()
+        finally:
+            self._local.depth = depth
+            if depth == 0:
+                self._slots.release()
+
+    @contextmanager
+    def own_cursor(self):
+        # A cursor for one caller alone, closed on exit. For results that
+        # stay open across yields (ai_helper.answer_pages) and so must not sit
+        # on the thread's shared cursor. It takes no pool slot: a generator
+        # left half-read would otherwise hold one until it is collected.
+        cur = self._new_cursor()
+        try:
+            yield cur
+        finally:
+            cur.close()
+
+    def healthy(self):
+        import duckdb
+
+        try:
+            with self.cursor() as cur:
+                return cur.execute("SELECT 1").fetchone()[0] == 1
+        except duckdb.Error:
+            return False
+
+    def warmup(self):
+        self._database()
+        return self.healthy()
+
+    def close(self):
+        self._reconnect()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path: str, **options):
+    key = os.path.abspath(path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(path, **options)
+            _pools[key] = pool
+        return pool
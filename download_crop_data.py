@@ -1,6 +1,10 @@
+import argparse
+
 import requests
 import pandas as pd
 
+from downloader import download
+
 API_KEY = "579b464db66ec23bdd000001cdd3946e44ce4aad7209ff7b23ac571b"
 DATASET_URL = "https://api.data.gov.in/resource/9ef84268-d588-465a-a308-a864a43d0070"
 LIMIT = 10
@@ -40,5 +44,24 @@ def fetch_crop_data():
     print("💾 Saved as crop_production_sample.csv")
 
 
+def fetch_all_crop_data(out_dir: str = "downloads/crop_production", fmt: str = "csv",
+                        page_size: int = 1000, concurrency: int = 4):
+    print(f"🚜 Fetching the full Crop Production resource into {out_dir}/ ...")
+    return download(DATASET_URL, out_dir, params={"api-key": API_KEY},
+                    page_size=page_size, concurrency=concurrency, fmt=fmt)
+
+
 if __name__ == "__main__":
-    fetch_crop_data()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--all", action="store_true",
+                        help="page through the whole resource instead of a 10-row sample")
+    parser.add_argument("--out", default="downloads/crop_production")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+    if args.all:
+        fetch_all_crop_data(args.out, args.format,
+                            args.page_size, args.concurrency)
+    else:
+        fetch_crop_data()
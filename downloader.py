@@ -0,0 +1,148 @@
+import asyncio
+import csv
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+
+# ---------------------- PAGINATED RESOURCE DOWNLOADER ----------------------
+# Pages through a data.gov.in resource by offset with a bounded number of
+# requests in flight. Each worker thread keeps its own requests.Session so
+# connections are reused, failed pages are retried with exponential backoff,
+# and every page is written straight to its own part file:
+#
+#   <out_dir>/part-000000000.csv     (or .parquet)
+#   <out_dir>/part-000001000.csv
+#   <out_dir>/_checkpoint.json       offsets already on disk
+#
+# A crashed or interrupted run picks up from the checkpoint; DuckDB can read
+# the parts back with read_csv('<out_dir>/part-*.csv').
+
+CHECKPOINT = "_checkpoint.json"
+TIMEOUT = 30
+_local = threading.local()
+
+
+class DownloadError(Exception):
+    pass
+
+
+def session():
+    if getattr(_local, "session", None) is None:
+        _local.session = requests.Session()
+    return _local.session
+
+
+def fetch_page(url: str, params: dict, offset: int, limit: int, retries: int, backoff: float):
+    query = dict(params, offset=offset, limit=limit, format="json")
+    for attempt in range(retries + 1):
+        try:
+            response = session().get(url, params=query, timeout=TIMEOUT)
+            if response.status_code == 200:
+                return response.json(), len(response.content)
+            if response.status_code not in (429, 500, 502, 503, 504):
+                raise DownloadError(
+                    f"HTTP {response.status_code} for offset {offset}: {response.text[:200]}")
+        except (requests.RequestException, ValueError):
+            if attempt == retries:
+                raise
+        if attempt == retries:
+            raise DownloadError(f"Gave up on offset {offset} after {retries} retries")
+        time.sleep(backoff * (2 ** attempt) * (1 + random.random()))
+
+
+def part_path(out_dir: str, offset: int, fmt: str):
+    return os.path.join(out_dir, f"part-{offset:09d}.{fmt}")
+
+
+def write_part(path: str, records, fmt: str):
+    tmp = path + ".tmp"
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        pq.write_table(pa.Table.from_pylist(records), tmp, compression="zstd")
+    else:
+        fields = list(dict.fromkeys(k for r in records for k in r))
+        with open(tmp, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(records)
+    os.replace(tmp, path)
+
+
+def load_checkpoint(out_dir: str):
+    path = os.path.join(out_dir, CHECKPOINT)
+    if not os.path.exists(path):
+        return {"done": [], "total": None}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(out_dir: str, state: dict):
+    path = os.path.join(out_dir, CHECKPOINT)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+
+async def download_resource(url: str, out_dir: str, params=None, page_size: int = 1000,
+                            concurrency: int = 4, fmt: str = "csv", retries: int = 5,
+                            backoff: float = 0.5):
+    os.makedirs(out_dir, exist_ok=True)
+    params = params or {}
+    state = load_checkpoint(out_dir)
+    done = set(state["done"])
+    slots = asyncio.Semaphore(concurrency)
+    stats = {"pages": 0, "bytes": 0, "rows": 0, "skipped": len(done)}
+    start = time.perf_counter()
+
+    async def page(offset: int):
+        async with slots:
+            data, size = await asyncio.to_thread(
+                fetch_page, url, params, offset, page_size, retries, backoff)
+        records = data.get("records", [])
+        if records:
+            await asyncio.to_thread(write_part, part_path(out_dir, offset, fmt), records, fmt)
+        stats["pages"] += 1
+        stats["bytes"] += size
+        stats["rows"] += len(records)
+        done.add(offset)
+        state["done"] = sorted(done)
+        save_checkpoint(out_dir, state)
+        return data, len(records)
+
+    if 0 not in done:
+        # The first page tells us how many records the resource has
+        first, _ = await page(0)
+        total = first.get("total")
+        state["total"] = int(total) if total is not None else None
+        save_checkpoint(out_dir, state)
+
+    if state["total"] is not None:
+        offsets = [o for o in range(0, state["total"], page_size) if o not in done]
+        await asyncio.gather(*(page(o) for o in offsets))
+    else:
+        # No total advertised: fetch waves of pages until one comes back empty
+        offset = max(done) + page_size if done else page_size
+        while True:
+            wave = [offset + i * page_size for i in range(concurrency)]
+            results = await asyncio.gather(*(page(o) for o in wave if o not in done))
+            if any(n == 0 for _, n in results):
+                break
+            offset = wave[-1] + page_size
+
+    elapsed = time.perf_counter() - start
+    stats["seconds"] = elapsed
+    stats["pages_per_sec"] = stats["pages"] / elapsed if elapsed else 0.0
+    stats["bytes_per_sec"] = stats["bytes"] / elapsed if elapsed else 0.0
+    print(f"📦 {stats['pages']} pages / {stats['rows']} rows in {elapsed:.2f}s "
+          f"({stats['pages_per_sec']:.1f} pages/sec, {stats['bytes_per_sec'] / 1024:.0f} KiB/sec, "
+          f"{stats['skipped']} pages resumed from checkpoint)")
+    return stats
+
+
+def download(url: str, out_dir: str, **options):
+    return asyncio.run(download_resource(url, out_dir, **options))
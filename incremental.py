@@ -0,0 +1,114 @@
+import time
+
+import catalog
+import normalize
+import rollups
+from csv_loader import csv_paths, csv_source, report
+from normalize import date_expr
+
+# ---------------------- INCREMENTAL PRICE INGEST ----------------------
+# Daily mandi refreshes append to the price table instead of rebuilding it.
+# Per (source table, state, market) we keep the latest arrival_date already
+# loaded; incoming rows older than that are skipped, the rest are de-duplicated
+# on DEDUPE_KEY against the batch and against the existing rows from the
+# watermark onwards, appended, and folded into the price rollups. The cost of
+# a refresh therefore follows the size of the new data, not of the history.
+# New rows get the same dictionary ids (normalize.py) as the table they join;
+# names seen for the first time are appended to the dimensions.
+
+WATERMARKS = "ingest_watermarks"
+DEDUPE_KEY = ["state", "district", "market",
+              "commodity", "variety", "grade", "arrival_date"]
+
+
+def ensure_watermarks(con):
+    con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {WATERMARKS} (
+            source VARCHAR,
+            state VARCHAR,
+            market VARCHAR,
+            high_water DATE,
+            PRIMARY KEY (source, state, market)
+        )
+    """)
+
+
+def append_prices(con, table: str, source_sql: str, params=None, commodity: str = "commodity"):
+    # Appends the rows of `source_sql` that are new to `table`; returns the count
+    ensure_watermarks(con)
+    con.execute(
+        f"CREATE OR REPLACE TEMP TABLE staged_prices AS {source_sql}", params or [])
+    if not catalog.has_table(con, table):
+        con.execute(f"CREATE TABLE {table} AS SELECT * FROM staged_prices LIMIT 0")
+        normalize.encode_table(con, table)
+
+    types = catalog.column_types(con, table)
+    staged_types = catalog.column_types(con, "staged_prices")
+    if types["arrival_date"] == "DATE" != staged_types["arrival_date"]:
+        # loaded tables hold a DATE (normalize.encode_table); parse the
+        # incoming dd/mm/yyyy text once so rows compare and insert as dates
+        con.execute(f"""
+            CREATE OR REPLACE TEMP TABLE staged_prices AS
+            SELECT * REPLACE ({date_expr("arrival_date", staged_types["arrival_date"])}
+                              AS arrival_date)
+            FROM staged_prices
+        """)
+        staged_types = catalog.column_types(con, "staged_prices")
+    key = [commodity if k == "commodity" else k for k in DEDUPE_KEY]
+    key = [k for k in key if k in types and k in staged_types]
+    staged_date = date_expr("s.arrival_date", staged_types["arrival_date"])
+    target_date = date_expr("t.arrival_date", types["arrival_date"])
+    match = " AND ".join(f"t.{k} IS NOT DISTINCT FROM s.{k}" for k in key)
+
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE new_prices AS
+        WITH fresh AS (
+            SELECT DISTINCT ON ({", ".join(f"s.{k}" for k in key)}) s.*
+            FROM staged_prices s
+            LEFT JOIN {WATERMARKS} w
+              ON w.source = ? AND w.state = COALESCE(s.state, '')
+             AND w.market = COALESCE(s.market, '')
+            WHERE w.high_water IS NULL OR {staged_date} >= w.high_water
+        ),
+        window_start AS (
+            -- duplicates can only sit on or after the oldest incoming date
+            SELECT MIN({staged_date}) AS since FROM fresh s
+        )
+        SELECT s.* FROM fresh s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {table} t, window_start
+            WHERE (window_start.since IS NULL OR {target_date} >= window_start.since)
+              AND {match}
+        )
+    """, [table])
+
+    added = con.execute("SELECT COUNT(*) FROM new_prices").fetchone()[0]
+    if added:
+        if normalize.is_encoded(con, table):
+            normalize.encode_table(con, "new_prices", normalize.ENCODINGS.get(table), temp=True)
+        con.execute(f"INSERT INTO {table} BY NAME SELECT * FROM new_prices")
+        con.execute(f"""
+            INSERT INTO {WATERMARKS}
+            SELECT ?, COALESCE(s.state, ''), COALESCE(s.market, ''), MAX({staged_date})
+            FROM new_prices s
+            GROUP BY ALL
+            ON CONFLICT (source, state, market) DO UPDATE
+            SET high_water = greatest(high_water, excluded.high_water)
+        """, [table])
+        if rollups.price_source(con)[0] == table:
+            rollups.merge_price_rollups(con, "new_prices", commodity)
+    con.execute("DROP TABLE IF EXISTS staged_prices")
+    con.execute("DROP TABLE IF EXISTS new_prices")
+    return added
+
+
+def append_csv(con, table: str, pattern: str, commodity: str = "commodity", **csv_options):
+    start = time.perf_counter()
+    total = 0
+    for path in csv_paths(pattern):
+        source_sql, params = csv_source(con, path, **csv_options)
+        added = append_prices(con, table, source_sql, params, commodity)
+        print(f"   • {added} new rows from {path}")
+        total += added
+    report(table, total, time.perf_counter() - start)
+    return total
@@ -1,54 +1,57 @@
-import pandas as pd
 import duckdb
 
-# 1️⃣ Load Market Price (Crop Data)
-print("Loading crop/market price data...")
-crop_df = pd.read_csv("sample_data/crop_production_sample.csv")
+import catalog
+import normalize
+import rainfall_cube
+import rollups
+from csv_loader import configure, load_csv
 
-# Clean column names
-crop_df.columns = crop_df.columns.str.strip().str.lower().str.replace(" ", "_")
+# 1️⃣ Connect to DuckDB
+con = duckdb.connect("samarth.db")
+configure(con)
 
-# Just to confirm what we have
-print("Crop columns:", crop_df.columns.tolist())
+# 2️⃣ Load Market Price (Crop Data)
+print("Loading crop/market price data...")
 
-# Select relevant columns
+# Column names are cleaned (strip/lower/underscores) and only the relevant
+# ones are kept, all inside DuckDB's streaming CSV scan.
 expected_cols = [
     "state", "district", "market", "commodity", "variety",
     "grade", "arrival_date", "min_price", "max_price", "modal_price"
 ]
-crop_df = crop_df[[col for col in crop_df.columns if col in expected_cols]]
+crop_rows, _ = load_csv(con, "crop_market_prices", "sample_data/crop_production_sample.csv",
+                        columns=expected_cols, normalize_names=True,
+                        normalize_text=False)
 
-print("Crop data shape:", crop_df.shape)
+print("Crop columns:", catalog.table_columns(con, "crop_market_prices"))
+print("Crop data shape:", (crop_rows, len(
+    catalog.table_columns(con, "crop_market_prices"))))
 
-# 2️⃣ Load Rainfall Data
+# 3️⃣ Load Rainfall Data
 print("Loading rainfall data...")
-rain_df = pd.read_csv("sample_data/rainfall_data.csv")
-
-rain_df.columns = rain_df.columns.str.strip().str.lower().str.replace(" ", "_")
 
+# The seasonal totals are kept too: the climatology (rainfall_climate.py)
+# grades JF / MAM / JJAS / OND against their own normals
 expected_cols_rain = [
     "subdivision", "year", "jan", "feb", "mar", "apr", "may", "jun",
-    "jul", "aug", "sep", "oct", "nov", "dec", "annual"
+    "jul", "aug", "sep", "oct", "nov", "dec", "annual",
+    "jf", "mam", "jjas", "ond"
 ]
-rain_df = rain_df[[
-    col for col in rain_df.columns if col in expected_cols_rain]]
-
-print("Rainfall data shape:", rain_df.shape)
-
-# 3️⃣ Connect to DuckDB
-con = duckdb.connect("samarth.db")
-
-# 4️⃣ Store data into tables
-print("Storing data into local database...")
-con.execute("DROP TABLE IF EXISTS crop_market_prices;")
-con.execute("CREATE TABLE crop_market_prices AS SELECT * FROM crop_df;")
-
-con.execute("DROP TABLE IF EXISTS rainfall;")
-con.execute("CREATE TABLE rainfall AS SELECT * FROM rain_df;")
-
+rain_rows, _ = load_csv(con, "rainfall", "sample_data/rainfall_data.csv",
+                        columns=expected_cols_rain, normalize_names=True,
+                        normalize_text=False)
+
+print("Rainfall data shape:", (rain_rows, len(
+    catalog.table_columns(con, "rainfall"))))
+
+# Entity columns -> integer ids, tables sorted by them (normalize.py)
+normalize.encode_all(con)
+rollups.build_rollups(con)
+catalog.bump_generation(con)
+rainfall_cube.save_for(con, "samarth.db")
 print("✅ Data successfully stored into samarth.db")
 
-# 5️⃣ Quick test query
+# 4️⃣ Quick test query
 result = con.execute(
     "SELECT COUNT(*) AS total_rows FROM crop_market_prices;").fetchdf()
 print("Crop rows in DB:", result.iloc[0]['total_rows'])
@@ -0,0 +1,310 @@
+import re
+
+import catalog
+from resolver import get_resolver
+
+# ---------------------- SINGLE-PASS INTENT CLASSIFIER ----------------------
+# One Aho-Corasick automaton holds every intent keyword plus a gazetteer of
+# states, subdivisions, districts and commodities pulled from the database.
+# classify() walks the lowercased question once; the same pass also picks up
+# 4-digit years and "top N" counts, so intent detection and entity
+# extraction no longer need a chain of `in` checks and separate re.search
+# calls. Each engine keeps its own precedence rules (RULES below).
+#
+# Keywords match anywhere, exactly like the `"rainfall" in q` checks they
+# replace; gazetteer entries only match on word boundaries.
+
+KEYWORDS = ["rainfall", "average", "mean", "compare", "highest", "production",
+            "top", "crop", "price", "modal", "trend", "driest", "wettest",
+            "monsoon", "normal", "below", "above", "deficient", "excess"]
+
+# Crops the engines always recognised, even before they reach the database
+BASE_COMMODITIES = ["rice", "wheat", "maize",
+                    "sugarcane", "cotton", "millet", "paddy"]
+
+# intent -> every group must have at least one keyword present; first match wins
+RULES = {
+    "ai_helper": [
+        ("rainfall_price", [{"price"}, {"rainfall", "monsoon"}]),
+        ("price_trend", [{"trend"}, {"price"}]),
+        ("rainfall_trend", [{"trend"}, {"rainfall", "monsoon"}]),
+        ("driest_years", [{"driest", "wettest"}]),
+        ("monsoon_status", [{"monsoon"}, {"normal", "below", "above", "deficient", "excess"}]),
+        ("average_rainfall", [{"rainfall"}, {"average", "mean"}]),
+        ("compare_rainfall", [{"compare"}, {"rainfall"}]),
+        ("highest_production", [{"highest"}, {"production"}]),
+        ("top_crops", [{"top"}, {"crop"}]),
+        ("average_price", [{"price"}, {"average", "modal"}]),
+    ],
+    "nlp_engine": [
+        ("rainfall_price", [{"price"}, {"rainfall", "monsoon"}]),
+        ("price_trend", [{"trend"}, {"price"}]),
+        ("rainfall_trend", [{"trend"}, {"rainfall", "monsoon"}]),
+        ("driest_years", [{"driest", "wettest"}]),
+        ("monsoon_status", [{"monsoon"}, {"normal", "below", "above", "deficient", "excess"}]),
+        ("compare_rainfall", [{"compare"}, {"rainfall"}]),
+        ("rainfall_info", [{"rainfall"}]),
+        ("top_crops", [{"top"}, {"crop"}]),
+        ("highest_production", [{"highest"}, {"production"}]),
+    ],
+}
+
+ENTITY_KINDS = ["state", "subdivision", "district", "commodity"]
+
+
+class Entity:
+    __slots__ = ("kind", "value", "start", "end", "text")
+
+    def __init__(self, kind, value, start, end, text):
+        self.kind = kind
+        self.value = value
+        self.start = start
+        self.end = end
+        self.text = text
+
+    def __repr__(self):
+        return f"Entity({self.kind}={self.value!r} @{self.start}:{self.end})"
+
+
+class Classification:
+    __slots__ = ("intent", "keywords", "entities")
+
+    def __init__(self, intent, keywords, entities):
+        self.intent = intent
+        self.keywords = keywords
+        self.entities = entities
+
+    def of_kind(self, *kinds):
+        return [e for e in self.entities if e.kind in kinds]
+
+    def first(self, *kinds):
+        found = self.of_kind(*kinds)
+        return found[0].value if found else None
+
+    def __repr__(self):
+        return f"Classification({self.intent!r}, {self.entities})"
+
+
+# ---------------------- AUTOMATON ----------------------
+class Automaton:
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]  # state -> [(length, payload)]
+
+    def add(self, word: str, payload):
+        state = 0
+        for ch in word:
+            nxt = self.goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+            state = nxt
+        self.out[state].append((len(word), payload))
+
+    def compile(self):
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(ch, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+        return self
+
+
+def is_word_char(ch: str):
+    return ch.isalnum()
+
+
+class Classifier:
+    def __init__(self, gazetteer=None, generation=0):
+        # gazetteer: kind -> {surface form: canonical value}
+        self.generation = generation
+        self.automaton = Automaton()
+        for word in KEYWORDS:
+            self.automaton.add(word, ("keyword", word))
+        for kind, names in (gazetteer or {}).items():
+            for surface, value in names.items():
+                if surface:
+                    self.automaton.add(surface, (kind, value))
+        self.automaton.compile()
+
+    def scan(self, question: str):
+        text = question.lower()
+        goto, fail, out = self.automaton.goto, self.automaton.fail, self.automaton.out
+        keywords = set()
+        hits = []
+        numbers = []
+        state = 0
+        digit_start = None
+        n = len(text)
+        for i, ch in enumerate(text):
+            # digit runs -> years / counts, in the same pass
+            if ch.isdigit():
+                if digit_start is None:
+                    digit_start = i
+            elif digit_start is not None:
+                numbers.append((digit_start, i))
+                digit_start = None
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, (kind, value) in out[state]:
+                start = i - length + 1
+                if kind == "keyword":
+                    keywords.add(value)
+                    if value == "top":
+                        hits.append((start, i + 1, "top_marker", None))
+                elif (start == 0 or not is_word_char(text[start - 1])) and \
+                        (i + 1 == n or not is_word_char(text[i + 1])):
+                    hits.append((start, i + 1, kind, value))
+        if digit_start is not None:
+            numbers.append((digit_start, n))
+        return text, keywords, hits, numbers
+
+    def classify(self, question: str, rules: str = "ai_helper"):
+        text, keywords, hits, numbers = self.scan(question)
+        intent = "unknown"
+        for name, groups in RULES[rules]:
+            if all(keywords & group for group in groups):
+                intent = name
+                break
+        return Classification(intent, keywords, self._entities(question, text, hits, numbers))
+
+    def intent(self, question: str, rules: str = "ai_helper"):
+        keywords = self.scan(question)[1]
+        for name, groups in RULES[rules]:
+            if all(keywords & group for group in groups):
+                return name
+        return "unknown"
+
+    def _entities(self, question, text, hits, numbers):
+        entities = []
+        # longest, leftmost, non-overlapping gazetteer matches
+        taken_until = -1
+        top_ends = [end for start, end, kind, _ in hits if kind == "top_marker"]
+        for start, end, kind, value in sorted(
+                (h for h in hits if h[2] != "top_marker"), key=lambda h: (h[0], -h[1])):
+            if start < taken_until:
+                continue
+            entities.append(Entity(kind, value, start, end, question[start:end]))
+            taken_until = end
+        for start, end in numbers:
+            digits = text[start:end]
+            if any(text[t:start].strip() == "" for t in top_ends if t <= start):
+                entities.append(Entity("top_n", int(digits), start, end, digits))
+            elif len(digits) == 4 and 1800 <= int(digits) <= 2100:
+                entities.append(Entity("year", int(digits), start, end, digits))
+        entities.sort(key=lambda e: e.start)
+        return entities
+
+
+# ---------------------- YEAR RANGES ----------------------
+# "between 1990 and 2010", "since 2000", "before 1980", "in the 1990s",
+# "last decade", "past 15 years" -> (year_from, year_to, last): an inclusive
+# year range (either end open) and/or the number of most recent years.
+# All None when the question names no range (a lone year is not one).
+NUMBER_WORDS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+                "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "few": 5}
+YEAR = r"(1[89]\d\d|20\d\d)"
+SPAN = re.compile(
+    rf"\b(?:between\s+{YEAR}\s+(?:and|&)\s+{YEAR}|(?:from\s+)?{YEAR}\s*(?:-|–|to|till|until)\s*{YEAR})\b")
+DECADE = re.compile(r"\b(1[89]\d0|20\d0)'?s\b")
+RECENT = re.compile(
+    r"\b(?:last|past|previous|recent)\s+(\d+|[a-z]+)?\s*(decades?|years?)\b")
+OPEN_ENDS = [
+    (re.compile(rf"\b(?:since|from|after)\s+{YEAR}\b"), "from"),
+    (re.compile(rf"\b(?:until|till|up\s+to|through|before)\s+{YEAR}\b"), "to"),
+]
+
+
+def parse_year_range(question: str):
+    text = question.lower()
+    year_from = year_to = last = None
+    span = SPAN.search(text)
+    if span:
+        first, second = (int(y) for y in span.groups() if y)
+        year_from, year_to = min(first, second), max(first, second)
+    else:
+        decade = DECADE.search(text)
+        if decade:
+            year_from = int(decade.group(1))
+            year_to = year_from + 9
+        for pattern, end in OPEN_ENDS:
+            found = pattern.search(text)
+            if not found:
+                continue
+            year = int(found.group(1))
+            if end == "from":
+                year_from = year + 1 if found.group(0).startswith("after") else year
+            else:
+                year_to = year - 1 if found.group(0).startswith("before") else year
+    recent = RECENT.search(text)
+    if recent:
+        count, unit = recent.groups()
+        count = int(count) if count and count.isdigit() else NUMBER_WORDS.get(count, 1)
+        last = count * (10 if unit.startswith("decade") else 1)
+    return year_from, year_to, last
+
+
+# "last 6 months", "past 8 weeks", "last 2 years" -> (count, "week" | "month"):
+# how many weekly or monthly price buckets to go back from the latest one.
+# Weeks stay weeks; anything longer is counted in months.
+RECENT_BUCKETS = re.compile(
+    r"\b(?:last|past|previous|recent)\s+(\d+|[a-z]+)?\s*(weeks?|months?|years?|decades?)\b")
+BUCKET_MONTHS = {"month": 1, "year": 12, "decade": 120}
+
+
+def parse_recent_buckets(question: str, default=(12, "month")):
+    recent = RECENT_BUCKETS.search(question.lower())
+    if not recent:
+        return default
+    count, unit = recent.groups()
+    count = int(count) if count and count.isdigit() else NUMBER_WORDS.get(count, 1)
+    unit = unit.rstrip("s")
+    if unit == "week":
+        return count, "week"
+    return count * BUCKET_MONTHS[unit], "month"
+
+
+# Keyword-only automaton: enough for intent detection, needs no database
+keyword_classifier = Classifier()
+
+
+def build_gazetteer(con):
+    resolver = get_resolver(con)
+    gazetteer = {kind: {} for kind in ENTITY_KINDS}
+    for key, kinds in resolver.kinds.items():
+        for kind in kinds:
+            if kind in gazetteer:
+                gazetteer[kind][key] = key
+    for crop in BASE_COMMODITIES:
+        gazetteer["commodity"].setdefault(crop, crop)
+    # spelled-out aliases ("odisha", "marathwada"); two-letter codes are
+    # left to the resolver because they collide with ordinary words
+    for alias, key in resolver.exact.items():
+        if len(alias) > 3 and alias != key and " " not in alias and key in resolver.kinds:
+            for kind in resolver.kinds[key]:
+                if kind in gazetteer:
+                    gazetteer[kind].setdefault(alias, key)
+    return gazetteer, resolver.generation
+
+
+_classifiers = {}  # database path -> Classifier
+
+
+def get_classifier(con):
+    path = catalog.database_path(con)
+    classifier = _classifiers.get(path)
+    if classifier is None or classifier.generation != catalog.cached_generation(con):
+        gazetteer, generation = build_gazetteer(con)
+        classifier = Classifier(gazetteer, generation)
+        _classifiers[path] = classifier
+    return classifier
@@ -1,6 +1,15 @@
 import duckdb
-import pandas as pd
 import os
+import sys
+
+import catalog
+import normalize
+import rainfall_cube
+import regions
+import rollups
+from csv_loader import configure, load_csv
+from incremental import append_csv
+from parquet_store import export_store, store_dir_for
 
 # === Configuration ===
 DB_FILE = "samarth_data.duckdb"
@@ -13,29 +22,58 @@ FILES = {
     "crop_market_prices": os.path.join(DATA_DIR, "crop_market_prices_sample.csv"),
 }
 
+# With --incremental, price tables only get rows newer than what is already
+# loaded (see incremental.py) instead of being rebuilt from scratch.
+INCREMENTAL = "--incremental" in sys.argv
+PRICE_TABLES = {"crop_production", "crop_market_prices"}
+
 # === Connect to persistent DuckDB file ===
 con = duckdb.connect(DB_FILE)
+configure(con)
 print(f"🔗 Connected to DuckDB database: {DB_FILE}\n")
 
 # === Load available CSVs ===
 for table_name, csv_path in FILES.items():
     if os.path.exists(csv_path):
         print(f"📥 Loading '{table_name}' from: {csv_path}")
-        df = pd.read_csv(csv_path)
 
-        # Normalize text columns for better matching in queries
-        for col in df.columns:
-            if df[col].dtype == object:
-                df[col] = df[col].astype(str).str.strip().str.lower()
-
-        # Create or replace table
-        con.execute(
-            f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM df")
+        # Streamed in by DuckDB; text columns are lowercased/trimmed in SQL
+        # as they load. arrival_date is read as text and typed as a DATE by
+        # the encoding pass (normalize.py), which also clusters the rows.
+        if INCREMENTAL and table_name in PRICE_TABLES:
+            append_csv(con, table_name, csv_path,
+                       types={"arrival_date": "VARCHAR"})
+            rows = con.execute(
+                f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+        else:
+            rows, _ = load_csv(con, table_name, csv_path,
+                               types={"arrival_date": "VARCHAR"})
+            # entity columns -> integer ids, sorted by them (normalize.py)
+            normalize.encode_table(con, table_name)
+        n_cols = len(catalog.table_columns(con, table_name))
         print(
-            f"✅ Created table '{table_name}' with {len(df)} rows and {len(df.columns)} columns.\n")
+            f"✅ Created table '{table_name}' with {rows} rows and {n_cols} columns.\n")
     else:
         print(f"⚠️ File not found for '{table_name}', skipping...\n")
 
+# === Rebuild the aggregates the Q&A intents answer from ===
+# (incremental runs have already folded new prices into the price rollups)
+if INCREMENTAL and rollups.has_rollup(con, "price_state_commodity"):
+    rollups.build_rainfall_rollup(con)
+    regions.build_region_map(con)
+else:
+    rollups.build_rollups(con)
+
+# === Let resolvers/caches built on the old data know it changed ===
+catalog.bump_generation(con)
+
+# === Persist the rainfall cube the engines memory-map (rainfall_cube.py) ===
+rainfall_cube.save_for(con, DB_FILE)
+
+# === Optionally refresh the partitioned Parquet store (--parquet) ===
+if "--parquet" in sys.argv:
+    export_store(con, store_dir_for(DB_FILE))
+
 # === Show all tables ===
 print("📊 Tables in DuckDB now:")
 print(con.execute("SHOW TABLES;").fetchdf(), "\n")
@@ -1,15 +1,27 @@
 import duckdb
+import sys
+
+import catalog
+import normalize
+import rainfall_cube
+import regions
+import rollups
+from csv_loader import configure
+from incremental import append_prices
 
 # Connect to your main DuckDB database
 conn = duckdb.connect("samarth.db")
+configure(conn)
 
 csv_path = "crop_production_sample.csv"
 
+# --incremental appends only rows newer than what is already loaded
+INCREMENTAL = "--incremental" in sys.argv
+
 print("📥 Loading market price data into DuckDB from:", csv_path)
 
 # Create a clean, structured table for crop market prices
-conn.execute(f"""
-CREATE OR REPLACE TABLE crop_market_prices AS
+source_sql = f"""
 SELECT
     state,
     district,
@@ -20,12 +32,29 @@ SELECT
     arrival_date,
     min_price,
     max_price,
-    modal_price,
-    LOWER(TRIM(state)) AS state_norm,
-    LOWER(TRIM(district)) AS district_norm
-FROM read_csv_auto('{csv_path}', header=True);
-""")
+    modal_price
+FROM read_csv_auto('{csv_path}', header=True)
+"""
+
+# region_map and the rainfall rollup are keyed on subdivision ids: a
+# rainfall table loaded by another script may not be encoded yet
+rainfall_table = rollups.rainfall_source(conn)
+if rainfall_table and not normalize.is_encoded(conn, rainfall_table):
+    normalize.encode_table(conn, rainfall_table)
 
+if INCREMENTAL and rollups.has_rollup(conn, "price_state_commodity"):
+    added = append_prices(conn, "crop_market_prices",
+                          source_sql, commodity="crop")
+    print(f"➕ Appended {added} new rows to crop_market_prices")
+    rollups.build_rainfall_rollup(conn)
+    regions.build_region_map(conn)
+else:
+    conn.execute(f"CREATE OR REPLACE TABLE crop_market_prices AS {source_sql}")
+    # state/district/market/crop -> integer ids (normalize.py)
+    normalize.encode_table(conn, "crop_market_prices")
+    rollups.build_rollups(conn)
+catalog.bump_generation(conn)
+rainfall_cube.save_for(conn, "samarth.db")
 print("✅ crop_market_prices table created successfully!\n")
 
 print("📊 Summary:")
@@ -0,0 +1,271 @@
+import json
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+# ---------------------- PIPELINE METRICS ----------------------
+# Per-stage timers and row counts for the question pipeline, kept in process
+# memory as Prometheus-style series:
+#
+#   samarth_stage_seconds{stage}          histogram: intent, entities, sql,
+#                                         fetchdf, fetch_arrow, format, chart_sql,
+#                                         render, ...
+#   samarth_stage_rows_total{stage}       counter: rows produced by the stage
+#   samarth_question_seconds{engine}      histogram: whole question
+#   samarth_slow_questions_total{engine}  counter
+#
+# Exposition (both optional, off by default):
+#   SAMARTH_METRICS_PORT   serve text format at http://127.0.0.1:<port>/metrics
+#   SAMARTH_METRICS_FILE   rewrite this file with the same text after questions,
+#                          at most every SAMARTH_METRICS_FILE_SECONDS (default 5)
+#
+# Slow questions (off by default): one slower than SAMARTH_SLOW_QUERY_MS
+# counts in samarth_slow_questions_total and, when SAMARTH_SLOW_QUERY_LOG
+# names a file, appends one JSON line to it with its stage timings and, for
+# every SQL statement it ran, DuckDB's EXPLAIN ANALYZE profile (JSON).
+# Profiling re-executes those statements once, and only for questions that
+# already crossed the threshold.
+
+METRICS_PORT = int(os.getenv("SAMARTH_METRICS_PORT", "0"))
+METRICS_FILE = os.getenv("SAMARTH_METRICS_FILE")
+METRICS_FILE_SECONDS = float(os.getenv("SAMARTH_METRICS_FILE_SECONDS", "5"))
+SLOW_QUERY_MS = float(os.environ["SAMARTH_SLOW_QUERY_MS"]) if os.getenv("SAMARTH_SLOW_QUERY_MS") else None
+SLOW_QUERY_LOG = os.getenv("SAMARTH_SLOW_QUERY_LOG")
+
+BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+           0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+
+def label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.values = {}  # label tuple -> value
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{label_text(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.series = {}  # label tuple -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self.series.items()):
+            for bound, count in zip(self.buckets, series):
+                lines.append(
+                    f"{self.name}_bucket{label_text(key + (('le', bound),))} {count}")
+            lines.append(
+                f"{self.name}_bucket{label_text(key + (('le', '+Inf'),))} {series[-1]}")
+            lines.append(f"{self.name}_sum{label_text(key)} {series[-2]}")
+            lines.append(f"{self.name}_count{label_text(key)} {series[-1]}")
+        return lines
+
+
+_lock = threading.Lock()
+_local = threading.local()
+
+stage_seconds = Histogram(
+    "samarth_stage_seconds", "Time spent in each question pipeline stage")
+stage_rows = Counter(
+    "samarth_stage_rows_total", "Rows produced by each question pipeline stage")
+question_seconds = Histogram(
+    "samarth_question_seconds", "End-to-end time per question")
+slow_questions = Counter(
+    "samarth_slow_questions_total", "Questions slower than SAMARTH_SLOW_QUERY_MS")
+
+REGISTRY = [stage_seconds, stage_rows, question_seconds, slow_questions]
+
+
+def render():
+    with _lock:
+        lines = []
+        for metric in REGISTRY:
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------- RECORDING ----------------------
+def current_trace():
+    return getattr(_local, "trace", None)
+
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            stage_seconds.observe(elapsed, stage=name)
+        trace = current_trace()
+        if trace is not None:
+            trace["stages"][name] = trace["stages"].get(name, 0.0) + elapsed * 1000
+
+
+def add_rows(name: str, rows: int):
+    with _lock:
+        stage_rows.inc(rows, stage=name)
+    trace = current_trace()
+    if trace is not None:
+        trace["rows"][name] = trace["rows"].get(name, 0) + rows
+
+
+# cursor -> the database handle it came from (db.ConnectionPool)
+_databases = weakref.WeakKeyDictionary()
+
+
+def register_cursor(cursor, database):
+    _databases[cursor] = database
+
+
+def record_sql(con, sql: str, params=None):
+    # Remembered per question so a slow one can be profiled afterwards. The
+    # profile runs on a fresh cursor of the database `con` came from: `con`
+    # itself may be a per-answer cursor (db.own_cursor), closed by then.
+    trace = current_trace()
+    if trace is not None and SLOW_QUERY_MS is not None and SLOW_QUERY_LOG:
+        # named parameters (nl2sql.py) stay a dict
+        trace["sql"].append((_databases.get(con, con), sql,
+                             params if isinstance(params, dict) else list(params or [])))
+
+
+@contextmanager
+def question(engine: str, text: str = ""):
+    # Nested calls (app_local -> get_answer) join the outermost question
+    if current_trace() is not None:
+        yield current_trace()
+        return
+    trace = _local.trace = {"engine": engine, "question": text,
+                            "stages": {}, "rows": {}, "sql": []}
+    start = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        _local.trace = None
+        elapsed = time.perf_counter() - start
+        with _lock:
+            question_seconds.observe(elapsed, engine=engine)
+        if SLOW_QUERY_MS is not None and elapsed * 1000 >= SLOW_QUERY_MS:
+            with _lock:
+                slow_questions.inc(engine=engine)
+            if SLOW_QUERY_LOG:
+                log_slow_question(trace, elapsed)
+        write_file()
+
+
+def explain_analyze(database, sql: str, params):
+    try:
+        cur = database.cursor()
+        try:
+            row = cur.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", params).fetchone()
+        finally:
+            cur.close()
+        return json.loads(row[1])
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def log_slow_question(trace, elapsed: float):
+    entry = {
+        "at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "engine": trace["engine"],
+        "question": trace["question"],
+        "total_ms": round(elapsed * 1000, 3),
+        "stages_ms": {k: round(v, 3) for k, v in trace["stages"].items()},
+        "rows": trace["rows"],
+        "queries": [{"sql": sql, "params": params,
+                     "profile": explain_analyze(database, sql, params)}
+                    for database, sql, params in trace["sql"]],
+    }
+    with _lock:
+        with open(SLOW_QUERY_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, default=str) + "\n")
+
+
+# ---------------------- EXPOSITION ----------------------
+_written_at = 0.0
+
+
+def write_file(path=None, force: bool = False):
+    global _written_at
+    path = path or METRICS_FILE
+    if not path:
+        return
+    now = time.monotonic()
+    if not force and now - _written_at < METRICS_FILE_SECONDS:
+        return
+    _written_at = now
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(tmp, path)
+
+
+def metrics_handler():
+    # http.server is only imported once an exporter is actually started
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return MetricsHandler
+
+
+_server = None
+
+
+def start_exporter(port: int = METRICS_PORT):
+    # Idempotent, so Streamlit reruns and repeated imports share one server
+    global _server
+    with _lock:
+        if _server is not None or not port:
+            return _server
+        from http.server import ThreadingHTTPServer
+
+        _server = ThreadingHTTPServer(("127.0.0.1", port), metrics_handler())
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
@@ -0,0 +1,395 @@
+import json
+import os
+import re
+import textwrap
+
+import catalog
+import metrics
+import normalize
+import regions
+import rollups
+from intent_classifier import get_classifier
+
+# ---------------------- NL -> SQL ----------------------
+# query_with_reasoning (ai_helper.py) answers free-form questions with SQL
+# written by a model. The model never sees the entities themselves: the
+# states, subdivisions, districts, crops, years and other numbers in the
+# question are swapped for named slots first (question_template),
+#
+#   "Average modal price of Rice in Karnataka?"
+#       -> "average modal price of $crop_1 in $state_1"
+#          {"crop_1": "rice", "state_1": "karnataka"}
+#
+# and the model answers with SQL that uses the same slots as DuckDB named
+# parameters. That SQL is checked once (validate: one SELECT over the
+# database's data tables that binds against their columns) and cached per
+# template, so every later question of the same shape skips the model and
+# runs the cached SQL with its own values bound.
+#
+#   SAMARTH_SQL_MODEL      gemini | stub (default: gemini when GEMINI_API_KEY
+#                          is set, in the environment or .env, else stub)
+#   SAMARTH_GEMINI_MODEL   Gemini model name (default gemini-1.5-flash)
+#   SAMARTH_SQL_CACHE_TTL  seconds a template's SQL is kept (default 86400)
+#
+# google.generativeai and dotenv are only imported when Gemini is picked.
+
+SQL_MODEL = os.getenv("SAMARTH_SQL_MODEL")
+GEMINI_MODEL = os.getenv("SAMARTH_GEMINI_MODEL", "gemini-1.5-flash")
+SQL_CACHE_TTL = float(os.getenv("SAMARTH_SQL_CACHE_TTL", "86400"))
+
+MAX_ROWS = 1000  # rows returned in "result"
+PREVIEW_ROWS = 5
+
+# entity kind -> slot name; subdivisions are asked about like states
+SLOT_KINDS = {"state": "state", "subdivision": "state", "district": "district",
+              "commodity": "crop", "year": "year", "top_n": "n"}
+SLOT = re.compile(r"\$([a-z]+_\d+)\b")
+NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+
+class ModelError(Exception):
+    pass
+
+
+# ---------------------- QUESTION TEMPLATES ----------------------
+def question_template(con, question: str):
+    # (template, {slot: value}); slots are numbered per kind in question order
+    entities = get_classifier(con).classify(question).entities
+    spans = [(e.start, e.end, SLOT_KINDS[e.kind], e.value) for e in entities]
+    taken = [(start, end) for start, end, _, _ in spans]
+    for match in NUMBER.finditer(question):
+        if not any(start <= match.start() < end for start, end in taken):
+            number = match.group(0)
+            spans.append((match.start(), match.end(), "n",
+                          float(number) if "." in number else int(number)))
+    text, values, counts, pos = [], {}, {}, 0
+    for start, end, kind, value in sorted(spans):
+        counts[kind] = counts.get(kind, 0) + 1
+        slot = f"{kind}_{counts[kind]}"
+        values[slot] = value
+        text.append(question[pos:start].lower())
+        text.append(f"${slot}")
+        pos = end
+    text.append(question[pos:].lower())
+    template = " ".join("".join(text).split()).rstrip("?.! ")
+    return template, values
+
+
+# ---------------------- SCHEMA ----------------------
+def data_tables(con):
+    # The fact tables, their rollups and the region map; dimension and
+    # bookkeeping tables stay out of the model's view
+    names = [*normalize.ENCODINGS, rollups.RAINFALL_ROLLUP, *rollups.PRICE_ROLLUPS,
+             regions.REGION_TABLE]
+    return [t for t in names if catalog.has_table(con, t)]
+
+
+def schema(con):
+    # table -> {column: type}
+    return {t: catalog.column_types(con, t) for t in data_tables(con)}
+
+
+def schema_text(tables: dict):
+    return "\n".join(f"{t}({', '.join(f'{c} {ty}' for c, ty in cols.items())})"
+                     for t, cols in tables.items())
+
+
+# ---------------------- VALIDATION ----------------------
+def walk(node, tables, ctes):
+    if isinstance(node, dict):
+        if node.get("type") == "TABLE_FUNCTION":
+            raise ValueError("table functions are not allowed")
+        if node.get("type") == "BASE_TABLE":
+            if node.get("catalog_name") or node.get("schema_name") not in ("", "main"):
+                raise ValueError("only tables in this database can be queried")
+            tables.add(node["table_name"].lower())
+        for entry in node.get("cte_map", {}).get("map", []):
+            ctes.add(entry["key"].lower())
+        for value in node.values():
+            walk(value, tables, ctes)
+    elif isinstance(node, list):
+        for value in node:
+            walk(value, tables, ctes)
+
+
+def validate(con, sql: str, slots: dict, tables: dict):
+    # Parses without binding first (one SELECT, only known tables, only the
+    # question's slots), then EXPLAINs it with the slots' values so every
+    # column binds
+    tree = json.loads(con.execute("SELECT json_serialize_sql(?)", [sql]).fetchone()[0])
+    if tree["error"]:
+        raise ValueError(f"not a SELECT statement: {tree.get('error_message', '')}".strip())
+    if len(tree["statements"]) != 1:
+        raise ValueError("expected exactly one statement")
+    used, ctes = set(), set()
+    walk(tree["statements"], used, ctes)
+    unknown = used - ctes - set(tables)
+    if unknown:
+        raise ValueError(f"unknown tables: {', '.join(sorted(unknown))}")
+    missing = set(SLOT.findall(sql)) - set(slots)
+    if missing:
+        raise ValueError(f"unknown slots: {', '.join(sorted(missing))}")
+    con.execute(f"EXPLAIN {sql}", bound(sql, slots))
+
+
+def bound(sql: str, values: dict):
+    # The values of the slots `sql` refers to (DuckDB rejects extra ones)
+    return {slot: values[slot] for slot in dict.fromkeys(SLOT.findall(sql))}
+
+
+def display_sql(sql: str, values: dict):
+    # The SQL with its slots written out as literals, for showing only
+    def literal(match):
+        value = values[match.group(1)]
+        return str(value) if isinstance(value, (int, float)) else "'" + str(value).replace("'", "''") + "'"
+    return SLOT.sub(literal, sql)
+
+
+# ---------------------- MODELS ----------------------
+# A model turns (template, slots, schema) into {"sql", "reasoning"}.
+class StubModel:
+    # Deterministic and offline: a handful of question shapes over the raw
+    # price and rainfall tables, enough to exercise the whole path in tests
+    name = "stub"
+
+    def generate(self, template: str, slots, tables: dict):
+        def has(*words):
+            return any(w in template for w in words)
+
+        def of(kind):
+            return [s for s in slots if s.startswith(kind + "_")]
+
+        price, crop = self.price_table(tables)
+        rain = next((t for t in ["rainfall_data", "rainfall"] if t in tables), None)
+        places = of("state") + of("district")
+        where = [self.like_any(kind, of(kind)) for kind in ["state", "district"] if of(kind)]
+        if has("top") and has("crop") and price and places:
+            limit = f"${of('n')[0]}" if of("n") else "5"
+            return self.reply(f"""
+                SELECT lower({crop}) AS crop, COUNT(*) AS records,
+                       ROUND(AVG(modal_price), 2) AS avg_modal_price
+                FROM {price}
+                WHERE {" AND ".join(where)}
+                GROUP BY 1
+                ORDER BY records DESC
+                LIMIT {limit}""",
+                f"Top crops in {', '.join('$' + p for p in places)}: {price} rows there, "
+                f"counted per {crop}.")
+        if has("price", "modal") and price and of("crop"):
+            where.insert(0, self.like_any(crop, of("crop")))
+            return self.reply(f"""
+                SELECT lower({crop}) AS crop, ROUND(AVG(modal_price), 2) AS avg_modal_price,
+                       MIN(modal_price) AS min_modal_price, MAX(modal_price) AS max_modal_price,
+                       COUNT(*) AS records
+                FROM {price}
+                WHERE {" AND ".join(where)}
+                GROUP BY 1
+                ORDER BY 1""",
+                f"Average modal_price of {price} rows whose {crop} matches "
+                f"{', '.join('$' + c for c in of('crop'))}"
+                + (f" in {', '.join('$' + p for p in places)}." if places else " across states."))
+        if has("rainfall", "rain") and rain:
+            where, years = self.year_filter(template, of, rain)
+            places = of("state")
+            if places:
+                where.insert(0, self.like_any("subdivision", places))
+            order = "avg_annual_rainfall DESC" if has("highest", "wettest", "most") else \
+                "avg_annual_rainfall" if has("lowest", "driest", "least") else "subdivision"
+            return self.reply(f"""
+                SELECT lower(subdivision) AS subdivision, ROUND(AVG(annual), 1) AS avg_annual_rainfall,
+                       MIN(year) AS from_year, MAX(year) AS to_year
+                FROM {rain}
+                WHERE {" AND ".join(where) or "TRUE"}
+                GROUP BY 1
+                ORDER BY {order}""",
+                f"Annual rainfall per subdivision of {rain}"
+                + (f" matching {', '.join('$' + p for p in places)}" if places else "")
+                + f", averaged over {years}.")
+        raise ModelError(
+            "The local model only knows crop price, top crop and rainfall questions; "
+            "set GEMINI_API_KEY to use Gemini.")
+
+    @staticmethod
+    def reply(sql: str, reasoning: str):
+        return {"sql": textwrap.dedent(sql).strip(), "reasoning": reasoning}
+
+    @staticmethod
+    def price_table(tables: dict):
+        for table in ["crop_production", "crop_market_prices"]:
+            if "modal_price" in tables.get(table, {}):
+                return table, "commodity" if "commodity" in tables[table] else "crop"
+        return None, None
+
+    @staticmethod
+    def like_any(column: str, slots):
+        return "(" + " OR ".join(f"lower({column}) LIKE '%' || ${s} || '%'" for s in slots) + ")"
+
+    @staticmethod
+    def year_filter(template: str, of, rain: str):
+        years = of("year")
+        if len(years) >= 2:
+            return [f"year BETWEEN ${years[0]} AND ${years[1]}"], f"${years[0]}-${years[1]}"
+        if years:
+            return [f"year = ${years[0]}"], f"${years[0]}"
+        recent = re.search(r"(?:last|past|recent) \$(n_\d+) years", template)
+        if recent:
+            return [f"year > (SELECT MAX(year) FROM {rain}) - ${recent.group(1)}"], \
+                f"the last ${recent.group(1)} years"
+        if re.search(r"\b(?:last|latest|recent) year\b", template):
+            return [f"year = (SELECT MAX(year) FROM {rain})"], "the latest year"
+        return [], "every year"
+
+
+PROMPT = """You write DuckDB SQL for questions about Indian crop prices and rainfall.
+
+Tables:
+{schema}
+
+The question below has its entities replaced by named slots ({slots}).
+Name slots hold lowercase names; match them with
+lower(<column>) LIKE '%' || $slot || '%'. Year and number slots are integers.
+Use the slots as DuckDB named parameters ($slot) and never write their values.
+Write one read-only SELECT over the tables above.
+
+Question: {template}
+
+Reply with JSON only: {{"sql": "...", "reasoning": "one or two sentences"}}"""
+
+
+class GeminiModel:
+    name = "gemini"
+
+    def __init__(self, model_name: str = GEMINI_MODEL):
+        self.model_name = model_name
+        self._model = None
+
+    def client(self):
+        if self._model is None:
+            try:
+                import google.generativeai as genai
+                from dotenv import load_dotenv
+            except ImportError as e:
+                raise ModelError(f"Gemini needs google-generativeai and python-dotenv ({e})")
+
+            load_dotenv()
+            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+            self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def generate(self, template: str, slots, tables: dict):
+        prompt = PROMPT.format(schema=schema_text(tables), template=template,
+                               slots=", ".join(f"${s}" for s in slots) or "none")
+        with metrics.stage("model"):
+            text = self.client().generate_content(prompt).text
+        return parse_reply(text)
+
+
+def parse_reply(text: str):
+    body = re.sub(r"^```(?:json|sql)?\s*|\s*```$", "", text.strip())
+    try:
+        reply = json.loads(body)
+        return {"sql": reply["sql"].strip().rstrip(";"), "reasoning": reply.get("reasoning", "")}
+    except (ValueError, KeyError, TypeError, AttributeError):
+        pass
+    if body.lower().lstrip("( ").startswith(("select", "with")):
+        return {"sql": body.rstrip(";"), "reasoning": ""}
+    raise ModelError(f"Could not read SQL from the model's reply: {text[:200]}")
+
+
+MODELS = {"stub": StubModel, "gemini": GeminiModel}
+_model = None
+
+
+def gemini_configured():
+    if os.getenv("GEMINI_API_KEY"):
+        return True
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return False
+    load_dotenv()
+    return bool(os.getenv("GEMINI_API_KEY"))
+
+
+def get_model():
+    global _model
+    if _model is None:
+        name = SQL_MODEL or ("gemini" if gemini_configured() else "stub")
+        if name not in MODELS:
+            raise ModelError(f"Unknown SAMARTH_SQL_MODEL {name!r} (use {' or '.join(MODELS)})")
+        _model = MODELS[name]()
+    return _model
+
+
+# ---------------------- ANSWERS ----------------------
+def template_sql(con, template: str, values: dict, cache, model):
+    # (cached SQL entry, whether it came from the cache)
+    generation = catalog.cached_generation(con)
+    key = (model.name, template)
+    found, entry = cache.get(key, generation)
+    if found:
+        return entry, True
+    tables = schema(con)
+    entry = model.generate(template, list(values), tables)
+    with metrics.stage("validate"):
+        validate(con, entry["sql"], values, tables)
+    cache.put(key, generation, entry)
+    return entry, False
+
+
+def cell(value):
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    return "" if value is None else str(value)
+
+
+def summarize(columns, rows):
+    if not rows:
+        return "No rows matched the question."
+    first = ", ".join(f"{c}: {cell(v)}" for c, v in zip(columns, rows[0]))
+    return first if len(rows) == 1 else f"{len(rows)} rows; first: {first}"
+
+
+def preview(columns, rows):
+    lines = [" | ".join(columns)]
+    lines += [" | ".join(cell(v) for v in row) for row in rows[:PREVIEW_ROWS]]
+    if len(rows) > PREVIEW_ROWS:
+        lines.append(f"... {len(rows) - PREVIEW_ROWS} more rows")
+    return "\n".join(lines)
+
+
+def answer(con, question: str, cache, model=None):
+    import duckdb
+
+    model = model or get_model()
+    with metrics.stage("entities"):
+        template, values = question_template(con, question)
+    try:
+        entry, cached = template_sql(con, template, values, cache, model)
+    except (ModelError, ValueError, duckdb.Error) as e:
+        return {"error": str(e), "template": template}
+    sql, params = entry["sql"], bound(entry["sql"], values)
+    metrics.record_sql(con, sql, params)
+    try:
+        with metrics.stage("sql"):
+            cursor = con.execute(sql, params)
+            rows = cursor.fetchmany(MAX_ROWS)
+    except duckdb.Error as e:
+        return {"error": str(e), "template": template, "sql_query": display_sql(sql, values)}
+    metrics.add_rows("sql", len(rows))
+    columns = [d[0] for d in cursor.description]
+    reasoning = display_sql(entry["reasoning"], values)
+    explanation = reasoning + (" (SQL reused from an earlier question of the same shape.)"
+                               if cached else "")
+    return {
+        "explanation": explanation.strip(),
+        "sql_query": display_sql(sql, values),
+        "result": rows,
+        "summary": summarize(columns, rows),
+        "gemini_reasoning": reasoning,
+        "result_preview": preview(columns, rows),
+        "columns": columns,
+        "template": template,
+        "model": model.name,
+        "cached": cached,
+    }
@@ -1,10 +1,15 @@
 # nlp_engine.py
-import duckdb
-import re
-import pandas as pd
+import metrics
+import pages
+import statements
+from db import get_pool
+from intent_classifier import get_classifier, parse_recent_buckets, parse_year_range
+from normalize import key_equals
+from resolver import get_resolver
 
-# Connect to DuckDB
-con = duckdb.connect("samarth.db")
+# Shared read-only DuckDB handle; one cursor per thread
+DB_FILE = "samarth.db"
+pool = get_pool(DB_FILE)
 
 # -----------------------------------------------------
 # Utility: Partial subdivision matching for rainfall
@@ -12,43 +17,60 @@ con = duckdb.connect("samarth.db")
 
 
 def get_matching_subdivisions(state):
-    subs = con.execute(
-        "SELECT DISTINCT lower(subdivision) FROM rainfall").fetchall()
-    state = state.lower().strip()
-    matches = [s[0] for s in subs if state in s[0]]
-    return matches if matches else [state]
+    # Resolved against an in-memory index built once per data generation
+    # instead of scanning DISTINCT subdivisions on every question.
+    with pool.cursor() as con:
+        return get_resolver(con).subdivisions_for(state)
+
+
+# -----------------------------------------------------
+# Eager loading for servers (everything is otherwise loaded on first use)
+# -----------------------------------------------------
+def warmup():
+    import pandas  # noqa: F401  (DuckDB's df() needs it)
+
+    if not pool.warmup():
+        return False
+    with pool.cursor() as con:
+        get_classifier(con)
+        get_resolver(con)
+        cube_for(con)
+    return True
+
+
+def cube_for(con):
+    # numpy loads with the first rainfall question, not at import
+    from rainfall_cube import get_cube
+    return get_cube(con)
 
 
 # -----------------------------------------------------
 # Intent Detection and Query Planner
 # -----------------------------------------------------
 def plan_query(question):
-    q = question.lower()
-    intent = None
-
-    if "compare" in q and "rainfall" in q:
-        intent = "compare_rainfall"
-    elif "rainfall" in q:
-        intent = "rainfall_info"
-    elif "top" in q and "crop" in q:
-        intent = "top_crops"
-    elif "highest" in q and "production" in q:
-        intent = "highest_production"
-    else:
-        intent = "unknown"
+    with metrics.stage("plan"):
+        return _plan_query(question)
+
+
+def _plan_query(question):
+    # Intent and entities come from one scan of the compiled classifier
+    with pool.cursor() as con:
+        parsed = get_classifier(con).classify(question, "nlp_engine")
+    intent = parsed.intent
 
     # Extract entities
-    states = re.findall(r"\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\b", question)
-    year_match = re.search(r"\b(20\d{2})\b", question)
-    year = int(year_match.group(1)) if year_match else None
-    N_match = re.search(r"top\s*(\d+)", question.lower())
-    N = int(N_match.group(1)) if N_match else 3
-    crop_match = re.search(
-        r"\b(rice|wheat|maize|sugarcane|cotton|millet|paddy)\b", question.lower()
-    )
-    crop = crop_match.group(1) if crop_match else None
+    states = list(dict.fromkeys(
+        e.value.title() for e in parsed.of_kind("state", "subdivision")))
+    year = parsed.first("year")
+    N = parsed.first("top_n") or 3
+    crop = parsed.first("commodity")
 
     sql = None
+    params = []  # bound to sql's ? placeholders
+    window = None  # compare_rainfall: states and years for rainfall_window
+    climate = None  # trend / extreme-year / monsoon questions (no SQL at all)
+    cross = None  # rainfall_price: crop, state and season for rainfall_vs_price
+    trend = None  # price_trend: crop, state and how many week/month buckets
 
     # -------------------------------------------------
     # Query Templates
@@ -57,56 +79,70 @@ def plan_query(question):
         all_matches = []
         for st in states:
             all_matches.extend(get_matching_subdivisions(st))
+        # Any year range the question names ("between 1990 and 2010",
+        # "since 2000", "last decade"); otherwise the last N years.
+        # run_plan_and_fetch answers from the rainfall cube when there is
+        # one, else with the compare_rainfall_window statement: one scan and
+        # one window pass for every state, per-year series and rolling means
+        # included.
+        year_from, year_to, last = parse_year_range(question)
+        if year_from is None and year_to is None and last is None:
+            last = N
+        window = {"states": states, "subdivisions": all_matches, "year_from": year_from,
+                  "year_to": year_to, "last": last} if states else None
 
-        placeholders = ", ".join([f"'{m}'" for m in all_matches])
+    elif intent == "rainfall_price":
+        from rainfall_climate import season_of
 
-        sql = f"""
-            WITH selected_years AS (
-                SELECT year
-                FROM rainfall
-                WHERE lower(subdivision) IN ({placeholders})
-                GROUP BY year
-                ORDER BY year DESC
-                LIMIT {N}
-            ),
-            state_agg AS (
-                SELECT
-                    CASE
-                        {" ".join([f"WHEN lower(subdivision) LIKE '%{st.lower()}%' THEN '{st}'" for st in states])}
-                        ELSE lower(subdivision)
-                    END AS state,
-                    year,
-                    AVG(COALESCE(annual, jan+feb+mar+apr+may+jun+jul+aug+sep+oct+nov+dec)) AS rainfall
-                FROM rainfall
-                WHERE lower(subdivision) IN ({placeholders})
-                GROUP BY 1,2
-            )
-            SELECT state, AVG(rainfall) AS avg_annual_rainfall
-            FROM state_agg
-            WHERE year IN (SELECT year FROM selected_years)
-            GROUP BY state;
-        """
+        # The crop's yearly prices in the first state against that state's
+        # rainfall: one statement, correlations included (statements.py)
+        cross = {"state": states[0].lower(), "crop": crop,
+                 "season": season_of(question)} if states and crop else None
+
+    elif intent == "price_trend":
+        # Read off the weekly / monthly price buckets (rollups.py), never
+        # the raw mandi rows
+        count, unit = parse_recent_buckets(question)
+        trend = {"state": states[0].lower(), "crop": crop, "count": count,
+                 "unit": unit} if states and crop else None
+
+    elif intent in CLIMATE_INTENTS:
+        from rainfall_climate import season_of
+
+        season = season_of(question)
+        if intent == "monsoon_status" and season == "annual_filled":
+            season = "jjas"
+        climate = {"states": states, "year": year, "season": season,
+                   "N": parsed.first("top_n") or 5,
+                   "wettest": "wettest" in question.lower()}
 
     elif intent == "top_crops":
         state = states[0] if states else "Karnataka"
-        year_filter = f"AND year = {year}" if year else ""
+        with pool.cursor() as con:
+            state_filter, params = key_equals(con, "crop_prod", "state_name", state.lower())
+        year_filter = "AND year = ?" if year else ""
+        params += [year] if year else []
         sql = f"""
             SELECT crop, SUM(production_tonnes) AS total_production
             FROM crop_prod
-            WHERE lower(state_name) = '{state.lower()}' {year_filter}
+            WHERE {state_filter} {year_filter}
             GROUP BY crop
             ORDER BY total_production DESC
-            LIMIT {N};
+            LIMIT ?;
         """
+        params.append(N)
 
     elif intent == "highest_production":
         state = states[0] if states else "Karnataka"
-        year_filter = f"AND year = {year}" if year else ""
-        crop_filter = f"AND lower(crop) = '{crop}'" if crop else ""
+        with pool.cursor() as con:
+            state_filter, params = key_equals(con, "crop_prod", "state_name", state.lower())
+            crop_filter, crop_params = key_equals(con, "crop_prod", "crop", crop) if crop else ("", [])
+        year_filter = "AND year = ?" if year else ""
+        params += ([year] if year else []) + crop_params
         sql = f"""
             SELECT district_name, SUM(production_tonnes) AS total_production
             FROM crop_prod
-            WHERE lower(state_name) = '{state.lower()}' {year_filter} {crop_filter}
+            WHERE {state_filter} {year_filter} {"AND " + crop_filter if crop else ""}
             GROUP BY district_name
             ORDER BY total_production DESC
             LIMIT 5;
@@ -119,6 +155,11 @@ def plan_query(question):
         "N": N,
         "crop": crop,
         "sql": sql,
+        "params": params,
+        "window": window,
+        "climate": climate,
+        "cross": cross,
+        "trend": trend,
     }
 
 
@@ -127,19 +168,107 @@ def plan_query(question):
 # -----------------------------------------------------
 def run_plan_and_fetch(planner):
     try:
-        df = con.execute(planner["sql"]).df()
+        with metrics.question("nlp_engine", planner["intent"]), pool.cursor() as con:
+            if planner.get("climate"):
+                return climate_result(con, planner)
+            if planner.get("window"):
+                return {"dataframe": window_frame(con, planner["window"])}
+            if planner.get("cross"):
+                ask = planner["cross"]
+                return {"dataframe": statement_frame(
+                    con, "rainfall_vs_price", ask["state"], ask["crop"], ask["season"])}
+            if planner.get("trend"):
+                ask = planner["trend"]
+                return {"dataframe": statement_frame(
+                    con, f"price_trend_{ask['unit']}", ask["state"], ask["crop"], ask["count"])}
+            metrics.record_sql(con, planner["sql"], planner["params"])
+            with metrics.stage("sql"):
+                result = con.execute(planner["sql"], planner["params"])
+            with metrics.stage("fetchdf"):
+                df = result.df()
+            metrics.add_rows("fetchdf", len(df))
         return {"dataframe": df}
     except Exception as e:
         return {"error": f"SQL execution failed: {e}"}
 
 
+def statement_frame(con, name, *values):
+    df = statements.run(con, name, *values)
+    with metrics.stage("fetchdf"):
+        df = df.df()
+    metrics.add_rows("fetchdf", len(df))
+    return df
+
+
+WINDOW_COLUMNS = ["state", "year", "rainfall", "rolling_avg", "avg_annual_rainfall"]
+
+
+def window_frame(con, ask):
+    # compare_rainfall: one row per state and year (rainfall_window's
+    # columns), off the rainfall cube (rainfall_cube.py) when there is one
+    import pandas as pd
+
+    cube = cube_for(con)
+    if cube is None:
+        return statement_frame(con, "compare_rainfall_window", ask["states"], ask["subdivisions"],
+                               ask["year_from"], ask["year_to"], ask["last"])
+    with metrics.stage("cube"):
+        rows = cube.window(ask["states"], ask["subdivisions"], ask["year_from"],
+                           ask["year_to"], ask["last"], statements.ROLLING_YEARS)
+    metrics.add_rows("cube", len(rows))
+    return pd.DataFrame(rows, columns=WINDOW_COLUMNS)
+
+
+CLIMATE_INTENTS = {"rainfall_trend", "driest_years", "monsoon_status"}
+
+
+def climate_result(con, planner):
+    # Lookups into the precomputed climatology (rainfall_climate.py), one
+    # block of rows per asked-about state
+    import pandas as pd
+    from rainfall_climate import get_climate
+
+    ask, intent = planner["climate"], planner["intent"]
+    climate = get_climate(con)
+    rows = []
+    with metrics.stage("climate"):
+        for st in (ask["states"] if climate is not None else []):
+            key = st.lower()
+            if intent == "rainfall_trend":
+                rows += [r[:2] + r[3:] for r in climate.trend(key, ask["year"], ask["season"])]
+            elif intent == "driest_years":
+                rows += [(st, *r) for r in climate.extremes(
+                    key, ask["N"], ask["season"], ask["wettest"])]
+            elif ask["year"] is not None:
+                found = climate.status(key, ask["year"], ask["season"])
+                if found:
+                    rows.append((st, ask["year"], found["rainfall"], found["normal"],
+                                 found["departure"], found["category"]))
+    metrics.add_rows("climate", len(rows))
+    columns = {
+        "rainfall_trend": ["subdivision", "slope_mm_per_year", "from_year", "to_year"],
+        "driest_years": ["state", "year", "rainfall_mm", "departure_pct", "z_score"],
+        "monsoon_status": ["state", "year", "rainfall_mm", "normal_mm", "departure_pct",
+                           "category"],
+    }[intent]
+    heading = "Wettest years" if ask["wettest"] else "Driest years"
+    return {"dataframe": pd.DataFrame(rows, columns=columns), "heading": heading}
+
+
 # -----------------------------------------------------
 # Format Final Answer for Streamlit Display
 # -----------------------------------------------------
 def format_answer(result):
+    with metrics.stage("format"):
+        return _format_answer(result)
+
+
+def _format_answer(result):
     if "error" in result:
         return {"text": result["error"]}
 
+    import pandas as pd
+
     df = result.get("dataframe", pd.DataFrame())
 
     if df.empty:
@@ -148,18 +277,41 @@ def format_answer(result):
     # Convert table into readable text
     text = ""
     if "avg_annual_rainfall" in df.columns:
-        text = "Average annual rainfall:\n\n" + "\n".join(
-            [f"{r.state}: {r.avg_annual_rainfall:.2f}" for _, r in df.iterrows()]
-        )
+        # one row per state and year; the period average repeats per state
+        first, last = int(df["year"].min()), int(df["year"].max())
+        period = f" ({first}–{last})" if first != last else f" ({first})"
+        text = f"Average annual rainfall{period}:\n\n" + "\n".join(
+            pages.format_rows(df.drop_duplicates("state"), "{state}: {avg_annual_rainfall:%.2f}"))
+    elif "corr_same_year" in df.columns:
+        # one row per year; the statistics repeat on every row
+        r = df.iloc[0]
+        first, last = int(df["year"].min()), int(df["year"].max())
+        lines = [f"{label}: r = {corr:.2f} over {int(n)} years"
+                 for label, corr, n in [("Same year", r.corr_same_year, r.n_years),
+                                        ("Previous year", r.corr_prev_year, r.n_lagged)]
+                 if n >= 3 and not pd.isna(corr)]
+        text = f"Modal price against rainfall ({first}–{last}):\n\n" + (
+            "\n".join(lines) or "Not enough years with both prices and rainfall to correlate.")
+    elif "modal_avg" in df.columns:
+        text = "Price trend (modal average):\n\n" + "\n".join(pages.format_rows(
+            df, "{bucket:%Y-%m-%d}: {modal_avg:%.2f} (min {modal_min:%.2f}, max {modal_max:%.2f})"))
+    elif "slope_mm_per_year" in df.columns:
+        text = "Rainfall trend (Sen's slope):\n\n" + "\n".join(pages.format_rows(
+            df, "{subdivision:title}: {slope_mm_per_year:%+.2f} mm/year ({from_year}–{to_year})"))
+    elif "z_score" in df.columns:
+        text = result.get("heading", "Years") + ":\n\n" + "\n".join(pages.format_rows(
+            df, "{state} {year}: {rainfall_mm:%.1f} mm ({departure_pct:%+.0f}% of normal)"))
+    elif "category" in df.columns:
+        text = "Rainfall against normal:\n\n" + "\n".join(pages.format_rows(
+            df, "{state} {year}: {rainfall_mm:%.1f} mm vs normal {normal_mm:%.1f} mm "
+                "({departure_pct:%+.1f}%, {category})"))
     elif "crop" in df.columns:
         text = "Top crops:\n\n" + "\n".join(
-            [f"{r.crop}: {r.total_production:.2f}" for _, r in df.iterrows()]
-        )
+            pages.format_rows(df, "{crop}: {total_production:%.2f}"))
     elif "district_name" in df.columns:
         text = "Highest production districts:\n\n" + "\n".join(
-            [f"{r.district_name}: {r.total_production:.2f}" for _, r in df.iterrows()]
-        )
+            pages.format_rows(df, "{district_name}: {total_production:%.2f}"))
     else:
-        text = "Results:\n\n" + df.to_string(index=False)
+        text = "Results:\n\n" + pages.markdown_table(df)
 
     return {"text": text, "dataframe": df}
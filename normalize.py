@@ -0,0 +1,176 @@
+import catalog
+from resolver import load_canonical_states
+
+# ---------------------- DICTIONARY ENCODING ----------------------
+# Every loader runs its fact tables through here. Each entity column is
+# mapped to a canonical integer id kept in a small dimension table:
+#
+#   dim_state, dim_district, dim_market, dim_commodity, dim_subdivision
+#       (id INTEGER PRIMARY KEY, name VARCHAR UNIQUE), name lower/trimmed
+#
+# dim_state is seeded from states_canonical.csv, so the canonical states
+# have the same ids in every database. Any other name gets the next free id
+# the first time a load sees it, and ids never change after that, so
+# reloads and incremental appends keep them stable.
+#
+# Fact tables gain a <dimension>_id column per entity column and are
+# rewritten sorted by those ids (then year), so one id's rows sit together
+# and DuckDB's zone maps skip the rest. The rollups carry the same ids
+# (rollups.py) and the statements filter them by integer equality against
+# the ids whose names match the question (statements.py), instead of
+# LOWER(...) LIKE over every row.
+#
+# The same rewrite types price tables: arrival_date (dd/mm/yyyy text from
+# data.gov.in) becomes a DATE, and the rows are sorted by (commodity, state,
+# arrival_date) instead, so one crop's history in one state is a single
+# time-ordered run.
+
+DIMENSIONS = ["state", "district", "market", "commodity", "subdivision"]
+
+# table -> {entity column: dimension}, whichever columns the table has
+ENCODINGS = {
+    "rainfall_data": {"subdivision": "subdivision"},
+    "rainfall": {"subdivision": "subdivision"},
+    "crop_production": {"state": "state", "district": "district",
+                        "market": "market", "commodity": "commodity"},
+    # load_crop_data.py calls the commodity "crop", ingest.py "commodity"
+    "crop_market_prices": {"state": "state", "district": "district",
+                           "market": "market", "crop": "commodity", "commodity": "commodity"},
+    "crop_prod": {"state_name": "state", "district_name": "district", "crop": "commodity"},
+}
+
+
+def key_expr(column: str):
+    return f"lower(trim({column}))"
+
+
+def date_expr(column: str, dtype: str = None):
+    # `column` as a DATE; dd/mm/yyyy or ISO text is parsed. With no dtype
+    # the expression works on either (for SQL written before the type is known)
+    if dtype == "DATE":
+        return column
+    text = column if dtype == "VARCHAR" else f"CAST({column} AS VARCHAR)"
+    return f"COALESCE(try_strptime({text}, '%d/%m/%Y'), try_cast({text} AS TIMESTAMP))::DATE"
+
+
+def cluster_order(encoding: dict, columns):
+    ids = [id_column(d) for d in encoding.values()]
+    if "arrival_date" in columns:
+        lead = [c for c in map(id_column, ["commodity", "state"]) if c in ids]
+        return lead + ["arrival_date"] + [c for c in ids if c not in lead]
+    return ids + (["year"] if "year" in columns else [])
+
+
+def dim_table(dimension: str):
+    return f"dim_{dimension}"
+
+
+def id_column(dimension: str):
+    return f"{dimension}_id"
+
+
+def ensure_dimensions(con):
+    for dimension in DIMENSIONS:
+        con.execute(f"""
+            CREATE TABLE IF NOT EXISTS {dim_table(dimension)} (
+                id INTEGER PRIMARY KEY,
+                name VARCHAR NOT NULL UNIQUE
+            )
+        """)
+    states = load_canonical_states()
+    if states:
+        con.execute("CREATE OR REPLACE TEMP TABLE canonical_states (pos INTEGER, name VARCHAR)")
+        con.executemany("INSERT INTO canonical_states VALUES (?, ?)",
+                        [[i, s.strip().lower()] for i, s in enumerate(states)])
+        register(con, "state", "SELECT name, pos FROM canonical_states")
+        con.execute("DROP TABLE canonical_states")
+
+
+def register(con, dimension: str, names_sql: str):
+    # Appends the names `names_sql` yields (name[, position]) that the
+    # dimension does not have yet, numbered after the current highest id
+    dim = dim_table(dimension)
+    con.execute(f"""
+        INSERT INTO {dim}
+        SELECT (SELECT COALESCE(MAX(id), 0) FROM {dim})
+               + row_number() OVER (ORDER BY MIN(pos), name), name
+        FROM (SELECT * FROM ({names_sql}) AS names(name, pos)) AS n
+        WHERE name IS NOT NULL AND name <> ''
+        AND NOT EXISTS (SELECT 1 FROM {dim} d WHERE d.name = n.name)
+        GROUP BY name
+    """)
+
+
+def table_encoding(con, table: str, encoding=None):
+    # {column: dimension} for the entity columns `table` actually has
+    columns = catalog.table_columns(con, table)
+    encoding = encoding or ENCODINGS.get(table, {})
+    return {c: d for c, d in encoding.items() if c in columns}
+
+
+def is_encoded(con, table: str):
+    columns = catalog.table_columns(con, table)
+    return any(id_column(d) in columns for d in DIMENSIONS)
+
+
+def encode_table(con, table: str, encoding=None, temp: bool = False):
+    # Registers the table's names and rewrites it with its *_id columns,
+    # sorted by them (cluster_order) and with arrival_date typed as a DATE.
+    # Idempotent: ids from an earlier run are recomputed.
+    encoding = table_encoding(con, table, encoding)
+    if not encoding:
+        return 0
+    ensure_dimensions(con)
+    for column, dimension in encoding.items():
+        register(con, dimension, f"SELECT DISTINCT {key_expr(column)}, NULL FROM {table}")
+    types = catalog.column_types(con, table)
+    stale = [id_column(d) for d in DIMENSIONS if id_column(d) in types]
+    keep = f"t.* EXCLUDE ({', '.join(stale)})" if stale else "t.*"
+    if types.get("arrival_date", "DATE") != "DATE":
+        keep += f" REPLACE ({date_expr('t.arrival_date', types['arrival_date'])} AS arrival_date)"
+    ids, joins = [], []
+    for i, (column, dimension) in enumerate(encoding.items()):
+        ids.append(f"d{i}.id AS {id_column(dimension)}")
+        joins.append(f"LEFT JOIN {dim_table(dimension)} d{i} ON d{i}.name = {key_expr(f't.{column}')}")
+    order = cluster_order(encoding, types)
+    con.execute(f"""
+        CREATE OR REPLACE {"TEMP " if temp else ""}TABLE {table} AS
+        SELECT {keep}, {", ".join(ids)}
+        FROM {table} t
+        {" ".join(joins)}
+        ORDER BY {", ".join(order)}
+    """)
+    return len(encoding)
+
+
+def encode_all(con):
+    # Every known fact table present in the database
+    encoded = [t for t in ENCODINGS if catalog.has_table(con, t) and encode_table(con, t)]
+    if encoded:
+        sizes = ", ".join(
+            f"{d} {con.execute(f'SELECT COUNT(*) FROM {dim_table(d)}').fetchone()[0]}"
+            for d in DIMENSIONS)
+        print(f"🔢 Encoded {', '.join(encoded)} ({sizes} ids).")
+    return encoded
+
+
+def key_equals(con, table: str, column: str, value: str):
+    # (SQL predicate, its parameters) for lower(column) = value: integer
+    # equality on the id when the table is encoded (FALSE for a name the
+    # dimension lacks)
+    dimension = ENCODINGS.get(table, {}).get(column)
+    if dimension and id_column(dimension) in catalog.table_columns(con, table):
+        row = con.execute(f"SELECT id FROM {dim_table(dimension)} WHERE name = ?",
+                          [value.strip().lower()]).fetchone()
+        return (f"{id_column(dimension)} = ?", [row[0]]) if row else ("FALSE", [])
+    return f"lower({column}) = ?", [value]
+
+
+def ids_like(dimension: str, pattern: str):
+    # SQL: ids of the dimension's names containing `pattern` (an expression)
+    return f"(SELECT id FROM {dim_table(dimension)} WHERE name LIKE '%' || {pattern} || '%')"
+
+
+def id_of(dimension: str, name: str):
+    # SQL: the id of the dimension's name equal to `name` (an expression)
+    return f"(SELECT id FROM {dim_table(dimension)} WHERE name = {name})"
@@ -0,0 +1,196 @@
+import base64
+import json
+import os
+import re
+
+import metrics
+
+# ---------------------- PAGED RESULTS ----------------------
+# Answers that list rows (top crops, appp's tables, nlp_engine's fallback)
+# are read off DuckDB as Arrow record batches of SAMARTH_PAGE_ROWS rows
+# (default 50) and formatted one page at a time, so the front ends can show
+# the first rows while the rest are still being fetched and a broad question
+# never becomes one giant frame and string.
+#
+# Formatting is vectorized: each column is turned into strings in one call
+# (numpy printf-style formats for numbers, Arrow strftime for dates) and the
+# columns are concatenated element-wise, instead of f-strings per row.
+#
+#   format_rows(data, "{state}: {avg:%.2f}")   one line per row
+#   markdown_table(data)                       a markdown table
+#
+# `data` is an Arrow RecordBatch/Table or a pandas DataFrame.
+#
+# A page carries a token when there are more rows: an opaque string naming
+# the question's key and the offset to resume from, which ai_helper turns
+# back into the same statement starting at that row.
+
+PAGE_ROWS = int(os.getenv("SAMARTH_PAGE_ROWS", "50"))
+
+FIELD = re.compile(r"\{(\w+)(?::([^}]*))?\}")
+
+
+class Page:
+    __slots__ = ("text", "rows", "offset", "token", "more", "table")
+
+    def __init__(self, text, rows=0, offset=0, token=None, more=False, table=False):
+        self.text = text
+        self.rows = rows
+        self.offset = offset  # rows before this page
+        self.token = token  # resumes after this page; None on the last
+        self.more = more
+        self.table = table
+
+    def __repr__(self):
+        return f"Page({self.offset}+{self.rows}, more={self.more})"
+
+
+# ---------------------- FETCHING ----------------------
+def record_batches(result, rows: int = PAGE_ROWS):
+    # The DuckDB result's rows as Arrow record batches, read as they are consumed
+    reader = result.to_arrow_reader(rows) if hasattr(result, "to_arrow_reader") \
+        else result.fetch_record_batch(rows)
+    while True:
+        with metrics.stage("fetch_arrow"):
+            try:
+                batch = reader.read_next_batch()
+            except StopIteration:
+                return
+        if batch.num_rows:
+            metrics.add_rows("fetch_arrow", batch.num_rows)
+            yield batch
+
+
+def paginate(batches, format_batch, key=None, offset: int = 0, table: bool = False):
+    # One Page per batch; reads one batch ahead so the last page knows it is last
+    batches = iter(batches)
+    batch = next(batches, None)
+    while batch is not None:
+        following = next(batches, None)
+        with metrics.stage("format"):
+            text = format_batch(batch)
+        more = following is not None
+        end = offset + batch.num_rows
+        token = page_token(key, end) if more and key is not None else None
+        yield Page(text, batch.num_rows, offset, token, more, table)
+        batch, offset = following, end
+
+
+def page_token(key, offset: int):
+    raw = json.dumps([key, offset], sort_keys=True, default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def read_token(token: str):
+    # (key, offset); ValueError for anything page_token did not write
+    try:
+        key, offset = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("invalid page token")
+    if not isinstance(offset, int) or offset < 0:
+        raise ValueError("invalid page token")
+    return key, offset
+
+
+# ---------------------- FORMATTING ----------------------
+def column_names(data):
+    return list(data.column_names) if hasattr(data, "column_names") else list(data.columns)
+
+
+def column(data, name: str):
+    import pyarrow as pa
+
+    if isinstance(data, (pa.RecordBatch, pa.Table)):
+        return data.column(name)
+    return pa.Array.from_pandas(data[name])
+
+
+def strings(array):
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    text = pc.cast(array, pa.string()).fill_null("")
+    return np.asarray(text.to_numpy(zero_copy_only=False), dtype=str)
+
+
+def column_text(array, spec: str = ""):
+    # One string per value. spec: a printf-style format for numbers ("%.2f",
+    # "%+.1f"), a strftime format for dates, "title" for title-cased text;
+    # without one floats get two decimals, dates are yyyy-mm-dd and
+    # everything else is its plain text; without a spec, whole numbers
+    # (sums that pandas hands back as floats) drop the decimals. Nulls come
+    # out empty
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    kind = array.type
+    if spec == "title":
+        return np.char.title(strings(array))
+    if pa.types.is_timestamp(kind) or pa.types.is_date(kind):
+        # every date here is a day (pandas hands DATEs back as timestamps)
+        return strings(pc.strftime(array, format=spec or "%Y-%m-%d"))
+    numeric = pa.types.is_floating(kind) or pa.types.is_decimal(kind) or pa.types.is_integer(kind)
+    if numeric and (spec or not pa.types.is_integer(kind)):
+        values = pc.cast(array, pa.float64()).fill_null(float("nan")).to_numpy(zero_copy_only=False)
+        text = np.char.mod(spec or "%.2f", values)
+        whole = values == np.trunc(values)
+        if not spec and whole.any():
+            text[whole] = np.char.mod("%.0f", values[whole])
+        text[np.isnan(values)] = ""
+        return text
+    return strings(array)
+
+
+def join_columns(parts, rows: int):
+    # parts: literal strings and per-row string arrays, concatenated row-wise
+    import numpy as np
+
+    out = np.full(rows, "", dtype=str)
+    for part in parts:
+        out = np.char.add(out, part)
+    return out.tolist()
+
+
+def format_rows(data, template: str):
+    # One line per row; {column} or {column:spec} (column_text) in `template`
+    parts, pos = [], 0
+    for field in FIELD.finditer(template):
+        parts.append(template[pos:field.start()])
+        parts.append(column_text(column(data, field.group(1)), field.group(2) or ""))
+        pos = field.end()
+    parts.append(template[pos:])
+    return join_columns(parts, len(data))
+
+
+def is_numeric(array):
+    import pyarrow as pa
+
+    kind = array.type
+    return pa.types.is_integer(kind) or pa.types.is_floating(kind) or pa.types.is_decimal(kind)
+
+
+def markdown_table(data):
+    # Laid out as DataFrame.to_markdown did: every column padded to its
+    # widest cell, numbers right-aligned (and marked "---:"), text left
+    import numpy as np
+
+    header, rule, parts = [], [], ["| "]
+    for i, name in enumerate(column_names(data)):
+        array = column(data, name)
+        text = column_text(array)
+        width = max([len(name)] + ([int(np.char.str_len(text).max())] if len(text) else []))
+        if is_numeric(array):
+            header.append(name.rjust(width))
+            rule.append("-" * (width + 1) + ":")
+            text = np.char.rjust(text, width)
+        else:
+            header.append(name.ljust(width))
+            rule.append(":" + "-" * (width + 1))
+            text = np.char.ljust(text, width)
+        parts += [" | "] if i else []
+        parts.append(text)
+    parts.append(" |")
+    lines = ["| " + " | ".join(header) + " |", "|" + "|".join(rule) + "|"]
+    return "\n".join(lines + join_columns(parts, len(data)))
@@ -0,0 +1,103 @@
+import os
+import shutil
+import sys
+
+import duckdb
+
+import catalog
+from normalize import date_expr
+
+# ---------------------- PARQUET STORAGE TIER ----------------------
+# Optional alternative to serving queries from the .duckdb files: every table
+# is exported as zstd-compressed Parquet, the big fact tables hive-partitioned
+# so a filter on state/year/subdivision only opens the matching files:
+#
+#   <db>_store/crop_production/state=kerala/year=2024/data_0.parquet
+#   <db>_store/rainfall_data/subdivision=kerala/data_0.parquet
+#   <db>_store/price_state_commodity/data_0.parquet
+#
+# With SAMARTH_STORAGE=parquet the connection pool (db.py) opens an in-memory
+# DuckDB and exposes each exported table as a view over its files, so the
+# query layer runs unchanged and DuckDB prunes partitions from its filters.
+
+STORAGE = os.getenv("SAMARTH_STORAGE", "duckdb")
+
+# table -> partition columns (derived "year" comes from arrival_date)
+PARTITIONS = {
+    "crop_production": ["state", "year"],
+    "crop_market_prices": ["state", "year"],
+    "crop_prod": ["state_name", "year"],
+    "rainfall_data": ["subdivision"],
+    "rainfall": ["subdivision"],
+}
+
+
+def store_dir_for(db_path: str):
+    return os.getenv("SAMARTH_STORE_DIR") or os.path.splitext(db_path)[0] + "_store"
+
+
+def list_tables(con):
+    return [r[0] for r in con.execute(
+        "SELECT table_name FROM information_schema.tables "
+        "WHERE table_schema = 'main' AND table_type = 'BASE TABLE'"
+    ).fetchall()]
+
+
+def export_table(con, table: str, dest: str):
+    target = os.path.join(dest, table)
+    shutil.rmtree(target, ignore_errors=True)
+    os.makedirs(target, exist_ok=True)
+    partitions = PARTITIONS.get(table, [])
+    types = catalog.column_types(con, table)
+    select = "*"
+    if "year" in partitions and "year" not in types:
+        select = f"*, year({date_expr('arrival_date', types['arrival_date'])}) AS year"
+    options = "FORMAT parquet, COMPRESSION zstd"
+    if partitions:
+        options += f", PARTITION_BY ({', '.join(partitions)}), OVERWRITE_OR_IGNORE"
+        con.execute(f"COPY (SELECT {select} FROM {table}) TO '{target}' ({options})")
+    else:
+        con.execute(
+            f"COPY (SELECT {select} FROM {table}) TO '{os.path.join(target, 'data_0.parquet')}' ({options})")
+
+
+def export_store(con, dest: str):
+    os.makedirs(dest, exist_ok=True)
+    tables = list_tables(con)
+    for table in tables:
+        export_table(con, table, dest)
+        print(f"🗂️ Exported '{table}' to {os.path.join(dest, table)}/")
+    return tables
+
+
+def attach_store(con, dest: str):
+    # Creates (or refreshes) one view per exported table
+    views = []
+    for table in sorted(os.listdir(dest)):
+        folder = os.path.join(dest, table)
+        if not os.path.isdir(folder):
+            continue
+        pattern = os.path.join(folder, "**", "*.parquet").replace("'", "''")
+        con.execute(f"""
+            CREATE OR REPLACE VIEW {table} AS
+            SELECT * FROM read_parquet('{pattern}', hive_partitioning = true)
+        """)
+        views.append(table)
+    return views
+
+
+def open_store(db_path: str, config=None):
+    dest = store_dir_for(db_path)
+    con = duckdb.connect(":memory:", config=config or {})
+    attach_store(con, dest)
+    path = os.path.abspath(dest).replace("'", "''")
+    con.execute(f"CREATE VIEW {catalog.STORE_VIEW} AS SELECT '{path}' AS path")
+    return con
+
+
+if __name__ == "__main__":
+    db_path = sys.argv[1] if len(sys.argv) > 1 else "samarth_data.duckdb"
+    con = duckdb.connect(db_path, read_only=True)
+    export_store(con, store_dir_for(db_path))
+    print(f"💾 Generation {catalog.current_generation(con)} of {db_path} exported.")
+    con.close()
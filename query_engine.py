@@ -1,10 +1,14 @@
-import duckdb
+from db import get_pool
+
+DB_FILE = "samarth.db"
 
 
 def answer_query(query):
-    con = duckdb.connect("samarth.db")
-    query = query.lower()
+    with get_pool(DB_FILE).cursor() as con:
+        _answer_query(con, query.lower())
+
 
+def _answer_query(con, query):
     if "top" in query and "crop" in query and "karnataka" in query:
         # Example: Top 5 crops in Karnataka in 2020
         sql = """
@@ -34,8 +38,6 @@ def answer_query(query):
     else:
         print("❓ Sorry, I don't understand that question yet.")
 
-    con.close()
-
 
 if __name__ == "__main__":
     print("Welcome to Project Samarth Q&A Interface!")
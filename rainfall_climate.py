@@ -0,0 +1,255 @@
+import numpy as np
+
+import catalog
+from rainfall_cube import cube_dir_for, current_cube, load_arrays, nanmean, save_arrays, widen
+
+# ---------------------- RAINFALL CLIMATOLOGY ----------------------
+# Long-term statistics per subdivision and season, computed once per ingest
+# from the rainfall cube (rainfall_cube.py) with whole-array numpy ops, so
+# trend / extreme-year / monsoon-status questions are lookups rather than
+# full-history scans:
+#
+#   normal     [subdivision, season]        long-term mean over every year
+#   std        [subdivision, season]        standard deviation (ddof=1)
+#   z          [subdivision, year, season]  (value - normal) / std
+#   departure  [subdivision, year, season]  % departure from normal
+#   slope      [subdivision, season, start] Sen's slope (mm/year) of the
+#                                           series from each start year on
+#
+# Trends are precomputed for the whole record and from every decade year
+# (1910, 1920, ...); any other start year is computed on demand for just
+# the matching subdivisions. Departures are graded with IMD's categories.
+# The arrays are saved next to the cube in <db>_cube/ and memory-mapped the
+# same way.
+
+SEASONS = ["annual_filled", "jf", "mam", "jjas", "ond"]
+SEASON_NAMES = {
+    "annual_filled": "annual",
+    "jf": "winter (Jan–Feb)",
+    "mam": "pre-monsoon (Mar–May)",
+    "jjas": "monsoon (Jun–Sep)",
+    "ond": "post-monsoon (Oct–Dec)",
+}
+# checked in order: "pre-monsoon" must win over "monsoon"
+SEASON_WORDS = [
+    ("post-monsoon", "ond"), ("post monsoon", "ond"), ("northeast monsoon", "ond"),
+    ("pre-monsoon", "mam"), ("pre monsoon", "mam"), ("summer", "mam"),
+    ("winter", "jf"), ("monsoon", "jjas"),
+]
+# IMD departure-from-normal categories: (lowest departure %, label)
+CATEGORIES = [
+    (20, "excess"),
+    (-19, "normal"),
+    (-59, "deficient"),
+    (-99, "large deficient"),
+    (-100, "no rain"),
+]
+MIN_TREND_YEARS = 10
+CHUNK = 64  # series per Sen's-slope batch, bounds the pairwise-slope memory
+
+ARRAYS = ["normal", "std", "z", "departure", "slope"]
+
+
+def season_of(text: str):
+    text = text.lower()
+    for word, season in SEASON_WORDS:
+        if word in text:
+            return season
+    return "annual_filled"
+
+
+def category(departure: float):
+    for lowest, label in CATEGORIES:
+        if departure >= lowest:
+            return label
+    return CATEGORIES[-1][1]
+
+
+def sen_slopes(years, series, starts):
+    # Sen's slope of every row of `series` [N, T] (NaN = missing) from each
+    # year index in `starts` on -> [N, len(starts)]. Pairs come from
+    # triu_indices, ordered by their first year, so "from start k on" is a
+    # suffix of the pair list.
+    years = np.asarray(years, dtype=np.float64)
+    first, second = np.triu_indices(len(years), 1)
+    offsets = np.searchsorted(first, starts)
+    result = np.full((len(series), len(starts)), np.nan)
+    for lo in range(0, len(series), CHUNK):
+        chunk = series[lo:lo + CHUNK]
+        slopes = (chunk[:, second] - chunk[:, first]) / (years[second] - years[first])
+        gaps = np.isnan(slopes).any(axis=1)
+        for i, offset in enumerate(offsets):
+            pairs = slopes[:, offset:]
+            # complete series (the usual case) skip nanmedian's NaN handling
+            if (~gaps).any():
+                result[lo:lo + CHUNK][~gaps, i] = np.median(pairs[~gaps], axis=1)
+            enough = gaps & ~np.isnan(pairs).all(axis=1)
+            if enough.any():
+                result[lo:lo + CHUNK][enough, i] = np.nanmedian(pairs[enough], axis=1)
+    return result
+
+
+def trend_starts(years):
+    # year indexes trends are precomputed from: the whole record, then
+    # every decade year leaving at least MIN_TREND_YEARS of data
+    years = np.asarray(years)
+    if len(years) == 0:
+        return []
+    starts = [0] + [i for i, y in enumerate(years)
+                    if i > 0 and y % 10 == 0 and years[-1] - y + 1 >= MIN_TREND_YEARS]
+    return starts
+
+
+class Climatology:
+    def __init__(self, cube, normal, std, z, departure, slope, starts):
+        self.cube = cube
+        self.normal = normal
+        self.std = std
+        self.z = z
+        self.departure = departure
+        self.slope = slope
+        self.starts = [int(cube.years[i]) for i in starts]
+        self.start_index = {y: i for i, y in enumerate(self.starts)}
+        self.season_index = {s: i for i, s in enumerate(SEASONS)}
+
+    @property
+    def generation(self):
+        return self.cube.generation
+
+    def rows(self, state: str):
+        return self.cube.match(state)
+
+    def trend(self, state: str, since=None, season: str = "annual_filled"):
+        # [(subdivision, slope mm/year, normal mm, first year, last year)]
+        # for every matching subdivision with enough years of data
+        cube, k = self.cube, self.season_index[season]
+        if since is not None and since <= cube.years[0]:
+            since = None
+        rows = self.rows(state)
+        span = cube.year_span(since, None)
+        years = cube.years[span]
+        if rows.size == 0 or len(years) < MIN_TREND_YEARS:
+            return []
+        if since is None:
+            slopes = self.slope[rows, k, 0]
+        elif since in self.start_index:
+            slopes = self.slope[rows, k, self.start_index[since]]
+        else:
+            series = widen(cube.values[rows, span, cube.column_index[season]])
+            slopes = sen_slopes(years, series, [0])[:, 0]
+        result = []
+        for row, slope in zip(rows, slopes):
+            present = np.flatnonzero(cube.counts[row, span] > 0)
+            if len(present) < MIN_TREND_YEARS or np.isnan(slope):
+                continue
+            result.append((cube.subdivisions[row], float(slope), float(self.normal[row, k]),
+                           int(years[present[0]]), int(years[present[-1]])))
+        return result
+
+    def extremes(self, state: str, n: int = 5, season: str = "annual_filled",
+                 wettest: bool = False):
+        # The n driest (or wettest) years over the matching subdivisions,
+        # ranked by their mean z-score: [(year, rainfall mm, departure %, z)]
+        cube, k = self.cube, self.season_index[season]
+        rows = self.rows(state)
+        if rows.size == 0:
+            return []
+        present = cube.counts[rows] > 0
+        z = np.where(present, self.z[rows, :, k], np.nan)
+        counted = (~np.isnan(z)).sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_z = np.nansum(z, axis=0) / counted
+        ranked = np.flatnonzero(counted > 0)
+        ranked = ranked[np.argsort(mean_z[ranked], kind="stable")]
+        if wettest:
+            ranked = ranked[::-1]
+        result = []
+        for y in ranked[:n]:
+            cells = rows[present[:, y]]
+            result.append((int(cube.years[y]),
+                           nanmean(widen(cube.values[cells, y, cube.column_index[season]])),
+                           nanmean(self.departure[cells, y, k]),
+                           float(mean_z[y])))
+        return result
+
+    def status(self, state: str, year: int, season: str = "jjas"):
+        # One year against normal over the matching subdivisions, or None
+        cube, k = self.cube, self.season_index[season]
+        rows, y = self.rows(state), cube.year_index.get(year)
+        if rows.size == 0 or y is None:
+            return None
+        rows = rows[cube.counts[rows, y] > 0]
+        value = nanmean(widen(cube.values[rows, y, cube.column_index[season]])) \
+            if rows.size else float("nan")
+        if np.isnan(value):
+            return None
+        normal = nanmean(self.normal[rows, k])
+        departure = 100.0 * (value - normal) / normal if normal else float("nan")
+        return {"rainfall": value, "normal": normal, "departure": departure,
+                "z": nanmean(self.z[rows, y, k]), "category": category(departure),
+                "subdivisions": [cube.subdivisions[r] for r in rows]}
+
+
+# ---------------------- BUILD ----------------------
+def build(cube):
+    columns = [cube.column_index[s] for s in SEASONS]
+    values = widen(cube.values[:, :, columns])                  # [S, Y, K]
+    values[~(cube.counts > 0)] = np.nan
+    counted = (~np.isnan(values)).sum(axis=1)                   # [S, K]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        normal = np.nansum(values, axis=1) / counted
+        deviations = values - normal[:, None, :]
+        std = np.sqrt(np.nansum(deviations ** 2, axis=1) / (counted - 1))
+        z = deviations / std[:, None, :]
+        departure = 100.0 * deviations / normal[:, None, :]
+    starts = trend_starts(cube.years)
+    series = values.transpose(0, 2, 1).reshape(-1, len(cube.years))  # [S*K, Y]
+    slope = sen_slopes(cube.years, series, starts).reshape(
+        len(cube.subdivisions), len(SEASONS), len(starts))
+    return Climatology(cube, normal, std, z.astype(np.float32),
+                       departure.astype(np.float32), slope, starts)
+
+
+# ---------------------- PERSISTENCE ----------------------
+def save(climate: Climatology, dest: str):
+    meta = {"generation": climate.generation, "seasons": SEASONS,
+            "subdivisions": len(climate.cube.subdivisions),
+            "starts": climate.starts}
+    arrays = {f"climate_{name}": getattr(climate, name) for name in ARRAYS}
+    return save_arrays(dest, arrays, "climate", meta)
+
+
+def load(dest: str, cube):
+    # Memory-mapped climatology for `cube`, or None when missing or stale
+    loaded = load_arrays(dest, [f"climate_{name}" for name in ARRAYS], "climate",
+                         cube.generation)
+    if loaded is None:
+        return None
+    meta, arrays = loaded
+    if meta["seasons"] != SEASONS or meta["subdivisions"] != len(cube.subdivisions) \
+            or arrays["climate_z"].shape != (len(cube.subdivisions), len(cube.years), len(SEASONS)):
+        return None
+    starts = [cube.year_index[y] for y in meta["starts"] if y in cube.year_index]
+    if len(starts) != len(meta["starts"]):
+        return None
+    return Climatology(cube, *(arrays[f"climate_{name}"] for name in ARRAYS), starts)
+
+
+# ---------------------- PER-DATABASE CLIMATOLOGY ----------------------
+_climates = {}  # database path -> (cube, climatology or None)
+
+
+def get_climate(con):
+    # Follows the cube: reloaded (or rebuilt) whenever it is. There is no SQL
+    # fallback for these, so SAMARTH_RAINFALL_CUBE does not apply.
+    cube = current_cube(con)
+    if cube is None:
+        return None
+    path = catalog.database_path(con)
+    cached = _climates.get(path)
+    if cached is None or cached[0] is not cube:
+        climate = load(cube_dir_for(path), cube) if path != ":memory:" else None
+        if climate is None:
+            climate = build(cube)
+        cached = _climates[path] = (cube, climate)
+    return cached[1]
@@ -0,0 +1,322 @@
+import json
+import os
+
+import numpy as np
+
+import catalog
+import regions
+import rollups
+
+# ---------------------- RAINFALL CUBE ----------------------
+# The rainfall table is a dense subdivision x year grid, so rainfall answers
+# are served from an in-memory array instead of a LIKE scan per question:
+#
+#   subdivisions   axis 0, lower/trimmed names (dictionary-encoded)
+#   years          axis 1, ascending
+#   values         float32 [subdivision, year, column]; NaN where missing
+#   counts         int32 [subdivision, year]; raw rows behind each cell
+#
+# Columns are the months, the seasons and annual / annual_filled, averaged
+# per cell exactly like the rainfall_yearly rollup (rollups.py). A state is
+# matched against the subdivision axis once (substring, as LIKE '%state%')
+# and every later average / compare / range is numpy indexing on that.
+#
+# Loaders persist the cube next to the database as <db>_cube/ (values.npy,
+# counts.npy, axes.json with the data generation it was built at); engines
+# memory-map it, so every process shares the same pages and starts without
+# touching the CSV or re-aggregating. A missing or stale cube is rebuilt in
+# memory from the database. SAMARTH_RAINFALL_CUBE=0 sends average/compare
+# rainfall questions back to SQL. rainfall_climate.py keeps its
+# precomputations (normals, anomalies, trends) in the same directory.
+
+ENABLED = os.getenv("SAMARTH_RAINFALL_CUBE", "1") != "0"
+
+COLUMNS = [*rollups.MONTHS, *rollups.SEASONS, "annual", "annual_filled"]
+
+
+class RainfallCube:
+    def __init__(self, subdivisions, years, values, counts, generation=0):
+        self.subdivisions = list(subdivisions)
+        self.years = np.asarray(years, dtype=np.int32)
+        self.values = values
+        self.counts = counts
+        self.generation = generation
+        self.column_index = {c: i for i, c in enumerate(COLUMNS)}
+        self.year_index = {int(y): i for i, y in enumerate(self.years)}
+        self.subdivision_index = {s: i for i, s in enumerate(self.subdivisions)}
+        self._matches = {}
+
+    def __len__(self):
+        return int((self.counts > 0).sum())
+
+    # ---------- axis lookups ----------
+    def match(self, state: str):
+        # Rows whose subdivision contains `state`, like LIKE '%state%'
+        rows = self._matches.get(state)
+        if rows is None:
+            rows = np.array([i for i, s in enumerate(self.subdivisions) if state in s],
+                            dtype=np.intp)
+            if len(self._matches) < 10000:
+                self._matches[state] = rows
+        return rows
+
+    def covering(self, state: str):
+        # Rows whose subdivision counts toward `state` (regions.covers)
+        key = ("covering", state)
+        rows = self._matches.get(key)
+        if rows is None:
+            rows = np.array([i for i, s in enumerate(self.subdivisions)
+                             if regions.covers(s, state)], dtype=np.intp)
+            if len(self._matches) < 10000:
+                self._matches[key] = rows
+        return rows
+
+    def rows_for(self, names):
+        # Rows of exactly these subdivision names (unknown names are skipped)
+        return np.array([self.subdivision_index[n] for n in names
+                         if n in self.subdivision_index], dtype=np.intp)
+
+    def year_span(self, year_from=None, year_to=None):
+        lo = 0 if year_from is None else np.searchsorted(self.years, year_from, "left")
+        hi = len(self.years) if year_to is None else np.searchsorted(self.years, year_to, "right")
+        return slice(int(lo), int(hi))
+
+    # ---------- reductions ----------
+    def cells(self, state: str, year: int, column: str = "annual"):
+        # `column` of every matching subdivision with rows in `year`
+        rows, y = self.match(state), self.year_index.get(year)
+        if y is None or rows.size == 0:
+            return widen([])
+        rows = rows[self.counts[rows, y] > 0]
+        return widen(self.values[rows, y, self.column_index[column]])
+
+    def mean(self, state: str, year: int, column: str = "annual"):
+        # None when no row exists, NaN when the rows exist but the value is
+        # missing (what AVG over the rows would say)
+        cells = self.cells(state, year, column)
+        return nanmean(cells) if cells.size else None
+
+    def series(self, state: str, year_from=None, year_to=None, column: str = "annual"):
+        # (years, per-year mean over the matching subdivisions) for the years
+        # that have rows
+        rows, span = self.match(state), self.year_span(year_from, year_to)
+        block = widen(self.values[rows, span, self.column_index[column]])
+        present = self.counts[rows, span] > 0
+        has_rows = present.any(axis=0)
+        valid = present & ~np.isnan(block)
+        totals = np.where(valid, block, 0.0).sum(axis=0)
+        counted = valid.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = totals / counted
+        return self.years[span][has_rows], means[has_rows]
+
+    def range_mean(self, state: str, year_from=None, year_to=None,
+                   column: str = "annual"):
+        # Mean over every matching (subdivision, year) cell in the range
+        rows, span = self.match(state), self.year_span(year_from, year_to)
+        present = self.counts[rows, span] > 0
+        if not present.any():
+            return None
+        return nanmean(widen(self.values[rows, span, self.column_index[column]][present]))
+
+    def window(self, states, names=(), year_from=None, year_to=None, last=None,
+               rolling: int = 5, column: str = "annual_filled"):
+        # statements.rainfall_window off the cube: every subdivision covering
+        # one of `states` (regions.covers; or exactly `names`, when given),
+        # counted for each state it covers, else under its own name; the
+        # years in [year_from, year_to] that have rows, cut to the `last`
+        # most recent. [(label, year, mean, rolling mean, period mean), ...]
+        # in the statement's order.
+        keys = [s.lower() for s in states]
+        if names:
+            rows = self.rows_for(dict.fromkeys(names))
+        else:
+            rows = np.unique(np.concatenate([self.covering(k) for k in keys] or [[]])).astype(np.intp)
+        span = self.year_span(year_from, year_to)
+        if rows.size == 0 or span.start >= span.stop:
+            return []
+        present = self.counts[rows, span] > 0
+        years = np.flatnonzero(present.any(axis=0))
+        if last is not None:
+            years = years[-last:] if last > 0 else years[:0]
+        present = present[:, years]
+        years += span.start
+        block = widen(self.values[rows[:, None], years, self.column_index[column]])
+        valid = present & ~np.isnan(block)
+        owned = [np.isin(rows, self.covering(k)) for k in keys]
+        labelled = np.logical_or.reduce(owned) if owned else np.zeros(rows.size, bool)
+        groups = list(zip(states, owned))
+        groups += sorted((self.subdivisions[r], rows == r) for r in rows[~labelled])
+        result = []
+        for label, mine in groups:
+            has_rows = present[mine].any(axis=0)
+            if not has_rows.any():
+                continue
+            counted = valid[mine].sum(axis=0)[has_rows]
+            totals = np.where(valid[mine], block[mine], 0.0).sum(axis=0)[has_rows]
+            mine_years = self.years[years][has_rows]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                yearly = totals / counted
+            # rolling mean over the years within `rolling` of each year, and
+            # the period mean, both skipping missing years like AVG()
+            known = ~np.isnan(yearly)
+            sums = np.concatenate([[0.0], np.cumsum(np.where(known, yearly, 0.0))])
+            seen = np.concatenate([[0], np.cumsum(known)])
+            lo = np.searchsorted(mine_years, mine_years - (rolling - 1), "left")
+            hi = np.arange(1, len(mine_years) + 1)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                rolled = (sums[hi] - sums[lo]) / (seen[hi] - seen[lo])
+            period = nanmean(yearly)
+            result += [(label, int(y), float(v), float(r), period)
+                       for y, v, r in zip(mine_years, yearly, rolled)]
+        return result
+
+
+def widen(values):
+    # float32 -> the float64 the database holds. float32 keeps every value to
+    # six significant digits (rainfall is recorded to 0.1 mm), so rounding
+    # back to six digits recovers the DOUBLE exactly and sums/averages match
+    # what SQL computes over the raw column.
+    values = np.asarray(values, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        digits = np.floor(np.log10(np.abs(values)))
+    finite = np.isfinite(digits)
+    scale = 10.0 ** np.clip(np.where(finite, 5 - digits, 0), 0, 15)
+    return np.where(finite, np.rint(values * scale) / scale, values)
+
+
+def nanmean(values):
+    # AVG() semantics: NULLs skipped, NaN when nothing is left
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    return float(values.mean()) if values.size else float("nan")
+
+
+# ---------------------- BUILD ----------------------
+def build(con):
+    source = rollups.rainfall_source(con)
+    if source is None:
+        return None
+    seasons = rollups.season_aggregates(catalog.table_columns(con, source))
+    data = con.execute(f"""
+        SELECT
+            {rollups.key_expr("subdivision")} AS subdivision,
+            year AS year,
+            {", ".join(f"AVG({m}) AS {m}" for m in rollups.MONTHS)},
+            {", ".join(seasons)},
+            AVG(annual) AS annual,
+            AVG(COALESCE(annual, {rollups.month_total(rollups.MONTHS)})) AS annual_filled,
+            COUNT(*) AS n
+        FROM {source}
+        WHERE subdivision IS NOT NULL AND year IS NOT NULL
+        GROUP BY 1, 2
+    """).fetchnumpy()
+    subdivisions, sub_idx = np.unique(np.asarray(data["subdivision"], dtype=object),
+                                      return_inverse=True)
+    years, year_idx = np.unique(np.asarray(data["year"], dtype=np.int64),
+                                return_inverse=True)
+    values = np.full((len(subdivisions), len(years), len(COLUMNS)), np.nan, dtype=np.float32)
+    for i, column in enumerate(COLUMNS):
+        values[sub_idx, year_idx, i] = np.ma.filled(
+            np.ma.asarray(data[column], dtype=np.float64), np.nan)
+    counts = np.zeros((len(subdivisions), len(years)), dtype=np.int32)
+    counts[sub_idx, year_idx] = np.asarray(data["n"])
+    return RainfallCube(subdivisions.tolist(), years, values, counts,
+                        generation=catalog.current_generation(con))
+
+
+# ---------------------- PERSISTENCE ----------------------
+def cube_dir_for(db_path: str):
+    return os.getenv("SAMARTH_CUBE_DIR") or os.path.splitext(db_path)[0] + "_cube"
+
+
+def save_arrays(dest: str, arrays: dict, meta_name: str, meta: dict):
+    # Arrays first, the JSON last: a reader only trusts arrays whose
+    # metadata (and generation) have been written
+    os.makedirs(dest, exist_ok=True)
+    for name, array in arrays.items():
+        tmp = os.path.join(dest, f"{name}.tmp.npy")
+        np.save(tmp, np.ascontiguousarray(array))
+        os.replace(tmp, os.path.join(dest, f"{name}.npy"))
+    tmp = os.path.join(dest, f"{meta_name}.tmp.json")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(dest, f"{meta_name}.json"))
+    return dest
+
+
+def load_arrays(dest: str, names, meta_name: str, generation=None):
+    # (meta, {name: array}) memory-mapped from `dest`, or None when missing
+    # or built for another generation. Arrays come back as plain ndarray
+    # views over the mapping: same pages, no memmap overhead on every index.
+    try:
+        with open(os.path.join(dest, f"{meta_name}.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if generation is not None and meta["generation"] != generation:
+            return None
+        arrays = {name: np.load(os.path.join(dest, f"{name}.npy"),
+                                mmap_mode="r").view(np.ndarray) for name in names}
+    except (OSError, ValueError, KeyError):
+        return None
+    return meta, arrays
+
+
+def save(cube: RainfallCube, dest: str):
+    axes = {"generation": cube.generation, "columns": COLUMNS,
+            "subdivisions": cube.subdivisions, "years": cube.years.tolist()}
+    return save_arrays(dest, {"values": cube.values, "counts": cube.counts}, "axes", axes)
+
+
+def load(dest: str, generation=None):
+    # Memory-mapped cube from `dest`, or None when it is missing, built for
+    # another generation, or does not fit its axes
+    loaded = load_arrays(dest, ["values", "counts"], "axes", generation)
+    if loaded is None:
+        return None
+    axes, arrays = loaded
+    shape = (len(axes["subdivisions"]), len(axes["years"]))
+    if axes["columns"] != COLUMNS or arrays["values"].shape != (*shape, len(COLUMNS)) \
+            or arrays["counts"].shape != shape:
+        return None
+    return RainfallCube(axes["subdivisions"], axes["years"], arrays["values"],
+                        arrays["counts"], generation=axes["generation"])
+
+
+def save_for(con, db_path: str):
+    # Loader hook: rebuild and persist the cube after an ingest (and its
+    # generation bump)
+    cube = build(con)
+    if cube is None:
+        return None
+    dest = save(cube, cube_dir_for(db_path))
+    print(f"🧊 Rainfall cube saved to {dest}/ ({len(cube)} subdivision-years).")
+    # climatology / anomalies / trends derived from it (rainfall_climate.py)
+    import rainfall_climate
+
+    rainfall_climate.save(rainfall_climate.build(cube), dest)
+    print(f"📈 Rainfall climatology saved to {dest}/.")
+    return cube
+
+
+# ---------------------- PER-DATABASE CUBE ----------------------
+_cubes = {}  # database path -> (generation, cube or None)
+
+
+def get_cube(con):
+    # The cube the rainfall intents answer from; None when disabled (they
+    # fall back to SQL) or there is no rainfall table
+    return current_cube(con) if ENABLED else None
+
+
+def current_cube(con):
+    # Loaded (or built) once per database and reused until an ingest bumps
+    # the data generation
+    path = catalog.database_path(con)
+    generation = catalog.cached_generation(con)
+    cached = _cubes.get(path)
+    if cached is None or cached[0] != generation:
+        cube = load(cube_dir_for(path), generation) if path != ":memory:" else None
+        if cube is None:
+            cube = build(con)
+        cached = _cubes[path] = (generation, cube)
+    return cached[1]
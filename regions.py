@@ -0,0 +1,145 @@
+import normalize
+from resolver import load_canonical_states
+
+# ---------------------- SUBDIVISION -> STATE -> DISTRICT ----------------------
+# Rainfall is keyed by IMD meteorological subdivision ("Coastal Karnataka",
+# "Vidarbha"), prices by state and district. region_map links the two on
+# dictionary ids (normalize.py) and is rebuilt with the rollups:
+#
+#   region_map(subdivision_id, state_id, district_id, subdivision, state, district)
+#
+# A row without a district says the subdivision covers (part of) the state;
+# a row with one says that district lies in the subdivision. A subdivision
+# covers every state whose name it contains (states_canonical.csv and the
+# price data's states) plus those SUBDIVISION_STATES lists for the name
+# fragments it contains; one that names no state at all is taken to be a
+# state of its own. District rows come from SUBDIVISION_DISTRICTS. Names
+# are matched as fragments so the synthetic "<name> #n" copies map too.
+
+REGION_TABLE = "region_map"
+
+# subdivision name fragment -> states it covers
+SUBDIVISION_STATES = {
+    "andaman & nicobar": ["andaman and nicobar"],
+    "arunachal pradesh": ["arunachal pradesh"],
+    "assam": ["assam"],
+    "meghalaya": ["meghalaya"],
+    "naga mani mizo tripura": ["nagaland", "manipur", "mizoram", "tripura"],
+    "west bengal": ["west bengal"],
+    "sikkim": ["sikkim"],
+    "orissa": ["odisha"],
+    "madhya pradesh": ["madhya pradesh"],
+    "rajasthan": ["rajasthan"],
+    "gujarat region": ["gujarat"],
+    "saurashtra & kutch": ["gujarat"],
+    "konkan & goa": ["maharashtra", "goa"],
+    "madhya maharashtra": ["maharashtra"],
+    "matathwada": ["maharashtra"],
+    "vidarbha": ["maharashtra"],
+    "coastal andhra pradesh": ["andhra pradesh"],
+    "rayalseema": ["andhra pradesh"],
+    "haryana delhi & chandigarh": ["haryana", "delhi", "chandigarh"],
+    "himachal pradesh": ["himachal pradesh"],
+    "jammu & kashmir": ["jammu and kashmir"],
+    "uttarakhand": ["uttarakhand"],
+    "lakshadweep": ["lakshadweep"],
+}
+
+# subdivision name fragment -> {state: districts in it}, for the states
+# IMD splits across several subdivisions
+SUBDIVISION_DISTRICTS = {
+    "coastal andhra pradesh": {"andhra pradesh": [
+        "srikakulam", "vizianagaram", "visakhapatnam", "east godavari", "west godavari",
+        "krishna", "guntur", "prakasam", "nellore"]},
+    "rayalseema": {"andhra pradesh": [
+        "kurnool", "anantapur", "kadapa", "cuddapah", "chittoor", "chittor"]},
+    "coastal karnataka": {"karnataka": ["dakshina kannada", "udupi", "uttara kannada"]},
+    "north interior karnataka": {"karnataka": [
+        "belgaum", "bijapur", "bagalkot", "dharwad", "gadag", "haveri", "gulbarga",
+        "bidar", "raichur", "koppal", "yadgir"]},
+    "south interior karnataka": {"karnataka": [
+        "bangalore", "bangalore rural", "ramanagara", "mysore", "mandya", "hassan",
+        "tumkur", "kolar", "chikkaballapur", "chikmagalur", "shimoga", "chitradurga",
+        "davangere", "chamarajanagar", "kodagu", "bellary"]},
+    "konkan & goa": {
+        "maharashtra": ["mumbai", "thane", "palghar", "raigad", "ratnagiri", "sindhudurg"],
+        "goa": ["north goa", "south goa"]},
+    "madhya maharashtra": {"maharashtra": [
+        "pune", "nashik", "ahmednagar", "satara", "sangli", "kolhapur", "solapur",
+        "dhule", "jalgaon", "nandurbar"]},
+    "matathwada": {"maharashtra": [
+        "aurangabad", "jalna", "beed", "latur", "osmanabad", "nanded", "parbhani", "hingoli"]},
+    "vidarbha": {"maharashtra": [
+        "nagpur", "amravati", "akola", "wardha", "yavatmal", "chandrapur", "gadchiroli",
+        "bhandara", "gondia", "washim", "buldhana"]},
+    "gujarat region": {"gujarat": [
+        "ahmedabad", "gandhinagar", "vadodara", "surat", "kheda", "anand", "panchmahal",
+        "bharuch", "navsari", "valsad", "mehsana", "sabarkantha", "banaskantha"]},
+    "saurashtra & kutch": {"gujarat": [
+        "rajkot", "jamnagar", "junagadh", "bhavnagar", "amreli", "porbandar",
+        "surendranagar", "kutch"]},
+}
+
+
+def listed_states(subdivision: str):
+    # States SUBDIVISION_STATES lists for the fragments the name contains
+    return [name for fragment, names in SUBDIVISION_STATES.items()
+            if fragment in subdivision for name in names]
+
+
+def covers(subdivision: str, state: str):
+    # Whether a subdivision counts toward `state`, the rule region_map is
+    # built with: it contains the state's name or lists it
+    return state in subdivision or state in listed_states(subdivision)
+
+
+def covers_sql(column: str, state: str):
+    # covers() as a SQL predicate over the expressions `column` and `state`
+    listed = " ".join(
+        f"OR (contains({column}, '{fragment}') AND {state} IN ({', '.join(map(repr, names))}))"
+        for fragment, names in SUBDIVISION_STATES.items())
+    return f"(contains({column}, {state}) {listed})"
+
+
+def region_rows(subdivisions, states):
+    # (subdivision, state, district or None) for every known subdivision
+    rows = []
+    for sub in subdivisions:
+        covered = [s for s in states if s in sub] + listed_states(sub)
+        for state in dict.fromkeys(covered) or [sub]:
+            rows.append((sub, state, None))
+        for fragment, by_state in SUBDIVISION_DISTRICTS.items():
+            if fragment in sub:
+                rows.extend((sub, state, d) for state, districts in by_state.items()
+                            for d in districts)
+    return rows
+
+
+def build_region_map(con):
+    # Needs the dimension tables; the mapped states and districts are
+    # registered in them so every row gets ids.
+    normalize.ensure_dimensions(con)
+    subdivisions = [r[0] for r in con.execute(
+        f"SELECT name FROM {normalize.dim_table('subdivision')} ORDER BY id").fetchall()]
+    states = dict.fromkeys([s.strip().lower() for s in load_canonical_states()] + [
+        r[0] for r in con.execute(
+            f"SELECT name FROM {normalize.dim_table('state')} ORDER BY id").fetchall()])
+    con.execute("CREATE OR REPLACE TEMP TABLE region_rows "
+                "(subdivision VARCHAR, state VARCHAR, district VARCHAR)")
+    rows = region_rows(subdivisions, states)
+    if rows:
+        con.executemany("INSERT INTO region_rows VALUES (?, ?, ?)", rows)
+    normalize.register(con, "state", "SELECT DISTINCT state, NULL FROM region_rows")
+    normalize.register(con, "district", "SELECT DISTINCT district, NULL FROM region_rows")
+    con.execute(f"""
+        CREATE OR REPLACE TABLE {REGION_TABLE} AS
+        SELECT sub.id AS subdivision_id, st.id AS state_id, d.id AS district_id,
+               r.subdivision, r.state, r.district
+        FROM region_rows r
+        JOIN {normalize.dim_table("subdivision")} sub ON sub.name = r.subdivision
+        JOIN {normalize.dim_table("state")} st ON st.name = r.state
+        LEFT JOIN {normalize.dim_table("district")} d ON d.name = r.district
+        ORDER BY state_id, district_id NULLS FIRST, subdivision_id
+    """)
+    con.execute("DROP TABLE region_rows")
+    return len(rows)
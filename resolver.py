@@ -0,0 +1,223 @@
+import csv
+import os
+import re
+from collections import Counter
+
+import catalog
+
+STATES_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "states_canonical.csv")
+
+# Common abbreviations and spellings people type for states/subdivisions.
+ALIASES = {
+    "ap": "andhra pradesh",
+    "tn": "tamil nadu",
+    "ka": "karnataka",
+    "kl": "kerala",
+    "mh": "maharashtra",
+    "up": "uttar pradesh",
+    "mp": "madhya pradesh",
+    "gj": "gujarat",
+    "pb": "punjab",
+    "hr": "haryana",
+    "wb": "west bengal",
+    "jk": "jammu & kashmir",
+    "j&k": "jammu & kashmir",
+    "hp": "himachal pradesh",
+    "uk": "uttarakhand",
+    "cg": "chhattisgarh",
+    "jh": "jharkhand",
+    "tg": "telangana",
+    "ts": "telangana",
+    "odisha": "orissa",
+    "marathwada": "matathwada",
+    "bengaluru": "bangalore",
+}
+
+# (table, column, kind) sources, whichever of them exist in the database
+SOURCES = [
+    ("rainfall_data", "subdivision", "subdivision"),
+    ("rainfall", "subdivision", "subdivision"),
+    ("crop_production", "state", "state"),
+    ("crop_production", "district", "district"),
+    ("crop_production", "commodity", "commodity"),
+    ("crop_market_prices", "state", "state"),
+    ("crop_market_prices", "district", "district"),
+    ("crop_market_prices", "crop", "commodity"),
+    ("crop_market_prices", "commodity", "commodity"),
+    ("crop_prod", "state_name", "state"),
+    ("crop_prod", "district_name", "district"),
+    ("crop_prod", "crop", "commodity"),
+]
+
+
+def normalize_key(text: str):
+    return re.sub(r"\s+", " ", str(text).strip().lower())
+
+
+def squash(text: str):
+    return re.sub(r"[^a-z0-9]", "", text.lower())
+
+
+def levenshtein(a: str, b: str, limit: int):
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        best = i
+        for j, cb in enumerate(b, 1):
+            d = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            cur.append(d)
+            best = min(best, d)
+        if best > limit:
+            return limit + 1
+        prev = cur
+    return prev[-1]
+
+
+def max_typos(text: str):
+    return 0 if len(text) <= 3 else 1 if len(text) <= 6 else 2
+
+
+# ---------------------- N-GRAM INDEX ----------------------
+# Fuzzy lookups go through a trigram index: a word within `limit` edits of
+# the query shares at least len(grams) - limit * NGRAM of its trigrams (one
+# edit touches at most NGRAM of them), so only words passing that count are
+# checked with levenshtein(). Building it is one pass over each word's
+# trigrams instead of a distance computation per tree level.
+NGRAM = 3
+
+
+def ngrams(text: str):
+    padded = "\0" * (NGRAM - 1) + text + "\0" * (NGRAM - 1)
+    return {padded[i:i + NGRAM] for i in range(len(padded) - NGRAM + 1)}
+
+
+class NGramIndex:
+    def __init__(self):
+        self.words = []
+        self.seen = set()
+        self.postings = {}  # trigram -> indexes into self.words
+
+    def add(self, word: str):
+        if word in self.seen:
+            return
+        self.seen.add(word)
+        self.words.append(word)
+        for gram in ngrams(word):
+            self.postings.setdefault(gram, []).append(len(self.words) - 1)
+
+    def search(self, word: str, limit: int):
+        grams = ngrams(word)
+        need = len(grams) - limit * NGRAM
+        if need > 0:
+            counts = Counter()
+            for gram in grams:
+                counts.update(self.postings.get(gram, ()))
+            candidates = [i for i, n in counts.items() if n >= need]
+        else:
+            candidates = range(len(self.words))
+        found = []
+        for i in candidates:
+            d = levenshtein(word, self.words[i], limit)
+            if d <= limit:
+                found.append((d, self.words[i]))
+        return sorted(found)
+
+
+# ---------------------- RESOLVER ----------------------
+class EntityResolver:
+    def __init__(self, names_by_kind, generation=0):
+        self.generation = generation
+        self.kinds = {}     # canonical key -> set of kinds
+        self.exact = {}     # alias / squashed spelling -> canonical key
+        self.index = NGramIndex()
+        for kind, names in names_by_kind.items():
+            for name in names:
+                key = normalize_key(name)
+                if not key or key == "nan":
+                    continue
+                self.kinds.setdefault(key, set()).add(kind)
+                self.exact.setdefault(key, key)
+                self.exact.setdefault(squash(key), key)
+                self.index.add(key)
+        for alias, key in ALIASES.items():
+            if key in self.kinds:
+                self.exact.setdefault(alias, key)
+        self.subdivisions = sorted(
+            k for k, kinds in self.kinds.items() if "subdivision" in kinds)
+        self._subdivision_cache = {}
+        self._resolve_cache = {}
+
+    def resolve(self, text: str, kinds=None):
+        # Returns the canonical key for `text`, or None when nothing is close.
+        wanted = frozenset(kinds) if kinds else None
+        cache_key = (text, wanted)
+        if cache_key in self._resolve_cache:
+            return self._resolve_cache[cache_key]
+        key = self._lookup(normalize_key(text), wanted)
+        if len(self._resolve_cache) < 10000:
+            self._resolve_cache[cache_key] = key
+        return key
+
+    def _lookup(self, text: str, wanted):
+        def ok(key):
+            return wanted is None or bool(self.kinds.get(key, set()) & wanted)
+
+        for candidate in (text, squash(text)):
+            key = self.exact.get(candidate)
+            if key and ok(key):
+                return key
+        limit = max_typos(text)
+        if limit:
+            for _, key in self.index.search(text, limit):
+                if ok(key):
+                    return key
+        return None
+
+    def canonical(self, text: str, kinds=None):
+        # Like resolve(), but falls back to the cleaned-up input text.
+        return self.resolve(text, kinds) or normalize_key(text)
+
+    def subdivisions_for(self, state: str):
+        state = normalize_key(state)
+        if state not in self._subdivision_cache:
+            from regions import covers  # regions imports this module
+
+            key = self.resolve(state) or state
+            matches = [s for s in self.subdivisions if covers(s, key)]
+            self._subdivision_cache[state] = matches if matches else [state]
+        return self._subdivision_cache[state]
+
+
+def load_canonical_states(path: str = STATES_CSV):
+    if not os.path.exists(path):
+        return []
+    with open(path, newline="", encoding="utf-8") as f:
+        return [row["state_norm"] for row in csv.DictReader(f)]
+
+
+def build_resolver(con):
+    names = {"state": load_canonical_states()}
+    for table, column, kind in SOURCES:
+        if catalog.has_table(con, table) and column in catalog.table_columns(con, table):
+            rows = con.execute(
+                f"SELECT DISTINCT lower(trim({column})) FROM {table} WHERE {column} IS NOT NULL"
+            ).fetchall()
+            names.setdefault(kind, []).extend(r[0] for r in rows)
+    return EntityResolver(names, generation=catalog.current_generation(con))
+
+
+_resolvers = {}  # database path -> EntityResolver
+
+
+def get_resolver(con):
+    # Built once per database and reused until an ingest bumps the
+    # data generation.
+    path = catalog.database_path(con)
+    resolver = _resolvers.get(path)
+    if resolver is None or resolver.generation != catalog.cached_generation(con):
+        resolver = build_resolver(con)
+        _resolvers[path] = resolver
+    return resolver
@@ -0,0 +1,214 @@
+import catalog
+import normalize
+import regions
+from normalize import key_expr
+
+# ---------------------- INGEST-TIME ROLLUPS ----------------------
+# Aggregates the Q&A intents used to recompute on every question, built once
+# per ingest and keyed on normalised (lower/trimmed) names:
+#
+#   rainfall_yearly           subdivision x year, annual + seasonal totals
+#   price_state_commodity     state x commodity price stats
+#   price_district_commodity  state x district x commodity price stats
+#   price_market_commodity    state x district x market x commodity price stats
+#   price_state_commodity_year  state x commodity x arrival year price stats
+#   price_state_commodity_month state x commodity x month price buckets
+#   price_state_commodity_week  state x commodity x week (from Monday) buckets
+#
+# Price rollups keep n and modal_sum next to the averages so they can be
+# re-averaged over any coarser grouping (and merged with new rows) exactly;
+# incremental loads fold new rows into the month/week buckets the same way.
+# When the source is dictionary-encoded (normalize.py), each key also gets
+# its <key>_id column and the rollup is sorted by the ids. build_rollups
+# also rebuilds the subdivision -> state -> district map (regions.py) that
+# joins the rainfall rollup to the price rollups.
+
+RAINFALL_ROLLUP = "rainfall_yearly"
+PRICE_ROLLUPS = {
+    "price_state_commodity": ["state", "commodity"],
+    "price_district_commodity": ["state", "district", "commodity"],
+    "price_market_commodity": ["state", "district", "market", "commodity"],
+    "price_state_commodity_year": ["state", "commodity", "year"],
+    "price_state_commodity_month": ["state", "commodity", "month"],
+    "price_state_commodity_week": ["state", "commodity", "week"],
+}
+# rollup keys derived from arrival_date rather than read off a column
+TIME_KEYS = {"year", "month", "week"}
+
+MONTHS = ["jan", "feb", "mar", "apr", "may", "jun",
+          "jul", "aug", "sep", "oct", "nov", "dec"]
+SEASONS = {
+    "jf": ["jan", "feb"],
+    "mam": ["mar", "apr", "may"],
+    "jjas": ["jun", "jul", "aug", "sep"],
+    "ond": ["oct", "nov", "dec"],
+}
+
+
+def rainfall_source(con):
+    return catalog.first_table(con, "rainfall_data", "rainfall")
+
+
+def price_source(con):
+    # (table, commodity column) for whichever raw price table exists;
+    # load_crop_data.py names the commodity column "crop"
+    for table in ["crop_production", "crop_market_prices"]:
+        if not catalog.has_table(con, table):
+            continue
+        columns = catalog.table_columns(con, table)
+        if "modal_price" in columns:
+            return table, "commodity" if "commodity" in columns else "crop"
+    return None, None
+
+
+def month_total(months):
+    return " + ".join(months)
+
+
+def season_aggregates(columns):
+    # AVG per season: the raw season column where the table has one, its
+    # months' total where that is missing
+    seasons = []
+    for season, months in SEASONS.items():
+        raw = f"{season}, " if season in columns else ""
+        seasons.append(
+            f"AVG(COALESCE({raw}{month_total(months)})) AS {season}")
+    return seasons
+
+
+def build_rainfall_rollup(con):
+    source = rainfall_source(con)
+    if source is None:
+        return 0
+    seasons = season_aggregates(catalog.table_columns(con, source))
+    ids = id_columns(con, source, ["subdivision"])
+    keys = len(ids) + 2
+    positions = ", ".join(str(i + 1) for i in range(keys))
+    con.execute(f"""
+        CREATE OR REPLACE TABLE {RAINFALL_ROLLUP} AS
+        SELECT
+            {"".join(f"{c}, " for c in ids)}{key_expr("subdivision")} AS subdivision,
+            year,
+            AVG(annual) AS annual,
+            AVG(COALESCE(annual, {month_total(MONTHS)})) AS annual_filled,
+            {", ".join(seasons)},
+            COUNT(*) AS n
+        FROM {source}
+        GROUP BY {positions}
+        ORDER BY {positions}
+    """)
+    return con.execute(f"SELECT COUNT(*) FROM {RAINFALL_ROLLUP}").fetchone()[0]
+
+
+def price_stats_sql():
+    return """
+            COUNT(modal_price) AS n,
+            SUM(modal_price) AS modal_sum,
+            AVG(modal_price) AS modal_avg,
+            MIN(modal_price) AS modal_min,
+            MAX(modal_price) AS modal_max,
+            MIN(min_price) AS min_price,
+            MAX(max_price) AS max_price
+    """
+
+
+def id_columns(con, source: str, keys):
+    # The <key>_id columns `source` carries for `keys` (none unless encoded)
+    columns = catalog.table_columns(con, source)
+    return [normalize.id_column(k) for k in keys if normalize.id_column(k) in columns]
+
+
+def arrival_day(con, source: str):
+    # arrival_date as a DATE, whether `source` holds it typed or as text
+    return normalize.date_expr("arrival_date", catalog.column_types(con, source).get("arrival_date"))
+
+
+def rollup_key(key: str, commodity: str, day: str):
+    if key == "year":
+        return f"year({day})"
+    if key in TIME_KEYS:
+        return f"date_trunc('{key}', {day})::DATE"
+    return key_expr(commodity if key == "commodity" else key)
+
+
+def price_rollup_sql(keys, source: str, commodity: str, ids=(), day="arrival_date"):
+    select_keys = ",\n            ".join(
+        [*ids, *(f"{rollup_key(k, commodity, day)} AS {k}" for k in keys)])
+    positions = ", ".join(str(i + 1) for i in range(len(ids) + len(keys)))
+    return f"""
+            SELECT
+            {select_keys},
+            {price_stats_sql()}
+            FROM {source}
+            GROUP BY {positions}
+            ORDER BY {positions}
+    """
+
+
+def build_price_rollups(con):
+    source, commodity = price_source(con)
+    if source is None:
+        return {}
+    counts = {}
+    for table, keys in PRICE_ROLLUPS.items():
+        ids = id_columns(con, source, keys)
+        sql = price_rollup_sql(keys, source, commodity, ids, arrival_day(con, source))
+        con.execute(f"CREATE OR REPLACE TABLE {table} AS {sql}")
+        counts[table] = con.execute(
+            f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    return counts
+
+
+def merge_price_rollups(con, delta: str, commodity: str):
+    # Folds the rows in `delta` (shaped like the raw price table) into the
+    # existing price rollups, touching only the groups those rows belong to.
+    for table, keys in PRICE_ROLLUPS.items():
+        if not has_rollup(con, table):
+            continue
+        # the delta carries ids exactly when the rollup does (incremental.py
+        # encodes new rows like the table they are appended to)
+        ids = id_columns(con, table, keys)
+        sql = price_rollup_sql(keys, delta, commodity, ids, arrival_day(con, delta))
+        con.execute(f"CREATE OR REPLACE TEMP TABLE rollup_delta AS {sql}")
+        match = " AND ".join(
+            f"{table}.{k} IS NOT DISTINCT FROM d.{k}" for k in keys)
+        con.execute(f"""
+            UPDATE {table} SET
+                n = {table}.n + d.n,
+                modal_sum = COALESCE({table}.modal_sum, 0) + COALESCE(d.modal_sum, 0),
+                modal_avg = (COALESCE({table}.modal_sum, 0) + COALESCE(d.modal_sum, 0))
+                            / NULLIF({table}.n + d.n, 0),
+                modal_min = least({table}.modal_min, d.modal_min),
+                modal_max = greatest({table}.modal_max, d.modal_max),
+                min_price = least({table}.min_price, d.min_price),
+                max_price = greatest({table}.max_price, d.max_price)
+            FROM rollup_delta d
+            WHERE {match}
+        """)
+        con.execute(f"""
+            INSERT INTO {table}
+            SELECT d.* FROM rollup_delta d
+            WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {match})
+        """)
+    con.execute("DROP TABLE IF EXISTS rollup_delta")
+
+
+def build_rollups(con):
+    counts = build_price_rollups(con)
+    counts[RAINFALL_ROLLUP] = build_rainfall_rollup(con)
+    counts[regions.REGION_TABLE] = regions.build_region_map(con)
+    for table, rows in counts.items():
+        print(f"🧮 Rollup '{table}' built with {rows} rows.")
+    return counts
+
+
+def has_rollup(con, table: str):
+    return catalog.has_table(con, table)
+
+
+def rainfall_relation(con, raw_table: str = "rainfall"):
+    # (table, subdivision expr, per-row annual expr) for rainfall queries:
+    # the yearly rollup when it exists, the raw table otherwise.
+    if has_rollup(con, RAINFALL_ROLLUP):
+        return RAINFALL_ROLLUP, "subdivision", "annual_filled"
+    return raw_table, "lower(subdivision)", f"COALESCE(annual, {month_total(MONTHS)})"
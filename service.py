@@ -0,0 +1,262 @@
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlparse
+
+import ai_helper
+import metrics
+import nlp_engine
+from db import POOL_SIZE
+
+# ---------------------- ASYNC QUERY SERVICE ----------------------
+# Small asyncio HTTP/1.1 front end (stdlib only) over the Q&A engines:
+#
+#   GET/POST /answer   ai_helper answer + the rows behind it
+#   GET/POST /plan     nlp_engine.plan_query
+#   GET/POST /query    nlp_engine plan + run_plan_and_fetch
+#   GET      /healthz  connection pool check
+#   GET      /metrics  metrics.py exposition
+#
+# The question comes as ?q=... or a JSON body {"question": ...}. Responses
+# are JSON, or an Arrow IPC stream with ?format=arrow or
+# `Accept: application/vnd.apache.arrow.stream` (answer metadata in the
+# schema metadata).
+#
+# DuckDB work runs on a bounded thread pool. Identical questions in flight at
+# the same time are coalesced single-flight style: the burst shares one
+# computation. Past SAMARTH_SERVICE_QUEUE distinct computations in flight the
+# service answers 503 instead of queueing more, and a request waiting longer
+# than SAMARTH_SERVICE_TIMEOUT gets 504 (the computation itself still
+# finishes and is shared with anyone else waiting on it).
+#
+#   python service.py --port 8765
+
+WORKERS = int(os.getenv("SAMARTH_SERVICE_WORKERS", str(POOL_SIZE)))
+QUEUE_LIMIT = int(os.getenv("SAMARTH_SERVICE_QUEUE", "64"))
+TIMEOUT = float(os.getenv("SAMARTH_SERVICE_TIMEOUT", "10"))
+READ_TIMEOUT = 30.0
+MAX_BODY = 64 * 1024
+ARROW = "application/vnd.apache.arrow.stream"
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error",
+           503: "Service Unavailable", 504: "Gateway Timeout"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+# ---------------------- ENGINE CALLS (worker threads) ----------------------
+def answer(question: str):
+    result = ai_helper.get_answer_data(question)
+    return {"question": question, "intent": result["intent"],
+            "entities": result["entities"], "answer": result["answer"],
+            "frames": result["frames"]}
+
+
+def plan(question: str):
+    return {"question": question, "plan": nlp_engine.plan_query(question), "frames": []}
+
+
+def query(question: str):
+    planner = nlp_engine.plan_query(question)
+    fetched = nlp_engine.run_plan_and_fetch(planner)
+    if "error" in fetched:
+        raise HTTPError(500, fetched["error"])
+    formatted = nlp_engine.format_answer(fetched)
+    return {"question": question, "plan": planner, "answer": formatted["text"],
+            "frames": [fetched["dataframe"]]}
+
+
+ROUTES = {"/answer": answer, "/plan": plan, "/query": query}
+
+
+# ---------------------- SERIALISATION ----------------------
+def frame_records(df):
+    return json.loads(df.to_json(orient="records", date_format="iso"))
+
+
+def to_json(result):
+    body = {k: v for k, v in result.items() if k != "frames"}
+    body["data"] = [frame_records(df) for df in result["frames"]]
+    return json.dumps(body, default=str).encode()
+
+
+def to_arrow(result):
+    import pandas as pd
+    import pyarrow as pa
+
+    frames = result["frames"]
+    if frames:
+        # compare answers return one frame per state; `part` tells them apart
+        df = pd.concat([f.assign(part=i) for i, f in enumerate(frames)], ignore_index=True)
+    else:
+        df = pd.DataFrame()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    meta = {k: json.dumps(v, default=str) for k, v in result.items() if k != "frames"}
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), **meta})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+# ---------------------- SERVICE ----------------------
+def content_length(method: str, headers: dict):
+    # Only a plain decimal Content-Length up to MAX_BODY; a POST must
+    # send one (no chunked bodies)
+    value = headers.get("content-length")
+    if value is None:
+        if method == "POST" or "transfer-encoding" in headers:
+            raise HTTPError(400, "missing Content-Length")
+        return 0
+    if not (value.isascii() and value.isdigit()):
+        raise HTTPError(400, "invalid Content-Length")
+    length = int(value)
+    if length > MAX_BODY:
+        raise HTTPError(413, "request body too large")
+    return length
+
+
+class QueryService:
+    def __init__(self, workers: int = WORKERS, queue_limit: int = QUEUE_LIMIT,
+                 timeout: float = TIMEOUT):
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="samarth-query")
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self.inflight = {}  # (route, normalised question) -> Future
+        self.stats = {"requests": 0, "computations": 0, "coalesced": 0,
+                      "rejected": 0, "timeouts": 0}
+
+    async def run(self, route: str, question: str):
+        key = (route, " ".join(question.lower().split()))
+        future = self.inflight.get(key)
+        if future is None:
+            if len(self.inflight) >= self.queue_limit:
+                self.stats["rejected"] += 1
+                raise HTTPError(503, "too many questions in flight, retry shortly")
+            future = asyncio.get_running_loop().run_in_executor(
+                self.executor, ROUTES[route], question)
+            self.inflight[key] = future
+            future.add_done_callback(lambda _: self.inflight.pop(key, None))
+            self.stats["computations"] += 1
+        else:
+            self.stats["coalesced"] += 1
+        try:
+            # shield: one caller timing out must not cancel the shared work
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise HTTPError(504, f"no answer within {self.timeout:.0f}s")
+
+    async def dispatch(self, method: str, target: str, headers: dict, body: bytes):
+        self.stats["requests"] += 1
+        url = urlparse(target)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if url.path == "/healthz":
+            ok = await asyncio.get_running_loop().run_in_executor(
+                self.executor, ai_helper.pool.healthy)
+            return (200 if ok else 503), "application/json", json.dumps(
+                {"ok": ok, **self.stats, "inflight": len(self.inflight)}).encode()
+        if url.path == "/metrics":
+            return 200, "text/plain; version=0.0.4", metrics.render().encode()
+        if url.path not in ROUTES:
+            raise HTTPError(404, f"unknown path {url.path}")
+        if method not in ("GET", "POST"):
+            raise HTTPError(405, f"{method} not allowed")
+
+        question = params.get("q")
+        if method == "POST" and body:
+            try:
+                question = json.loads(body).get("question", question)
+            except (ValueError, AttributeError):
+                raise HTTPError(400, "body must be a JSON object")
+        if not question or not str(question).strip():
+            raise HTTPError(400, "missing question (?q=... or {\"question\": ...})")
+
+        result = await self.run(url.path, str(question))
+        if params.get("format") == "arrow" or ARROW in headers.get("accept", ""):
+            return 200, ARROW, to_arrow(result)
+        return 200, "application/json", to_json(result)
+
+    # ---------- HTTP/1.1 plumbing ----------
+    async def read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, _ = line.decode("latin-1").split()
+        except ValueError:
+            raise HTTPError(400, "malformed request line")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = content_length(method.upper(), headers)
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, headers, body
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await asyncio.wait_for(self.read_request(reader), READ_TIMEOUT)
+                    if request is None:
+                        break
+                    method, target, headers, body = request
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                    status, content_type, payload = await self.dispatch(
+                        method, target, headers, body)
+                except HTTPError as e:
+                    status, content_type = e.status, "application/json"
+                    payload = json.dumps({"error": str(e)}).encode()
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except Exception as e:
+                    status, content_type = 500, "application/json"
+                    payload = json.dumps({"error": str(e)}).encode()
+                head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                        f"Content-Type: {content_type}\r\n"
+                        f"Content-Length: {len(payload)}\r\n"
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n")
+                if status == 503:
+                    head += "Retry-After: 1\r\n"
+                writer.write(head.encode() + b"\r\n" + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int, warm: bool = True):
+        if warm:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.executor, ai_helper.warmup)
+            await loop.run_in_executor(self.executor, nlp_engine.warmup)
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"🚀 Project Samarth query service on http://{host}:{port} "
+              f"({self.executor._max_workers} workers, queue {self.queue_limit})")
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Project Samarth query service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--no-warmup", action="store_true",
+                        help="load engines on the first request instead of at startup")
+    args = parser.parse_args()
+    try:
+        asyncio.run(QueryService().serve(args.host, args.port, not args.no_warmup))
+    except KeyboardInterrupt:
+        print("👋 Query service stopped.")
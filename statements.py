@@ -0,0 +1,674 @@
+import re
+import weakref
+
+import catalog
+import metrics
+import normalize
+import regions
+import rollups
+from normalize import id_of, ids_like
+
+# ---------------------- STATEMENT REGISTRY ----------------------
+# Every intent's SQL lives here once, written against named parameters.
+# The first time a connection needs a statement, its body (the rollup
+# variant when that rollup is built and encoded) is resolved and each
+# parameter rewritten to a DuckDB named parameter ($p_state); after that an
+# intent is a plain con.execute(sql, {"p_state": ...}) with the values
+# bound, never spliced into the SQL. Only that text is cached: DuckDB still
+# parses and plans it on every execute (its Python API has no reusable
+# prepared statement, and SQL EXECUTE can't take bound values). Parameters
+# are prefixed with p_ so they can't shadow column names.
+
+
+def lttb(points: str):
+    # Largest-Triangle-Three-Buckets downsampling of every series in
+    # `points` (series, x, y) to at most p_points points, done in DuckDB:
+    # first and last points are kept, the rest are split into buckets and
+    # each bucket keeps the point forming the largest triangle with the
+    # previously kept point and the next bucket's centroid.
+    return f"""
+        WITH RECURSIVE points AS ({points}),
+        numbered AS (
+            SELECT *, row_number() OVER (PARTITION BY series ORDER BY x) - 1 AS i,
+                   count(*) OVER (PARTITION BY series) AS n
+            FROM points
+        ),
+        bucketed AS (
+            SELECT series, x, y, least(n, p_points) - 1 AS last_b,
+                   CASE WHEN n <= p_points THEN i
+                        WHEN i = 0 THEN 0
+                        WHEN i = n - 1 THEN p_points - 1
+                        ELSE 1 + floor((i - 1) * (p_points - 2) / (n - 2))::BIGINT
+                   END AS b
+            FROM numbered
+        ),
+        centroids AS (
+            SELECT series, b, AVG(x) AS cx, AVG(y) AS cy FROM bucketed GROUP BY series, b
+        ),
+        picked(series, b, x, y) AS (
+            SELECT series, b, x, y FROM bucketed WHERE b = 0
+            UNION ALL
+            SELECT p.series, p.b + 1,
+                   arg_max(c.x, abs((p.x - a.cx) * (c.y - p.y) - (p.x - c.x) * (a.cy - p.y))),
+                   arg_max(c.y, abs((p.x - a.cx) * (c.y - p.y) - (p.x - c.x) * (a.cy - p.y)))
+            FROM picked p
+            JOIN bucketed c ON c.series = p.series AND c.b = p.b + 1
+            JOIN centroids a ON a.series = p.series AND a.b = p.b + 2
+            GROUP BY p.series, p.b, p.x, p.y
+        )
+        SELECT series AS subdivision, x AS year, y AS annual FROM picked
+        UNION ALL
+        SELECT series, x, y FROM bucketed WHERE b = last_b AND b > 0
+        ORDER BY subdivision, year
+    """
+
+
+ROLLING_YEARS = 5  # window of the rolling mean in rainfall_window
+
+
+def rainfall_window(table: str, subdivision: str, year: str, annual: str,
+                    rows: str = "TRUE"):
+    # Multi-state rainfall comparison in one scan and one window pass.
+    # Each row counts for every one of p_states its subdivision covers
+    # (regions.covers: the name contains the state, or SUBDIVISION_STATES
+    # lists it, so Maharashtra gets Konkan & Goa, Vidarbha and Matathwada
+    # whichever other states are asked about); p_subdivisions, when not
+    # empty, restricts the scan to exactly those subdivisions instead (and
+    # ones covering none of p_states keep their own name).
+    # p_from / p_to bound the years, p_last keeps the most recent N years
+    # that have rows; NULL leaves either open. Per state and year: the mean
+    # annual rainfall, its ROLLING_YEARS-year rolling mean, and the state's
+    # average over the whole selected period. `rows` may narrow the scan to
+    # the candidate subdivisions up front.
+    return f"""
+        WITH tagged AS (
+            SELECT {subdivision} AS sub, {year} AS year, {annual} AS rainfall,
+                   unnest(COALESCE(NULLIF(
+                       list_filter(CAST(p_states AS VARCHAR[]),
+                                   s -> {regions.covers_sql(subdivision, "lower(s)")}),
+                       []), [NULL])) AS label
+            FROM {table}
+            WHERE {rows}
+            AND (p_from IS NULL OR {year} >= p_from)
+            AND (p_to IS NULL OR {year} <= p_to)
+        ),
+        yearly AS (
+            SELECT COALESCE(label, sub) AS state, year, AVG(rainfall) AS rainfall
+            FROM tagged
+            WHERE CASE WHEN len(p_subdivisions) = 0 THEN label IS NOT NULL
+                       ELSE list_contains(CAST(p_subdivisions AS VARCHAR[]), sub) END
+            GROUP BY 1, 2
+        ),
+        recent AS (
+            SELECT *, dense_rank() OVER (ORDER BY year DESC) AS recency FROM yearly
+        )
+        SELECT state, year, rainfall,
+               AVG(rainfall) OVER (PARTITION BY state ORDER BY year
+                                   RANGE BETWEEN {ROLLING_YEARS - 1} PRECEDING AND CURRENT ROW)
+                   AS rolling_avg,
+               AVG(rainfall) OVER (PARTITION BY state) AS avg_annual_rainfall
+        FROM recent
+        WHERE p_last IS NULL OR recency <= p_last
+        ORDER BY list_position(CAST(p_states AS VARCHAR[]), state) NULLS LAST, state, year
+    """
+
+
+def rainfall_vs_price(rain: str, price: str):
+    # `rain` yields (year, rainfall) and `price` (year, modal_price) for
+    # the asked-about state. Each price year is paired with that year's
+    # and the previous year's rainfall; the Pearson correlations, the
+    # price change per mm and the number of paired years come back on
+    # every row next to the series, so one query answers the question.
+    return f"""
+        WITH rain AS ({rain}),
+        price AS ({price}),
+        paired AS (
+            SELECT p.year, p.modal_price, r.rainfall, prev.rainfall AS prev_rainfall
+            FROM price p
+            LEFT JOIN rain r ON r.year = p.year
+            LEFT JOIN rain prev ON prev.year = p.year - 1
+        )
+        SELECT year, modal_price, rainfall, prev_rainfall,
+               count(rainfall) OVER () AS n_years,
+               corr(modal_price, rainfall) OVER () AS corr_same_year,
+               regr_slope(modal_price, rainfall) OVER () AS price_per_mm,
+               count(prev_rainfall) OVER () AS n_lagged,
+               corr(modal_price, prev_rainfall) OVER () AS corr_prev_year
+        FROM paired
+        ORDER BY year
+    """
+
+
+def price_trend(unit: str, buckets: str):
+    # `buckets` yields one row per `unit` ("week" / "month") of the asked-about
+    # crop and state: bucket (its first day), n, modal_sum and the min/max
+    # columns. Keeps the p_count buckets up to the latest one with prices.
+    return f"""
+        WITH buckets AS ({buckets})
+        SELECT bucket, n, modal_sum / NULLIF(n, 0) AS modal_avg,
+               modal_min, modal_max, min_price, max_price
+        FROM buckets
+        WHERE bucket > (SELECT MAX(bucket) FROM buckets) - to_{unit}s(CAST(p_count AS INTEGER))
+        ORDER BY bucket
+    """
+
+
+def raw_price_buckets(unit: str):
+    return f"""
+        SELECT date_trunc('{unit}', {normalize.date_expr("arrival_date")})::DATE AS bucket,
+               COUNT(modal_price) AS n, SUM(modal_price) AS modal_sum,
+               MIN(modal_price) AS modal_min, MAX(modal_price) AS modal_max,
+               MIN(min_price) AS min_price, MAX(max_price) AS max_price
+        FROM crop_production
+        WHERE LOWER(state) LIKE '%' || p_state || '%'
+        AND LOWER(commodity) LIKE '%' || p_crop || '%'
+        GROUP BY 1
+        HAVING bucket IS NOT NULL
+    """
+
+
+def rollup_price_buckets(unit: str):
+    return f"""
+        SELECT {unit} AS bucket, SUM(n) AS n, SUM(modal_sum) AS modal_sum,
+               MIN(modal_min) AS modal_min, MAX(modal_max) AS modal_max,
+               MIN(min_price) AS min_price, MAX(max_price) AS max_price
+        FROM price_state_commodity_{unit}
+        WHERE state_id IN {ids_like("state", "p_state")}
+        AND commodity_id IN {ids_like("commodity", "p_crop")}
+        AND {unit} IS NOT NULL
+        GROUP BY 1
+    """
+
+
+def season_value(values: dict, annual: str):
+    # p_season ("jf", "mam", "jjas", "ond"; anything else is annual) -> value
+    cases = " ".join(f"WHEN '{season}' THEN {value}" for season, value in values.items())
+    return f"CASE p_season {cases} ELSE {annual} END"
+
+
+# p_states is a (possibly empty) list of canonical names; empty means all
+def any_state(column: str):
+    return (f"(len(p_states) = 0 OR EXISTS (SELECT 1 FROM unnest(CAST(p_states AS VARCHAR[])) s(name) "
+            f"WHERE {column} LIKE '%' || s.name || '%'))")
+
+
+# The same on a rollup's dictionary ids (see ROLLUP_STATEMENTS)
+def any_id(dimension: str):
+    return (f"(len(p_states) = 0 OR {normalize.id_column(dimension)} IN ("
+            f"SELECT d.id FROM {normalize.dim_table(dimension)} d, "
+            f"unnest(CAST(p_states AS VARCHAR[])) s(name) WHERE d.name LIKE '%' || s.name || '%'))")
+
+
+STATEMENTS = {
+    "rainfall_by_state_year": (
+        ["p_state", "p_year"],
+        """
+        SELECT ANNUAL FROM rainfall_data
+        WHERE LOWER(SUBDIVISION) LIKE '%' || p_state || '%'
+        AND YEAR = p_year
+        """,
+    ),
+    "top_crops": (
+        ["p_state", "p_limit"],
+        """
+        SELECT state, district, market, commodity AS crop,
+               AVG(modal_price) AS avg_price
+        FROM crop_production
+        WHERE LOWER(state) LIKE '%' || p_state || '%'
+        GROUP BY state, district, market, commodity
+        ORDER BY avg_price DESC
+        LIMIT p_limit
+        """,
+    ),
+    "highest_production": (
+        ["p_state"],
+        """
+        SELECT district, commodity AS crop, AVG(modal_price) AS avg_price
+        FROM crop_production
+        WHERE LOWER(state) LIKE '%' || p_state || '%'
+        GROUP BY district, commodity
+        ORDER BY avg_price DESC
+        LIMIT 1
+        """,
+    ),
+    "average_price": (
+        ["p_state", "p_crop"],
+        """
+        SELECT AVG(modal_price) AS avg_price
+        FROM crop_production
+        WHERE LOWER(state) LIKE '%' || p_state || '%'
+        AND LOWER(commodity) LIKE '%' || p_crop || '%'
+        """,
+    ),
+
+    # Batch variants (ai_helper.get_answers): one row per requested item,
+    # passed in as parallel lists and tagged with the caller's req_id.
+    "batch_rainfall": (
+        ["p_ids", "p_states", "p_years"],
+        """
+        WITH req AS (
+            SELECT unnest(p_ids) AS req_id, unnest(p_states) AS state,
+                   unnest(p_years) AS year
+        )
+        SELECT req.req_id, r.ANNUAL
+        FROM req JOIN rainfall_data r
+          ON r.YEAR = req.year
+         AND LOWER(r.SUBDIVISION) LIKE '%' || req.state || '%'
+        """,
+    ),
+    "batch_top_crops": (
+        ["p_ids", "p_states", "p_limits"],
+        """
+        WITH req AS (
+            SELECT unnest(p_ids) AS req_id, unnest(p_states) AS state,
+                   unnest(p_limits) AS lim
+        ),
+        agg AS (
+            SELECT state, district, market, commodity AS crop,
+                   AVG(modal_price) AS avg_price
+            FROM crop_production
+            GROUP BY state, district, market, commodity
+        ),
+        ranked AS (
+            SELECT req.req_id, req.lim, agg.*,
+                   row_number() OVER (PARTITION BY req.req_id ORDER BY agg.avg_price DESC) AS rk
+            FROM req JOIN agg ON LOWER(agg.state) LIKE '%' || req.state || '%'
+        )
+        SELECT req_id, state, district, market, crop, avg_price
+        FROM ranked WHERE rk <= lim
+        ORDER BY req_id, rk
+        """,
+    ),
+    "batch_highest_production": (
+        ["p_ids", "p_states"],
+        """
+        WITH req AS (
+            SELECT unnest(p_ids) AS req_id, unnest(p_states) AS state
+        ),
+        agg AS (
+            SELECT LOWER(state) AS state, district, commodity,
+                   SUM(modal_price) AS modal_sum, COUNT(modal_price) AS n
+            FROM crop_production
+            GROUP BY ALL
+        ),
+        grouped AS (
+            SELECT req.req_id, agg.district, agg.commodity AS crop,
+                   SUM(agg.modal_sum) / SUM(agg.n) AS avg_price
+            FROM req JOIN agg ON agg.state LIKE '%' || req.state || '%'
+            GROUP BY req.req_id, agg.district, agg.commodity
+        )
+        SELECT req_id, district, crop, avg_price FROM grouped
+        QUALIFY row_number() OVER (PARTITION BY req_id ORDER BY avg_price DESC) = 1
+        """,
+    ),
+    "batch_average_price": (
+        ["p_ids", "p_states", "p_crops"],
+        """
+        WITH req AS (
+            SELECT unnest(p_ids) AS req_id, unnest(p_states) AS state,
+                   unnest(p_crops) AS crop
+        ),
+        agg AS (
+            SELECT LOWER(state) AS state, LOWER(commodity) AS commodity,
+                   SUM(modal_price) AS modal_sum, COUNT(modal_price) AS n
+            FROM crop_production
+            GROUP BY ALL
+        )
+        SELECT req.req_id, SUM(agg.modal_sum) / SUM(agg.n) AS avg_price
+        FROM req JOIN agg
+          ON agg.state LIKE '%' || req.state || '%'
+         AND agg.commodity LIKE '%' || req.crop || '%'
+        GROUP BY req.req_id
+        """,
+    ),
+    # Production totals in load_crop_data.py's crop_prod (appp.py): the
+    # top p_limit crops of a state, and its top districts (for one crop
+    # when p_crop is given); p_year NULL sums every year.
+    "crop_production_top": (
+        ["p_state", "p_year", "p_limit"],
+        """
+        SELECT crop, SUM(production_tonnes) AS total_production
+        FROM crop_prod
+        WHERE lower(state_name) = p_state
+        AND (p_year IS NULL OR year = p_year)
+        GROUP BY crop
+        ORDER BY total_production DESC
+        LIMIT p_limit
+        """,
+    ),
+    "district_production_top": (
+        ["p_state", "p_year", "p_crop"],
+        """
+        SELECT district_name, SUM(production_tonnes) AS total_production
+        FROM crop_prod
+        WHERE lower(state_name) = p_state
+        AND (p_year IS NULL OR year = p_year)
+        AND (p_crop IS NULL OR lower(crop) = p_crop)
+        GROUP BY district_name
+        ORDER BY total_production DESC
+        LIMIT 5
+        """,
+    ),
+    # Chart frames for app_local.py (see charts.py): annual rainfall per
+    # subdivision downsampled with LTTB (p_last keeps the most recent N
+    # years with rows, as in rainfall_window), and average prices per
+    # commodity (or per district, once a crop is asked about).
+    "chart_rainfall": (
+        ["p_states", "p_from", "p_to", "p_last", "p_points"],
+        lttb(f"""
+        SELECT LOWER(SUBDIVISION) AS series, YEAR AS x, ANNUAL AS y
+        FROM rainfall_data
+        WHERE ANNUAL IS NOT NULL
+        AND {any_state("LOWER(SUBDIVISION)")}
+        AND (p_from IS NULL OR YEAR >= p_from)
+        AND (p_to IS NULL OR YEAR <= p_to)
+        QUALIFY p_last IS NULL OR dense_rank() OVER (ORDER BY YEAR DESC) <= p_last
+        """),
+    ),
+    "compare_rainfall_window": (
+        ["p_states", "p_subdivisions", "p_from", "p_to", "p_last"],
+        rainfall_window("rainfall_data", rollups.key_expr("SUBDIVISION"), "YEAR",
+                        f"COALESCE(ANNUAL, {rollups.month_total(rollups.MONTHS)})"),
+    ),
+    # Yearly modal price of a crop in a state against the state's rainfall
+    # in p_season (see rainfall_vs_price)
+    "rainfall_vs_price": (
+        ["p_state", "p_crop", "p_season"],
+        rainfall_vs_price(
+            f"""
+            SELECT YEAR AS year,
+                   AVG({season_value({s: f"COALESCE({s}, {rollups.month_total(m)})"
+                                      for s, m in rollups.SEASONS.items()},
+                                     f"COALESCE(ANNUAL, {rollups.month_total(rollups.MONTHS)})")})
+                       AS rainfall
+            FROM rainfall_data
+            WHERE LOWER(SUBDIVISION) LIKE '%' || p_state || '%'
+            GROUP BY YEAR
+            """,
+            f"""
+            SELECT year({normalize.date_expr("arrival_date")}) AS year,
+                   AVG(modal_price) AS modal_price
+            FROM crop_production
+            WHERE LOWER(state) LIKE '%' || p_state || '%'
+            AND LOWER(commodity) LIKE '%' || p_crop || '%'
+            GROUP BY 1
+            HAVING year IS NOT NULL
+            """),
+    ),
+    # Weekly / monthly price buckets of a crop in a state, the last p_count
+    # of them (see price_trend)
+    "price_trend_week": (["p_state", "p_crop", "p_count"], price_trend("week", raw_price_buckets("week"))),
+    "price_trend_month": (["p_state", "p_crop", "p_count"], price_trend("month", raw_price_buckets("month"))),
+    "chart_prices": (
+        ["p_states", "p_crop", "p_limit"],
+        f"""
+        SELECT CASE WHEN p_crop IS NULL THEN commodity ELSE district END AS label,
+               AVG(modal_price) AS avg_price
+        FROM crop_production
+        WHERE {any_state("LOWER(state)")}
+        AND (p_crop IS NULL OR LOWER(commodity) LIKE '%' || p_crop || '%')
+        GROUP BY label
+        ORDER BY avg_price DESC
+        LIMIT p_limit
+        """,
+    ),
+}
+
+# When the ingest-time rollups (see rollups.py) exist, intents answer from
+# them instead of re-aggregating raw rows. Each variant keeps the raw
+# statement's parameters and output columns. Rollups are filtered on their
+# dictionary ids (normalize.py): the text is matched against the small
+# dimension table and the rollup rows are picked by integer id, so the
+# variants need rollups built from encoded tables.
+ROLLUP_STATEMENTS = {
+    "rainfall_by_state_year": (
+        "rainfall_yearly",
+        f"""
+        SELECT annual AS ANNUAL FROM rainfall_yearly
+        WHERE subdivision_id IN {ids_like("subdivision", "p_state")}
+        AND year = p_year
+        """,
+    ),
+    "top_crops": (
+        "price_market_commodity",
+        f"""
+        SELECT state, district, market, commodity AS crop,
+               modal_avg AS avg_price
+        FROM price_market_commodity
+        WHERE state_id IN {ids_like("state", "p_state")}
+        ORDER BY avg_price DESC
+        LIMIT p_limit
+        """,
+    ),
+    "highest_production": (
+        "price_district_commodity",
+        f"""
+        SELECT district, commodity AS crop, SUM(modal_sum) / SUM(n) AS avg_price
+        FROM price_district_commodity
+        WHERE state_id IN {ids_like("state", "p_state")}
+        GROUP BY district, commodity
+        ORDER BY avg_price DESC
+        LIMIT 1
+        """,
+    ),
+    "average_price": (
+        "price_state_commodity",
+        f"""
+        SELECT SUM(modal_sum) / SUM(n) AS avg_price
+        FROM price_state_commodity
+        WHERE state_id IN {ids_like("state", "p_state")}
+        AND commodity_id IN {ids_like("commodity", "p_crop")}
+        """,
+    ),
+    "batch_rainfall": (
+        "rainfall_yearly",
+        """
+        WITH req AS (
+            SELECT unnest(p_ids) AS req_id, unnest(p_states) AS state,
+                   unnest(p_years) AS year
+        )
+        SELECT req.req_id, r.annual AS ANNUAL
+        FROM req
+        JOIN dim_subdivision ds ON ds.name LIKE '%' || req.state || '%'
+        JOIN rainfall_yearly r ON r.subdivision_id = ds.id AND r.year = req.year
+        """,
+    ),
+    "batch_top_crops": (
+        "price_market_commodity",
+        """
+        WITH req AS (
+            SELECT unnest(p_ids) AS req_id, unnest(p_states) AS state,
+                   unnest(p_limits) AS lim
+        ),
+        ranked AS (
+            SELECT req.req_id, req.lim, p.state, p.district, p.market,
+                   p.commodity AS crop, p.modal_avg AS avg_price,
+                   row_number() OVER (PARTITION BY req.req_id ORDER BY p.modal_avg DESC) AS rk
+            FROM req
+            JOIN dim_state ds ON ds.name LIKE '%' || req.state || '%'
+            JOIN price_market_commodity p ON p.state_id = ds.id
+        )
+        SELECT req_id, state, district, market, crop, avg_price
+        FROM ranked WHERE rk <= lim
+        ORDER BY req_id, rk
+        """,
+    ),
+    "batch_highest_production": (
+        "price_district_commodity",
+        """
+        WITH req AS (
+            SELECT unnest(p_ids) AS req_id, unnest(p_states) AS state
+        ),
+        grouped AS (
+            SELECT req.req_id, p.district, p.commodity AS crop,
+                   SUM(p.modal_sum) / SUM(p.n) AS avg_price
+            FROM req
+            JOIN dim_state ds ON ds.name LIKE '%' || req.state || '%'
+            JOIN price_district_commodity p ON p.state_id = ds.id
+            GROUP BY req.req_id, p.district, p.commodity
+        )
+        SELECT req_id, district, crop, avg_price FROM grouped
+        QUALIFY row_number() OVER (PARTITION BY req_id ORDER BY avg_price DESC) = 1
+        """,
+    ),
+    "batch_average_price": (
+        "price_state_commodity",
+        """
+        WITH req AS (
+            SELECT unnest(p_ids) AS req_id, unnest(p_states) AS state,
+                   unnest(p_crops) AS crop
+        )
+        SELECT req.req_id, SUM(p.modal_sum) / SUM(p.n) AS avg_price
+        FROM req
+        JOIN dim_state ds ON ds.name LIKE '%' || req.state || '%'
+        JOIN dim_commodity dc ON dc.name LIKE '%' || req.crop || '%'
+        JOIN price_state_commodity p ON p.state_id = ds.id AND p.commodity_id = dc.id
+        GROUP BY req.req_id
+        """,
+    ),
+    # crop_prod itself once encoded: filtered on its state / commodity ids
+    "crop_production_top": (
+        "crop_prod",
+        f"""
+        SELECT crop, SUM(production_tonnes) AS total_production
+        FROM crop_prod
+        WHERE state_id = {id_of("state", "p_state")}
+        AND (p_year IS NULL OR year = p_year)
+        GROUP BY crop
+        ORDER BY total_production DESC
+        LIMIT p_limit
+        """,
+    ),
+    "district_production_top": (
+        "crop_prod",
+        f"""
+        SELECT district_name, SUM(production_tonnes) AS total_production
+        FROM crop_prod
+        WHERE state_id = {id_of("state", "p_state")}
+        AND (p_year IS NULL OR year = p_year)
+        AND (p_crop IS NULL OR commodity_id = {id_of("commodity", "p_crop")})
+        GROUP BY district_name
+        ORDER BY total_production DESC
+        LIMIT 5
+        """,
+    ),
+    "chart_rainfall": (
+        "rainfall_yearly",
+        lttb(f"""
+        SELECT subdivision AS series, year AS x, annual AS y
+        FROM rainfall_yearly
+        WHERE annual IS NOT NULL
+        AND {any_id("subdivision")}
+        AND (p_from IS NULL OR year >= p_from)
+        AND (p_to IS NULL OR year <= p_to)
+        QUALIFY p_last IS NULL OR dense_rank() OVER (ORDER BY year DESC) <= p_last
+        """),
+    ),
+    "compare_rainfall_window": (
+        "rainfall_yearly",
+        rainfall_window("rainfall_yearly", "subdivision", "year", "annual_filled",
+                        f"""subdivision_id IN (
+                            SELECT id FROM dim_subdivision
+                            WHERE len(list_filter(CAST(p_states AS VARCHAR[]),
+                                                  s -> {regions.covers_sql("name", "lower(s)")})) > 0
+                            OR list_contains(CAST(p_subdivisions AS VARCHAR[]), name))"""),
+    ),
+    # Rainfall reaches the state through region_map (regions.py): every
+    # subdivision covering it, averaged per year
+    "rainfall_vs_price": (
+        "price_state_commodity_year",
+        rainfall_vs_price(
+            f"""
+            SELECT r.year,
+                   AVG({season_value({s: f"r.{s}" for s in rollups.SEASONS}, "r.annual_filled")})
+                       AS rainfall
+            FROM rainfall_yearly r
+            WHERE r.subdivision_id IN (
+                SELECT subdivision_id FROM region_map
+                WHERE district_id IS NULL AND state_id IN {ids_like("state", "p_state")})
+            GROUP BY r.year
+            """,
+            f"""
+            SELECT year, SUM(modal_sum) / SUM(n) AS modal_price
+            FROM price_state_commodity_year
+            WHERE state_id IN {ids_like("state", "p_state")}
+            AND commodity_id IN {ids_like("commodity", "p_crop")}
+            AND year IS NOT NULL
+            GROUP BY year
+            """),
+    ),
+    "price_trend_week": ("price_state_commodity_week", price_trend("week", rollup_price_buckets("week"))),
+    "price_trend_month": ("price_state_commodity_month", price_trend("month", rollup_price_buckets("month"))),
+    "chart_prices": (
+        "price_district_commodity",
+        f"""
+        SELECT CASE WHEN p_crop IS NULL THEN commodity ELSE district END AS label,
+               SUM(modal_sum) / SUM(n) AS avg_price
+        FROM price_district_commodity
+        WHERE {any_id("state")}
+        AND (p_crop IS NULL OR commodity_id IN {ids_like("commodity", "p_crop")})
+        GROUP BY label
+        ORDER BY avg_price DESC
+        LIMIT p_limit
+        """,
+    ),
+}
+
+# appp.py's comparison: the window reduced to one row per state, its
+# average over the selected years
+for statements_of in (STATEMENTS, ROLLUP_STATEMENTS):
+    first, window = statements_of["compare_rainfall_window"]
+    statements_of["compare_rainfall_average"] = (first, f"""
+        SELECT state, ANY_VALUE(avg_annual_rainfall) AS avg_annual_rainfall
+        FROM ({window})
+        GROUP BY state
+        ORDER BY list_position(CAST(p_states AS VARCHAR[]), state) NULLS LAST, state
+        """)
+
+# connection -> {name: SQL with named parameters}
+_resolved = weakref.WeakKeyDictionary()
+
+
+def statement_sql(con, name: str):
+    compiled = _resolved.setdefault(con, {})
+    sql = compiled.get(name)
+    if sql is None:
+        params, body = STATEMENTS[name]
+        rollup, rollup_body = ROLLUP_STATEMENTS.get(name, (None, None))
+        if rollup and catalog.has_table(con, rollup) and normalize.is_encoded(con, rollup):
+            body = rollup_body
+        elif rollups.rainfall_source(con) == "rainfall":
+            # load_crop_data.py names the raw rainfall table "rainfall"
+            body = re.sub(r"\brainfall_data\b", "rainfall", body)
+        sql = re.sub(rf"\b({'|'.join(params)})\b", r"$\1", body).strip()
+        compiled[name] = sql
+    return sql
+
+
+def resolve_all(con):
+    for name in STATEMENTS:
+        statement_sql(con, name)
+
+
+def run(con, name: str, *values):
+    return execute(con, name, values)
+
+
+def run_from(con, name: str, offset: int, *values):
+    # run(), skipping the first `offset` rows (resuming a paged answer, pages.py)
+    return execute(con, name, values, offset)
+
+
+def execute(con, name: str, values, offset: int = None):
+    params, _ = STATEMENTS[name]
+    if len(values) != len(params):
+        raise ValueError(
+            f"{name} expects {len(params)} parameters, got {len(values)}")
+    sql = statement_sql(con, name)
+    bound = dict(zip(params, values))
+    if offset is not None:
+        sql = f"SELECT * FROM ({sql}) OFFSET $p_offset"
+        bound["p_offset"] = offset
+    metrics.record_sql(con, sql, bound)
+    with metrics.stage("sql"):
+        return con.execute(sql, bound)
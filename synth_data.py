@@ -0,0 +1,186 @@
+import argparse
+import os
+import shutil
+
+import duckdb
+
+import catalog
+import normalize
+import rainfall_cube
+import regions
+import rollups
+from csv_loader import configure, quote, read_csv
+
+# ---------------------- SYNTHETIC BENCHMARK DATA ----------------------
+# Scales the shipped tables and CSVs up by an integer factor for
+# benchmark.py. Every seed row is replicated `scale` times:
+#
+#   * replica 0 is the seed row unchanged, so every question that works on
+#     the shipped data still finds the same rows
+#   * replicas 1.. get a " #<n>" suffix on the table's identity column
+#     (subdivision, market, district), which grows its cardinality the way
+#     more stations / mandis would, and still matches the same LIKE filters
+#   * the row's measures are multiplied by one log-normal jitter factor, so
+#     per-row relations (ANNUAL = sum of months, min <= modal <= max) and the
+#     shape of each column's distribution survive; NULLs stay NULL
+#
+# Jitter is derived from hash(replica, seed row), not random(), so the same
+# scale always produces the same data regardless of thread count.
+#
+#   python synth_data.py --scale 100 --out bench_data/x100
+
+JITTER_SIGMA = 0.15
+
+RAINFALL_MEASURES = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug",
+                     "sep", "oct", "nov", "dec", "annual", "jf", "mam", "jjas", "ond"]
+PRICE_MEASURES = ["min_price", "max_price", "modal_price"]
+
+# table (or CSV file) -> (columns that get the replica suffix, measure columns)
+SPECS = {
+    "rainfall_data": (["subdivision"], RAINFALL_MEASURES),
+    "rainfall": (["subdivision"], RAINFALL_MEASURES),
+    "crop_production": (["market"], PRICE_MEASURES),
+    "crop_market_prices": (["market"], PRICE_MEASURES),
+    "crop_prod": (["district_name", "district_norm"], ["production_tonnes"]),
+    "raw_crop": (["district_name"], ["production_tonnes"]),
+    "raw_rainfall": (["state_name"], ["annual_rainfall_mm"]),
+}
+
+# seed database -> file name inside the output directory
+SEED_DATABASES = ["samarth_data.duckdb", "samarth.db"]
+
+# seed CSV -> (spec, paths the loader scripts read it from)
+SEED_CSVS = {
+    "crop_production_sample.csv": ("crop_production", [
+        "crop_production_sample.csv", "sample_data/crop_production_sample.csv"]),
+    "rainfall_data.csv": ("rainfall_data", [
+        "rainfall_data.csv", "sample_data/rainfall_data.csv"]),
+}
+
+# Derived tables the loaders rebuild; regenerated instead of scaled
+DERIVED = {catalog.META_TABLE, rollups.RAINFALL_ROLLUP, regions.REGION_TABLE, "ingest_watermarks",
+           *rollups.PRICE_ROLLUPS, *map(normalize.dim_table, normalize.DIMENSIONS)}
+
+
+def uniform(salt: int):
+    # deterministic value in (0, 1) per (replica, seed row)
+    return f"((hash(replica, seed_row, {salt}) % 1000000) + 1) / 1000002.0"
+
+
+def jitter_expr():
+    # exp(sigma * z), z ~ N(0, 1) via Box-Muller
+    return (f"exp({JITTER_SIGMA} * sqrt(-2 * ln({uniform(1)})) "
+            f"* cos(2 * pi() * {uniform(2)}))")
+
+
+def scaled_select(con, relation: str, params, spec: str, scale: int):
+    # SELECT that yields `scale` replicas of every row of `relation`,
+    # keeping its column names, order and types
+    suffixed, measures = SPECS[spec]
+    columns = con.execute(
+        f"DESCRIBE SELECT * FROM {relation}", params).fetchall()
+    select = []
+    for name, dtype, *_ in columns:
+        col = quote(name)
+        if name.lower() in suffixed:
+            select.append(
+                f"CASE WHEN replica = 0 THEN {col} ELSE {col} || ' #' || replica END AS {col}")
+        elif name.lower() in measures:
+            # doubles keep the seed's one-decimal precision
+            value = f"round({col} * jitter, 1)" if dtype == "DOUBLE" else f"{col} * jitter"
+            select.append(
+                f"CASE WHEN replica = 0 THEN {col} ELSE CAST({value} AS {dtype}) END AS {col}")
+        else:
+            select.append(col)
+    return f"""
+        WITH seed AS (
+            SELECT *, row_number() OVER () AS seed_row FROM {relation}
+        ),
+        replicas AS (
+            SELECT seed.*, r.range AS replica FROM seed, range({scale}) r
+        ),
+        jittered AS (
+            SELECT *, {jitter_expr()} AS jitter FROM replicas
+        )
+        SELECT {', '.join(select)} FROM jittered
+        ORDER BY replica, seed_row
+    """
+
+
+def synth_database(seed_path: str, out_path: str, scale: int):
+    if os.path.exists(out_path):
+        os.remove(out_path)
+    con = duckdb.connect(out_path)
+    configure(con)
+    escaped = seed_path.replace("'", "''")
+    con.execute(f"ATTACH '{escaped}' AS seed (READ_ONLY)")
+    tables = [r[0] for r in con.execute(
+        "SELECT table_name FROM information_schema.tables "
+        "WHERE table_catalog = 'seed' AND table_type = 'BASE TABLE'").fetchall()]
+    counts = {}
+    for table in tables:
+        if table in DERIVED:
+            continue
+        if table in SPECS:
+            sql = scaled_select(con, f"seed.{table}", [], table, scale)
+        else:
+            sql = f"SELECT * FROM seed.{table}"
+        con.execute(f"CREATE TABLE {table} AS {sql}")
+        counts[table] = con.execute(
+            f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    con.execute("DETACH seed")
+    normalize.encode_all(con)
+    rollups.build_rollups(con)
+    catalog.bump_generation(con)
+    rainfall_cube.save_for(con, out_path)
+    con.close()
+    return counts
+
+
+def synth_csv(con, seed_path: str, spec: str, out_path: str, scale: int):
+    # CSVs keep the seed file's raw text; arrival_date stays dd/mm/yyyy
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    scan, params = read_csv(seed_path, {"arrival_date": "VARCHAR"}
+                            if spec in ("crop_production", "crop_market_prices") else None)
+    sql = scaled_select(con, scan, params, spec, scale)
+    escaped = out_path.replace("'", "''")
+    con.execute(f"COPY ({sql}) TO '{escaped}' (HEADER, DELIMITER ',')", params)
+
+
+def generate(scale: int, out_dir: str, seed_dir: str = "."):
+    os.makedirs(out_dir, exist_ok=True)
+    counts = {}
+    for name in SEED_DATABASES:
+        seed = os.path.join(seed_dir, name)
+        if os.path.exists(seed):
+            for table, rows in synth_database(seed, os.path.join(out_dir, name), scale).items():
+                counts[f"{name}:{table}"] = rows
+    con = duckdb.connect()
+    configure(con)
+    for name, (spec, targets) in SEED_CSVS.items():
+        seed = os.path.join(seed_dir, name)
+        if not os.path.exists(seed):
+            continue
+        first = os.path.join(out_dir, targets[0])
+        synth_csv(con, seed, spec, first, scale)
+        for target in targets[1:]:
+            path = os.path.join(out_dir, target)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            shutil.copyfile(first, path)
+        counts[name] = con.execute(
+            "SELECT COUNT(*) FROM read_csv(?, header = true)", [first]).fetchone()[0]
+    con.close()
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate scaled synthetic Project Samarth data")
+    parser.add_argument("--scale", type=int, default=100)
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--seed-dir", default=".")
+    args = parser.parse_args()
+    out = args.out or os.path.join("bench_data", f"x{args.scale}")
+    for name, rows in generate(args.scale, out, args.seed_dir).items():
+        print(f"🧪 {name}: {rows:,} rows")
+    print(f"💾 Synthetic data (x{args.scale}) written to {out}/")
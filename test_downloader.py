@@ -0,0 +1,128 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmark import StubResourceHandler
+from downloader import CHECKPOINT, DownloadError, download, load_checkpoint
+
+# Drives downloader.py against a local stand-in for the resource API
+# (benchmark.StubResourceHandler) that can fail chosen offsets and hide the
+# record count:
+#
+#   python test_downloader.py
+
+
+class FlakyResourceHandler(StubResourceHandler):
+    latency = 0
+    advertise_total = True
+    failures = {}  # offset -> HTTP statuses to answer with before serving it
+    requested = []  # offsets asked for, in order
+
+    def do_GET(self):
+        offset = int(parse_qs(urlparse(self.path).query).get("offset", ["0"])[0])
+        type(self).requested.append(offset)
+        pending = self.failures.get(offset)
+        if pending:
+            body = json.dumps({"error": "try again"}).encode()
+            self.send_response(pending.pop(0))
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.advertise_total:
+            super().do_GET()
+            return
+        # the same page, without "total"
+        limit = int(parse_qs(urlparse(self.path).query).get("limit", ["10"])[0])
+        records = [{"state": f"state {i % 30}", "modal_price": 1500 + i % 600}
+                   for i in range(offset, min(offset + limit, self.total))]
+        body = json.dumps({"offset": offset, "limit": limit, "records": records}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(total: int, advertise_total: bool = True, failures=None):
+    FlakyResourceHandler.total = total
+    FlakyResourceHandler.advertise_total = advertise_total
+    FlakyResourceHandler.failures = failures or {}
+    FlakyResourceHandler.requested = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyResourceHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/resource"
+
+
+def parts(out_dir: str):
+    return sorted(f for f in os.listdir(out_dir) if f.startswith("part-"))
+
+
+def rows_on_disk(out_dir: str):
+    # data rows across every CSV part (headers excluded)
+    total = 0
+    for name in parts(out_dir):
+        with open(os.path.join(out_dir, name), encoding="utf-8") as f:
+            total += sum(1 for _ in f) - 1
+    return total
+
+
+out_dir = tempfile.mkdtemp(prefix="samarth_test_download_")
+options = {"page_size": 500, "concurrency": 2, "retries": 3, "backoff": 0.001}
+try:
+    # 1. 429 / 5xx answers are retried until the page comes through
+    shutil.rmtree(out_dir, ignore_errors=True)
+    server, url = serve(2500, failures={500: [429, 503], 1000: [502]})
+    try:
+        stats = download(url, out_dir, **options)
+    finally:
+        server.shutdown()
+    assert FlakyResourceHandler.requested.count(500) == 3, FlakyResourceHandler.requested
+    assert FlakyResourceHandler.requested.count(1000) == 2, FlakyResourceHandler.requested
+    assert stats["rows"] == 2500 and rows_on_disk(out_dir) == 2500, stats
+    assert load_checkpoint(out_dir) == {"done": [0, 500, 1000, 1500, 2000], "total": 2500}
+    print("✅ retries 429/5xx:", FlakyResourceHandler.requested)
+
+    # 2. a run that dies part-way resumes from _checkpoint.json
+    shutil.rmtree(out_dir, ignore_errors=True)
+    server, url = serve(2500, failures={1500: [404]})
+    try:
+        try:
+            download(url, out_dir, **options)
+            raise AssertionError("a 404 should stop the download")
+        except DownloadError:
+            pass
+        first_run = set(load_checkpoint(out_dir)["done"])
+        assert 0 in first_run and 1500 not in first_run, first_run
+        FlakyResourceHandler.requested = []
+        stats = download(url, out_dir, **options)
+    finally:
+        server.shutdown()
+    assert set(FlakyResourceHandler.requested).isdisjoint(first_run), FlakyResourceHandler.requested
+    assert 1500 in FlakyResourceHandler.requested
+    assert stats["skipped"] == len(first_run), stats
+    assert load_checkpoint(out_dir)["done"] == [0, 500, 1000, 1500, 2000]
+    assert rows_on_disk(out_dir) == 2500 and os.path.exists(os.path.join(out_dir, CHECKPOINT))
+    print("✅ resumed from checkpoint, skipping", sorted(first_run))
+
+    # 3. without a total, waves of pages stop at the first empty one
+    for total in (2300, 2000):
+        shutil.rmtree(out_dir, ignore_errors=True)
+        server, url = serve(total, advertise_total=False)
+        try:
+            stats = download(url, out_dir, **options)
+        finally:
+            server.shutdown()
+        state = load_checkpoint(out_dir)
+        assert state["total"] is None, state
+        assert rows_on_disk(out_dir) == total and stats["rows"] == total, stats
+        assert len(parts(out_dir)) == -(-total // 500), parts(out_dir)
+        assert max(FlakyResourceHandler.requested) < total + 2 * 500, FlakyResourceHandler.requested
+        print(f"✅ no total ({total} records): stopped after offsets", sorted(FlakyResourceHandler.requested))
+finally:
+    shutil.rmtree(out_dir, ignore_errors=True)
@@ -0,0 +1,42 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import duckdb
+
+# Runs load_crop_data.py (full, then --incremental) on a copy of the shipped
+# samarth.db, whose rainfall table was never dictionary-encoded: the load
+# has to encode it, so region_map maps subdivisions to states and the
+# rainfall rollup carries the subdivision ids its variants filter on.
+#
+#   python test_load_crop_data.py
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+work = tempfile.mkdtemp(prefix="samarth_test_load_")
+try:
+    for name in ["samarth.db", "crop_production_sample.csv"]:
+        shutil.copy(os.path.join(HERE, name), work)
+
+    for args in ([], ["--incremental"]):
+        subprocess.run([sys.executable, os.path.join(HERE, "load_crop_data.py"), *args],
+                       cwd=work, check=True, capture_output=True)
+        con = duckdb.connect(os.path.join(work, "samarth.db"), read_only=True)
+        try:
+            mapped = con.execute("SELECT COUNT(*) FROM region_map").fetchone()[0]
+            assert mapped > 0, "region_map is empty"
+            kerala = con.execute("""
+                SELECT COUNT(*) FROM rainfall_yearly
+                WHERE subdivision_id IN (
+                    SELECT subdivision_id FROM region_map m JOIN dim_state s ON s.id = m.state_id
+                    WHERE s.name = 'kerala' AND m.district_id IS NULL)
+            """).fetchone()[0]
+            assert kerala > 0, "no rainfall reaches kerala through region_map"
+        finally:
+            con.close()
+        print(f"✅ load_crop_data.py {' '.join(args) or '(full)'}: "
+              f"region_map {mapped} rows, {kerala} Kerala rainfall years")
+finally:
+    shutil.rmtree(work, ignore_errors=True)
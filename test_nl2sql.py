@@ -0,0 +1,59 @@
+import duckdb
+
+import catalog
+import nl2sql
+from answer_cache import AnswerCache
+
+# nl2sql.py with the offline StubModel against the shipped database: SQL is
+# reused for a question of the same shape, and SQL that fails validation
+# (json_serialize_sql and the table checks) is refused, never run or cached.
+#
+#   python test_nl2sql.py
+
+
+class FixedModel:
+    # Replies with the same SQL whatever the question
+    name = "fixed"
+
+    def __init__(self, sql: str):
+        self.sql = sql
+
+    def generate(self, template: str, slots, tables: dict):
+        return {"sql": self.sql, "reasoning": "fixed"}
+
+
+con = duckdb.connect("samarth_data.duckdb", read_only=True)
+cache = AnswerCache("nl2sql_test", disk_dir=None)
+model = nl2sql.StubModel()
+
+# 1. the second question of the same shape is a template-cache hit
+first = nl2sql.answer(con, "What is the average modal price of Tomato in Andhra Pradesh?", cache, model)
+second = nl2sql.answer(con, "what is the average modal price of onion in Karnataka", cache, model)
+assert "error" not in first and "error" not in second, (first, second)
+assert first["template"] == second["template"], (first["template"], second["template"])
+assert not first["cached"] and second["cached"], (first["cached"], second["cached"])
+assert "tomato" in first["sql_query"] and "onion" in second["sql_query"]
+assert cache.counters()["hits"] == 1, cache.counters()
+print("✅ template cache hit:", second["template"])
+print("   ", second["summary"])
+
+# 2. invalid model SQL is rejected before it runs, and not cached
+rejected = [
+    "DELETE FROM crop_production",
+    "SELECT 1; SELECT 2",
+    "SELECT * FROM read_csv('x.csv')",
+    "SELECT * FROM dim_state",
+    "SELECT nope FROM crop_production",
+    "SELECT * FROM crop_production WHERE lower(state) = $state_9",
+]
+for sql in rejected:
+    result = nl2sql.answer(con, "modal price in Kerala", cache, FixedModel(sql))
+    assert "error" in result and "result" not in result, (sql, result)
+    found, _ = cache.get(("fixed", result["template"]), catalog.cached_generation(con))
+    assert not found, sql
+    print(f"✅ rejected {sql!r}: {result['error'].splitlines()[0][:80]}")
+
+valid = "SELECT COUNT(*) AS n FROM crop_production WHERE lower(state) LIKE '%' || $state_1 || '%'"
+result = nl2sql.answer(con, "modal price in Kerala", cache, FixedModel(valid))
+assert "error" not in result and result["result"], result
+print("✅ accepted", valid)
@@ -0,0 +1,32 @@
+import pandas as pd
+import pyarrow as pa
+
+import pages
+
+# Column formatting behind the paged answers (pages.py):
+#
+#   python test_pages.py
+
+# an explicit spec is kept, whole values included
+assert pages.column_text(pa.array([1676.0, 31000.0, 12.345]), "%.2f").tolist() == \
+    ["1676.00", "31000.00", "12.35"]
+assert pages.column_text(pa.array([3, None], pa.int64()), "%+.1f").tolist() == ["+3.0", ""]
+assert pages.format_rows(pd.DataFrame({"state": ["karnataka"], "avg": [1676.0]}),
+                         "{state}: {avg:%.2f}") == ["karnataka: 1676.00"]
+
+# without one, whole numbers (sums pandas turns into floats) keep their integer form
+assert pages.column_text(pa.array([43000.0, 1.5, float("nan")])).tolist() == ["43000", "1.50", ""]
+assert pages.column_text(pa.array([43000, 7], pa.int64())).tolist() == ["43000", "7"]
+print("✅ column_text")
+
+# tables are laid out as DataFrame.to_markdown did: padded, numbers right-aligned
+frame = pd.DataFrame({"crop": ["Rice", "Maize"], "total_production": [22500, 3000]})
+table = [
+    "| crop  | total_production |",
+    "|:------|-----------------:|",
+    "| Rice  |            22500 |",
+    "| Maize |             3000 |",
+]
+assert pages.markdown_table(frame).splitlines() == table, pages.markdown_table(frame)
+assert pages.markdown_table(pa.RecordBatch.from_pandas(frame)).splitlines() == table
+print("✅ markdown_table")